@@ -0,0 +1,52 @@
+"""Настройки gunicorn для запуска приложения в продакшене (вместо manage.py runserver).
+
+WSGI (по умолчанию): gunicorn -c config/gunicorn.conf.py config.wsgi
+ASGI (uvicorn): GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c config/gunicorn.conf.py config.asgi
+
+Плавный перезапуск воркеров без потери запросов: kill -HUP <pid мастер-процесса>. При preload_app код приложения
+загружается мастер-процессом, поэтому для обновления кода используется замена мастера: kill -USR2, затем -QUIT
+старому мастеру (или перезапуск контейнера).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", default="0.0.0.0:8000")
+
+# Воркеры: по умолчанию 2 * CPU + 1 (воркер ожидает БД и Redis, поэтому процессов больше, чем ядер)
+workers = int(os.getenv("GUNICORN_WORKERS") or multiprocessing.cpu_count() * 2 + 1)
+# gthread: потоки воркера обслуживают запросы и держат соединения keep-alive с nginx (sync-воркер закрывает
+# соединение после каждого ответа, и keepalive в upstream nginx.conf не работает)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", default="gthread")
+# Потоки в воркере gthread (не больше размера пула соединений с БД процесса, см. WEB_DB_POOL_MAX_SIZE)
+threads = int(os.getenv("GUNICORN_THREADS", default="4"))
+
+# Приложение загружается один раз в мастер-процессе до создания воркеров:
+# воркеры запускаются быстрее и разделяют память с мастером (copy-on-write)
+preload_app = True
+
+# Время ответа воркера, после которого он перезапускается, и время на завершение запросов при перезапуске
+timeout = int(os.getenv("GUNICORN_TIMEOUT", default="30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", default="30"))
+# Время удержания соединения keep-alive с nginx (больше, чем keepalive_timeout upstream в nginx.conf).
+# Используется воркерами gthread и uvicorn, sync-воркер keep-alive не поддерживает
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", default="75"))
+
+# Перезапуск воркера после заданного количества запросов (защита от утечек памяти);
+# разброс не дает всем воркерам перезапуститься одновременно
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", default="1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", default="100"))
+
+# Заголовки X-Forwarded-* принимаются от nginx
+forwarded_allow_ips = os.getenv("GUNICORN_FORWARDED_ALLOW_IPS", default="*")
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", default="info")
+
+
+def post_fork(server, worker):
+    """Закрытие соединений с БД, унаследованных от мастер-процесса (при preload_app): каждый воркер
+    открывает свои соединения"""
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,125 @@
+"""Нагрузочный тест: количество запросов в секунду и задержки ответа для списка URL.
+
+Используется для сравнения режимов запуска (gunicorn за nginx и manage.py runserver), см. профиль loadtest
+в docker-compose.yml. Запуск: python config/loadtest.py http://nginx/health/ http://web-runserver:8000/health/
+Сторонние библиотеки не нужны - запросы выполняются потоками с повторным использованием соединений.
+
+Страницы заметок проверяются от имени пользователя: с параметрами --login, --email и --password тест входит
+в приложение и отправляет запросы с cookie сессии. Подстрока {note_id} в URL заменяется на id первой заметки
+из списка заметок пользователя (детальная страница). Сессии хранятся в общем Redis, поэтому одна сессия
+действует во всех сервисах приложения.
+"""
+import argparse
+import http.client
+import http.cookiejar
+import re
+import statistics
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode, urljoin, urlsplit
+
+
+def login(login_url, email, password):
+    """Вход в приложение через форму входа. Возвращает значение заголовка Cookie с сессией
+    и id первой заметки пользователя (None, если заметок нет)"""
+    cookies = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+    with opener.open(login_url, timeout=30) as response:
+        page = response.read().decode()
+    csrf_token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page)[1]
+    data = urlencode({'csrfmiddlewaretoken': csrf_token, 'username': email, 'password': password}).encode()
+    with opener.open(login_url, data=data, timeout=30) as response:
+        response.read()
+    session = {cookie.name: cookie.value for cookie in cookies}
+    if 'sessionid' not in session:
+        raise SystemExit(f'Не удалось войти как {email} (создайте данные: python manage.py seed_benchmark_data)')
+
+    with opener.open(urljoin(login_url, '/notes/'), timeout=30) as response:
+        note = re.search(r'href="/notes/(\d+)/"', response.read().decode())
+    cookie = '; '.join(f'{name}={value}' for name, value in session.items())
+    return cookie, note and int(note[1])
+
+
+def worker(url, deadline, results, lock, cookie=None):
+    """Отправка запросов по одному соединению keep-alive до истечения времени теста"""
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    path = parts.path or '/'
+    if parts.query:
+        path += f'?{parts.query}'
+    connection = connection_class(parts.netloc, timeout=30)
+    headers = {'Cookie': cookie} if cookie else {}
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            # Перенаправление (например, на страницу входа) - не ответ проверяемой страницы
+            if response.status >= 300:
+                errors += 1
+            else:
+                latencies.append(time.monotonic() - started)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+    connection.close()
+    with lock:
+        results['latencies'].extend(latencies)
+        results['errors'] += errors
+
+
+def run(url, concurrency, duration, cookie=None):
+    """Нагрузка на url в concurrency потоков в течение duration секунд. Возвращает сводку результатов"""
+    results = {'latencies': [], 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=worker, args=(url, deadline, results, lock, cookie)) for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(results['latencies'])
+    summary = {'url': url, 'requests': len(latencies), 'errors': results['errors'], 'rps': len(latencies) / elapsed}
+    if latencies:
+        summary['p50_ms'] = statistics.median(latencies) * 1000
+        summary['p95_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест HTTP-эндпоинтов')
+    parser.add_argument('urls', nargs='+', help='URL для проверки (результаты выводятся для каждого)')
+    parser.add_argument('-c', '--concurrency', type=int, default=20, help='Количество одновременных соединений')
+    parser.add_argument('-d', '--duration', type=float, default=15, help='Длительность теста для URL в секундах')
+    parser.add_argument('--login', help='URL страницы входа (запросы отправляются от имени пользователя)')
+    parser.add_argument('--email', help='Email пользователя')
+    parser.add_argument('--password', help='Пароль пользователя')
+    args = parser.parse_args()
+
+    cookie, note_id = None, None
+    if args.login:
+        cookie, note_id = login(args.login, args.email, args.password)
+
+    for url in args.urls:
+        if '{note_id}' in url:
+            if note_id is None:
+                raise SystemExit('У пользователя нет заметок для проверки детальной страницы')
+            url = url.replace('{note_id}', str(note_id))
+        summary = run(url, args.concurrency, args.duration, cookie)
+        line = f"{summary['url']}: {summary['rps']:.1f} запросов/с, успешных {summary['requests']}, " \
+               f"ошибок {summary['errors']}"
+        if 'p50_ms' in summary:
+            line += f", p50 {summary['p50_ms']:.1f} мс, p95 {summary['p95_ms']:.1f} мс"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Доступ к медиафайлам пользователей.
+
+Медиафайлы не раздаются nginx напрямую: запрос /media/<путь> приходит в Django, который проверяет, что файл
+принадлежит пользователю запроса, и возвращает пустой ответ с заголовком X-Accel-Redirect. Сам файл отдает nginx
+из внутреннего location (см. nginx.conf) через sendfile, поэтому воркер не занят передачей файла.
+Без nginx (MEDIA_ACCEL_REDIRECT=False, например при DEBUG=True) файл отдается самим Django.
+"""
+import posixpath
+import re
+
+from my_note.models import NoteImage
+from users.models import User
+
+# Пути к копиям изображений заметок и аватаров содержат id изображения или пользователя (см. my_note/images.py,
+# users/avatars.py)
+NOTE_IMAGE_RENDITION_RE = re.compile(r'^my_note/photo/renditions/(?P<pk>\d+)/[^/]+$')
+NOTE_IMAGE_RE = re.compile(r'^my_note/photo/(uploads/)?[^/]+$')  # uploads - загруженные в хранилище браузером
+AVATAR_RENDITION_RE = re.compile(r'^users/avatars/renditions/(?P<pk>\d+)/[^/]+$')
+AVATAR_RE = re.compile(r'^users/avatars/[^/]+$')
+
+
+def normalize_media_path(path):
+    """Нормализованный относительный путь к медиафайлу или None, если путь выходит за пределы MEDIA_ROOT"""
+    normalized = posixpath.normpath(path)
+    if normalized != path or normalized.startswith(('/', '..')) or '\\' in path:
+        return None
+    return normalized
+
+
+def can_access_media(user, path):
+    """Проверка доступа пользователя к медиафайлу: изображения заметок доступны владельцу заметки,
+    аватар - самому пользователю и сотрудникам (в админке)"""
+    if not user.is_authenticated:
+        return False
+
+    match = NOTE_IMAGE_RENDITION_RE.match(path)
+    if match:
+        return NoteImage.objects.filter(pk=match['pk'], note__owner=user).exists()
+    if NOTE_IMAGE_RE.match(path):
+        return NoteImage.objects.filter(image=path, note__owner=user).exists()
+
+    match = AVATAR_RENDITION_RE.match(path)
+    if match:
+        return int(match['pk']) == user.pk or user.is_staff
+    if AVATAR_RE.match(path):
+        return user.avatar.name == path or (user.is_staff and User.objects.filter(avatar=path).exists())
+    return False
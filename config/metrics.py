@@ -0,0 +1,209 @@
+"""Сбор показателей запросов: количество SQL-запросов, время работы с БД, время отрисовки шаблона,
+общее время ответа и размер ответа - по имени маршрута (например, my_note:note_list).
+
+Включается переменной окружения REQUEST_METRICS=True. Последние REQUEST_METRICS_SAMPLES замеров каждого маршрута
+хранятся в Redis (общем для всех воркеров), если кеш Django настроен на Redis, иначе - в памяти процесса.
+Процентили по маршрутам отдаются в формате Prometheus по адресу /metrics/ (см. config/views.py): по токену
+METRICS_TOKEN, а если он не задан - только сотрудникам (is_staff).
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+# Показатели замера: имя метрики Prometheus, описание и ключ в замере
+METRICS = (
+    ('django_request_duration_seconds', 'Время обработки запроса, с', 'duration'),
+    ('django_request_db_queries', 'Количество SQL-запросов', 'queries'),
+    ('django_request_db_duration_seconds', 'Время выполнения SQL-запросов, с', 'db_time'),
+    ('django_request_template_render_seconds', 'Время отрисовки шаблона, с', 'render_time'),
+    ('django_request_response_size_bytes', 'Размер ответа, байт', 'size'),
+)
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Общее хранилище замеров процесса (см. get_metrics_store)
+_metrics_store = None
+
+
+class MetricsStore:
+    """Хранилище последних замеров по маршрутам"""
+
+    key_prefix = 'metrics:requests'
+
+    def __init__(self):
+        self.max_samples = settings.REQUEST_METRICS_SAMPLES
+        self.redis = None
+        if settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+            from django_redis import get_redis_connection
+
+            self.redis = get_redis_connection('default')
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+
+    def add(self, view_name, sample):
+        """Сохранение замера запроса к маршруту view_name"""
+        if self.redis is not None:
+            key = f'{self.key_prefix}:{view_name}'
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.lpush(key, json.dumps(sample))
+            pipeline.ltrim(key, 0, self.max_samples - 1)
+            pipeline.sadd(f'{self.key_prefix}:views', view_name)
+            pipeline.execute()
+        else:
+            with self.lock:
+                self.samples[view_name].append(sample)
+
+    def get_all(self):
+        """Замеры по всем маршрутам: {имя маршрута: [замер, ...]}"""
+        if self.redis is not None:
+            view_names = sorted(name.decode() for name in self.redis.smembers(f'{self.key_prefix}:views'))
+            pipeline = self.redis.pipeline(transaction=False)
+            for view_name in view_names:
+                pipeline.lrange(f'{self.key_prefix}:{view_name}', 0, -1)
+            return {
+                view_name: [json.loads(sample) for sample in samples]
+                for view_name, samples in zip(view_names, pipeline.execute())
+            }
+        with self.lock:
+            return {view_name: list(samples) for view_name, samples in sorted(self.samples.items())}
+
+    def clear(self):
+        """Удаление всех замеров"""
+        if self.redis is not None:
+            view_names = self.redis.smembers(f'{self.key_prefix}:views')
+            keys = [f'{self.key_prefix}:{name.decode()}' for name in view_names]
+            self.redis.delete(f'{self.key_prefix}:views', *keys)
+        else:
+            with self.lock:
+                self.samples.clear()
+
+
+def get_metrics_store():
+    """Получение общего хранилища замеров"""
+    global _metrics_store
+    if _metrics_store is None:
+        _metrics_store = MetricsStore()
+    return _metrics_store
+
+
+class QueryTimer:
+    """Обертка выполнения SQL-запросов (connection.execute_wrapper): количество и суммарное время запросов"""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - started
+
+
+def start_query_timer(timer):
+    """Установка обертки выполнения SQL-запросов на соединение текущего потока. Возвращает ExitStack,
+    закрытие которого (в том же потоке) снимает обертку"""
+    stack = ExitStack()
+    stack.enter_context(connection.execute_wrapper(timer))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Замер показателей каждого запроса с разрешенным маршрутом (должен быть первым в MIDDLEWARE,
+    чтобы учитывались запросы к БД всех остальных middleware).
+
+    Поддерживает синхронный и асинхронный режимы: под ASGI цепочка middleware не переключается в синхронный режим
+    ради этого middleware. Асинхронный ORM выполняет запросы через sync_to_async в общем потоке запроса
+    (thread_sensitive), у которого свое соединение с БД, поэтому в асинхронном режиме обертка выполнения
+    SQL-запросов устанавливается и снимается в этом же потоке"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        request.metrics_render_time = 0.0
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        request.metrics_render_time = 0.0
+        started = time.perf_counter()
+        query_timer = await sync_to_async(start_query_timer)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(query_timer.close)()
+        # Запись в Redis блокирующая, поэтому выполняется вне цикла событий
+        await sync_to_async(self.record, thread_sensitive=False)(
+            request, response, timer, time.perf_counter() - started
+        )
+        return response
+
+    def record(self, request, response, timer, duration):
+        """Сохранение замера запроса по имени маршрута"""
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.view_name:
+            get_metrics_store().add(match.view_name, {
+                'duration': duration,
+                'queries': timer.queries,
+                'db_time': timer.duration,
+                'render_time': request.metrics_render_time,
+                'size': len(response.content) if not response.streaming else 0,
+                'status': response.status_code,
+            })
+
+    def process_template_response(self, request, response):
+        """Замер времени отрисовки шаблона: TemplateResponse отрисовывается сразу после этого метода"""
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.metrics_render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def quantile(values, q):
+    """Процентиль q (от 0 до 1) отсортированного списка значений (ближайший ранг)"""
+    index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+    return values[index]
+
+
+def format_prometheus(samples_by_view):
+    """Показатели в текстовом формате Prometheus (тип summary: процентили, количество и сумма по маршруту)"""
+    lines = []
+    for name, description, key in METRICS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} summary')
+        for view_name, samples in samples_by_view.items():
+            values = sorted(sample[key] for sample in samples)
+            if not values:
+                continue
+            for q in QUANTILES:
+                lines.append(f'{name}{{view="{view_name}",quantile="{q}"}} {quantile(values, q):g}')
+            lines.append(f'{name}_count{{view="{view_name}"}} {len(values)}')
+            lines.append(f'{name}_sum{{view="{view_name}"}} {sum(values):g}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,120 @@
+"""Хранилище медиафайлов в S3-совместимом объектном хранилище (локально - MinIO, см. docker-compose.yml).
+
+Включается переменной окружения MEDIA_STORAGE=s3 (см. config/settings.py). Файлы не хранятся на диске веб-сервера,
+поэтому веб-сервисов и воркеров может быть несколько. Бакет закрыт: шаблоны получают временные подписанные ссылки
+(presigned GET URL), которые выдаются только владельцу заметки и перестают действовать через querystring_expire секунд.
+Большие файлы загружаются в хранилище по частям (multipart upload). Изображения к заметкам браузер может
+загружать прямо в бакет по подписанной форме (presigned POST, см. my_note/uploads.py).
+"""
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+# Максимальное количество подписанных ссылок, запоминаемых процессом
+URL_CACHE_MAX_SIZE = 10000
+
+
+class MediaS3Storage(S3Storage):
+    """S3-хранилище медиафайлов с подписанными ссылками для браузера и загрузкой больших файлов по частям.
+
+    Ссылки подписываются для public_endpoint_url (адрес хранилища, доступный браузеру), если он отличается
+    от endpoint_url (адреса внутри сети docker). Подписанная ссылка запоминается процессом на половину срока
+    действия: URL изображения не меняется при каждом показе страницы и остается в кеше браузера."""
+
+    def get_default_settings(self):
+        return {
+            **super().get_default_settings(),
+            'public_endpoint_url': None,
+            'multipart_threshold': 8 * 1024 * 1024,
+            'multipart_chunksize': 8 * 1024 * 1024,
+        }
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        # Файлы больше multipart_threshold загружаются частями по multipart_chunksize (параллельно)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunksize,
+            use_threads=self.use_threads,
+        )
+        self._public_client = None
+        self._url_cache = {}
+
+    @property
+    def public_client(self):
+        """Клиент S3 для подписи ссылок адресом хранилища, доступным браузеру"""
+        if self._public_client is None:
+            self._public_client = boto3.session.Session().client(
+                's3',
+                endpoint_url=self.public_endpoint_url or self.endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region_name,
+                config=Config(
+                    signature_version=self.signature_version, s3={'addressing_style': self.addressing_style}
+                ),
+            )
+        return self._public_client
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or http_method or not self.querystring_auth:
+            return super().url(name, parameters, expire, http_method)
+
+        expire = expire or self.querystring_expire
+        cached = self._url_cache.get((name, expire))
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
+
+        url = self.public_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': self._normalize_name(clean_name(name))},
+            ExpiresIn=expire,
+        )
+        if len(self._url_cache) >= URL_CACHE_MAX_SIZE:
+            self._url_cache.clear()
+        self._url_cache[(name, expire)] = (url, now + expire / 2)
+        return url
+
+    def presigned_post(self, name, content_type, max_size, expire=None):
+        """Подписанная форма для загрузки файла name браузером напрямую в бакет: ``{'url': ..., 'fields': {...}}``.
+        Хранилище примет только файл размером до max_size байт с типом содержимого content_type"""
+        fields = {'Content-Type': content_type}
+        cache_control = self.object_parameters.get('CacheControl')
+        if cache_control:
+            fields['Cache-Control'] = cache_control
+        conditions = [{field: value} for field, value in fields.items()]
+        conditions.append(['content-length-range', 1, max_size])
+        return self.public_client.generate_presigned_post(
+            self.bucket_name,
+            self._normalize_name(clean_name(name)),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expire or self.querystring_expire,
+        )
+
+    def read_head(self, name, length):
+        """Первые length байт файла и его полный размер - одним запросом с заголовком Range (без скачивания файла)"""
+        try:
+            response = self.connection.meta.client.get_object(
+                Bucket=self.bucket_name,
+                Key=self._normalize_name(clean_name(name)),
+                Range=f'bytes=0-{length - 1}',
+            )
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code in ('NoSuchKey', '404'):
+                raise FileNotFoundError(name) from e
+            if code == 'InvalidRange':  # Пустой файл
+                return b'', 0
+            raise
+        data = response['Body'].read()
+        # Заголовок Content-Range: bytes 0-<конец>/<размер файла>
+        content_range = response.get('ContentRange')
+        size = int(content_range.rsplit('/', 1)[1]) if content_range else response['ContentLength']
+        return data, size
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",  # Полнотекстовый поиск по заметкам
     "django_celery_beat",
     "users",
     "my_note",
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.metrics.RequestMetricsMiddleware",  # Показатели запросов (при REQUEST_METRICS=True), первым в списке
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -67,16 +69,41 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+# Пул соединений psycopg 3 (нужен пакет psycopg[pool]): соединения процесса переиспользуются между запросами.
+# Без пула используются постоянные соединения: соединение живет DB_CONN_MAX_AGE секунд (0 - новое на каждый запрос).
+# Под ASGI (uvicorn) постоянные соединения нужно отключать (DB_CONN_MAX_AGE=0): синхронный код каждого запроса
+# выполняется в новом потоке, и соединения прежних потоков не закрываются. Переиспользовать соединения под ASGI
+# можно только через пул (DB_POOL=True) или pgbouncer (см. сервис web-asgi в docker-compose.yml).
+DB_POOL = os.getenv("DB_POOL") == "True"
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", default="60"))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv("POSTGRES_DB"),
         "USER": os.getenv("POSTGRES_USER", default="postgres"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("POSTGRES_HOST", default="localhost"),
         "PORT": os.getenv("POSTGRES_PORT", default="5432"),
+        # Пул несовместим с постоянными соединениями Django (пул сам хранит открытые соединения)
+        "CONN_MAX_AGE": 0 if DB_POOL else DB_CONN_MAX_AGE,
+        # Проверка постоянного соединения перед новым запросом (разорванное соединение открывается заново)
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", default="5")),
+        },
+        # Через pgbouncer в режиме transaction соединение с сервером БД меняется между транзакциями, поэтому
+        # серверные курсоры (QuerySet.iterator) отключаются
+        "DISABLE_SERVER_SIDE_CURSORS": os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS") == "True",
     }
 }
+if DB_POOL:
+    # Размер пула задается отдельно для веб-сервера и воркеров Celery (см. docker-compose.yml)
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", default="2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", default="10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", default="10")),  # Ожидание свободного соединения, секунд
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -116,8 +143,59 @@ STATIC_URL = "/static/"  # Маршрут к папке со статическ
 STATICFILES_DIRS = [BASE_DIR / "static"]  # Список папок на диске, из которых будут подгружаться статические файлы
 STATIC_ROOT = BASE_DIR / "staticfiles"  # Папка, куда собираются все стат. файлы для продакшена командой collectstatic
 
+# Хранилища файлов. В продакшене статические файлы собираются с хешем содержимого в имени и сжатыми копиями
+# .gz/.br (см. config/storage.py); в режиме отладки используются исходные имена (без collectstatic)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+            else "config.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+
 MEDIA_URL = "/media/"  # Путь к папке с медиафайлами
 MEDIA_ROOT = BASE_DIR / "media"  # Путь к папке на диске с медиафайлами, загружаемыми пользователем
+# Медиафайлы отдаются после проверки владельца (config/views.py): файл передает nginx по заголовку
+# X-Accel-Redirect из внутреннего location MEDIA_ACCEL_REDIRECT_LOCATION. Без nginx (DEBUG) файл отдает Django
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", default=str(not DEBUG)) == "True"
+MEDIA_ACCEL_REDIRECT_LOCATION = "/protected-media/"
+MEDIA_CACHE_MAX_AGE = 24 * 60 * 60  # Время хранения медиафайлов в кеше браузера, секунд
+
+# Хранилище медиафайлов: local - папка MEDIA_ROOT, s3 - S3-совместимое объектное хранилище (локально - MinIO,
+# см. config/object_storage.py). Браузер получает временные подписанные ссылки на файлы в закрытом бакете
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", default="local")
+if MEDIA_STORAGE == "s3":
+    STORAGES["default"] = {
+        "BACKEND": "config.object_storage.MediaS3Storage",
+        "OPTIONS": {
+            "bucket_name": os.getenv("S3_BUCKET_NAME", default="my-note-media"),
+            "endpoint_url": os.getenv("S3_ENDPOINT_URL"),  # Адрес хранилища для приложения, например http://minio:9000
+            # Адрес хранилища для браузера (в подписанных ссылках), например http://localhost:9000
+            "public_endpoint_url": os.getenv("S3_PUBLIC_ENDPOINT_URL"),
+            "access_key": os.getenv("S3_ACCESS_KEY"),
+            "secret_key": os.getenv("S3_SECRET_KEY"),
+            "region_name": os.getenv("S3_REGION_NAME", default="us-east-1"),
+            "signature_version": "s3v4",
+            "addressing_style": "path",
+            "default_acl": None,  # Объекты закрыты, доступ - только по подписанным ссылкам
+            "querystring_auth": True,
+            "querystring_expire": int(os.getenv("S3_URL_EXPIRE", default="3600")),  # Срок действия ссылки, секунд
+            "file_overwrite": False,
+            "object_parameters": {"CacheControl": f"private, max-age={MEDIA_CACHE_MAX_AGE}"},
+            # Загрузка файлов больше порога частями (multipart upload), байт
+            "multipart_threshold": int(os.getenv("S3_MULTIPART_THRESHOLD", default=str(8 * 1024 * 1024))),
+            "multipart_chunksize": int(os.getenv("S3_MULTIPART_CHUNKSIZE", default=str(8 * 1024 * 1024))),
+        },
+    }
+# Загрузка изображений к заметкам браузером напрямую в хранилище (по подписанной форме, см. my_note/uploads.py):
+# файлы не проходят через веб-воркеры. Работает только с MEDIA_STORAGE=s3, с локальным хранилищем файлы
+# загружаются через Django
+NOTE_DIRECT_UPLOADS = os.getenv("NOTE_DIRECT_UPLOADS", default=str(MEDIA_STORAGE == "s3")) == "True"
+NOTE_DIRECT_UPLOAD_EXPIRE = int(os.getenv("NOTE_DIRECT_UPLOAD_EXPIRE", default="600"))  # Срок действия формы, секунд
 
 # Настройки приложения для защиты от DoS-атак через отправку больших объемов данных:
 # Ограничение размера данных форм и JSON, которые обрабатываются в оперативной памяти.
@@ -156,6 +234,14 @@ CELERY_TASK_TIME_LIMIT = 10 * 60  # 10 минут
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Маршрутизация задач по очередям: обработка изображений выполняется отдельным воркером (очередь images).
+# Удаление файлов изображений - там же: только воркеру celery-images подключен том с медиафайлами
+CELERY_TASK_ROUTES = {
+    "my_note.tasks.process_note_image": {"queue": "images"},
+    "my_note.tasks.delete_media_files": {"queue": "images"},
+    "users.tasks.process_avatar": {"queue": "images"},
+    "users.tasks.delete_avatar_files": {"queue": "images"},
+}
 
 # Настройки для django-celery-beat
 # Настройка расписания выполнения задач для Celery
@@ -164,23 +250,92 @@ CELERY_BEAT_SCHEDULE = {
         "task": "users.tasks.send_reminder_message",  # Путь к задаче
         "schedule": crontab(hour=20, minute=0),  # Выполняется каждый день в 20:00 (по Москве)
     },
+    "send-pending-emails": {
+        "task": "users.tasks.send_pending_emails",
+        "schedule": crontab(minute="*/5"),  # Выполняется каждые 5 минут
+    },
+    "delete-expired-email-tokens": {
+        "task": "users.tasks.delete_expired_email_tokens",
+        "schedule": crontab(minute=30),  # Выполняется каждый час
+    },
+    "delete-abandoned-note-uploads": {
+        "task": "my_note.tasks.delete_abandoned_uploads",
+        "schedule": crontab(hour=4, minute=0),  # Выполняется каждый день в 4:00
+    },
 }
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Настройки поиска по заметкам (см. my_note/search.py)
+NOTE_SEARCH_MODE = os.getenv("NOTE_SEARCH_MODE", default="fulltext")  # Режим по умолчанию: fulltext или trigram
+# Минимальное сходство запроса со словом заметки (от 0 до 1) для нечеткого поиска по триграммам
+NOTE_TRIGRAM_SIMILARITY_THRESHOLD = float(os.getenv("NOTE_TRIGRAM_SIMILARITY_THRESHOLD", default="0.3"))
+
+# Режим пагинации списка заметок: offset (номера страниц) или cursor (курсорная пагинация по дате создания)
+NOTE_LIST_PAGINATION = os.getenv("NOTE_LIST_PAGINATION", default="offset")
+# Показывать приблизительное количество заметок при курсорной пагинации (оценка планировщика PostgreSQL)
+NOTE_LIST_APPROXIMATE_COUNT = os.getenv("NOTE_LIST_APPROXIMATE_COUNT") == "True"
+# Асинхронные представления главной страницы, списка и детальной страницы заметки (для запуска через ASGI)
+NOTE_ASYNC_VIEWS = os.getenv("NOTE_ASYNC_VIEWS") == "True"
+# Постановка задач обработки и удаления файлов изображений заметок в очередь Celery (см. my_note/tasks.py).
+# Выключается на время замеров производительности (см. my_note/benchmark.py)
+NOTE_IMAGE_TASKS = True
+
 TELEGRAM_URL = "https://api.telegram.org/bot"  # URL для отправки сообщений в Telegram
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")  # Токен бота Telegram
+# Количество получателей напоминаний в одной задаче рассылки
+TG_REMINDER_BATCH_SIZE = int(os.getenv("TG_REMINDER_BATCH_SIZE", default="200"))
+# Максимальное количество одновременных запросов к Telegram в одной задаче рассылки
+TG_MAX_CONCURRENCY = int(os.getenv("TG_MAX_CONCURRENCY", default="10"))
+# Лимиты скорости отправки сообщений (сообщений в секунду): общий для бота и для одного чата.
+# Учитываются всеми воркерами Celery через Redis
+TG_GLOBAL_RATE_LIMIT = float(os.getenv("TG_GLOBAL_RATE_LIMIT", default="25"))
+TG_CHAT_RATE_LIMIT = float(os.getenv("TG_CHAT_RATE_LIMIT", default="1"))
+# Максимальное время ожидания лимита (в секундах), после которого отправка переносится в отдельную задачу
+TG_RATE_LIMIT_MAX_WAIT = 2
+# Повторная отправка: количество попыток и задержки (в секундах) экспоненциального увеличения интервала
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", default="5"))
+TG_RETRY_BACKOFF = 5
+TG_RETRY_BACKOFF_MAX = 10 * 60
 
 # Redis cache
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'LOCATION': f'{os.getenv("REDIS_URL", default="redis://127.0.0.1:6379")}/1',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
-    }
+    },
+    # Сессии хранятся в отдельной БД Redis: очистка кеша страниц не завершает сессии пользователей
+    'sessions': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f'{os.getenv("REDIS_URL", default="redis://127.0.0.1:6379")}/2',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
+    },
 }
 
+# Сессии читаются из Redis (cached_db - с сохранением в БД, чтобы сессии не терялись при вытеснении из Redis;
+# django.contrib.sessions.backends.cache - только Redis)
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", default="django.contrib.sessions.backends.cached_db")
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Пользователь запроса загружается из кеша (см. users/backends.py); время жизни записи в секундах
+AUTHENTICATION_BACKENDS = ["users.backends.CachedModelBackend"]
+USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT", default="300"))
+
+# Время жизни кеша данных страниц заметок пользователя в секундах (0 - кеширование выключено), см. my_note/cache.py
+NOTE_PAGE_CACHE_TIMEOUT = int(os.getenv("NOTE_PAGE_CACHE_TIMEOUT", default=str(60 * 15)))
+
+# Сбор показателей запросов по маршрутам (см. config/metrics.py): количество и время SQL-запросов,
+# время отрисовки шаблона, время и размер ответа. Процентили отдаются в формате Prometheus по адресу /metrics/
+REQUEST_METRICS = os.getenv("REQUEST_METRICS") == "True"
+# Количество последних замеров каждого маршрута, по которым считаются процентили
+REQUEST_METRICS_SAMPLES = int(os.getenv("REQUEST_METRICS_SAMPLES", default="1000"))
+# Токен доступа к /metrics/ (заголовок Authorization: Bearer <токен>); если не задан - только сотрудникам (is_staff)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Настройка отправки почты через сервер Яндекса
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.yandex.ru'
@@ -190,6 +345,17 @@ EMAIL_USE_SSL = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  # Адрес электронной почты для отправки почты
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Пароль от сервиса яндекса для отправки почты
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER  # По умолчанию отправляем письма с этого адреса
+# Отправка писем из таблицы исходящих писем (см. users/tasks.py): количество повторов и задержки (в секундах)
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", default="5"))
+EMAIL_RETRY_BACKOFF = 60
+EMAIL_RETRY_BACKOFF_MAX = 60 * 60
+EMAIL_TIMEOUT = 10  # Таймаут SMTP-соединения в секундах
+# Неотправленные письма, время попытки которых прошло более этого времени (в секундах) назад, отправляются
+# периодической задачей
+EMAIL_OUTBOX_STALE_SECONDS = 5 * 60
+EMAIL_OUTBOX_BATCH_SIZE = 100
+# Срок действия ссылки для подтверждения email в часах
+EMAIL_CONFIRMATION_TOKEN_TTL_HOURS = int(os.getenv("EMAIL_CONFIRMATION_TOKEN_TTL_HOURS", default="48"))
 
 # Для тестирования (использует консоль вместо реальной отправки)
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -203,3 +369,16 @@ if 'test' in sys.argv:
             'NAME': BASE_DIR / 'db.sqlite3',  # Файл БД SQLite в корне проекта
         }
     }
+    CELERY_TASK_ALWAYS_EAGER = True  # Задачи Celery выполняются сразу, без брокера сообщений
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',  # Кеш в памяти вместо Redis
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+        },
+    }
+    NOTE_PAGE_CACHE_TIMEOUT = 0  # Кеширование страниц заметок включается в отдельных тестах
+    # Тесты не требуют collectstatic (манифест хешированных имен проверяется отдельным тестом)
+    STORAGES["staticfiles"]["BACKEND"] = "django.contrib.staticfiles.storage.StaticFilesStorage"
@@ -0,0 +1,58 @@
+"""Хранилище статических файлов для продакшена.
+
+Файлы собираются командой collectstatic с хешем содержимого в имени (ManifestStaticFilesStorage), поэтому nginx
+отдает их с заголовком ``Cache-Control: immutable`` на год, а при изменении файла меняется и его URL.
+Для текстовых файлов рядом сохраняются сжатые копии ``.gz`` и ``.br`` (если установлен пакет brotli),
+которые nginx отдает без сжатия на лету (gzip_static / brotli_static).
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Без пакета brotli создаются только копии .gz
+    brotli = None
+
+# Расширения файлов, которые имеет смысл сжимать (изображения и шрифты уже сжаты)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+# Файлы меньше этого размера (в байтах) не сжимаются: выигрыш меньше накладных расходов
+COMPRESS_MIN_SIZE = 256
+
+
+def compress_content(content):
+    """Сжатые варианты содержимого файла: {'.gz': ..., '.br': ...}. Варианты не меньше исходного не возвращаются"""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return {extension: data for extension, data in variants.items() if len(data) < len(content)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статические файлы с хешем содержимого в имени и заранее сжатыми копиями"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        # Сжимаются итоговые файлы после всех проходов замены ссылок (CSS обрабатывается несколько раз)
+        for hashed_name in sorted(hashed_names):
+            self.compress_file(hashed_name)
+
+    def compress_file(self, name):
+        """Сохранение сжатых копий файла name. Возвращает True, если копии созданы"""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or self.size(name) < COMPRESS_MIN_SIZE:
+            return False
+        with self.open(name) as file:
+            variants = compress_content(file.read())
+        for extension, data in variants.items():
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(data))
+        return bool(variants)
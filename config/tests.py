@@ -0,0 +1,293 @@
+import gzip
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from asgiref.sync import iscoroutinefunction
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from config.metrics import RequestMetricsMiddleware, get_metrics_store, quantile
+from config.object_storage import MediaS3Storage
+from config.storage import compress_content
+from my_note.models import Note, NoteImage
+from users.models import User
+
+
+class HealthViewTest(TestCase):
+    """Тесты проверки работоспособности приложения"""
+
+    def setUp(self):
+        self.client = Client()
+        self.health_url = reverse('health')
+
+    def test_health_ok(self):
+        """Тест ответа при доступной БД"""
+        response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_health_database_unavailable(self):
+        """Тест ответа при недоступной БД"""
+        with patch('config.views.connection.cursor', side_effect=OperationalError):
+            response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 503)
+
+    @override_settings(DB_POOL=True)
+    def test_health_database_pool_stats(self):
+        """Тест показателей пула соединений с БД"""
+        pool = Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 3, 'requests_num': 10, 'requests_wait_ms': 25}
+        with patch.object(type(connection), 'pool', pool, create=True):
+            response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['database_pool']
+        self.assertEqual(stats['pool_size'], 4)
+        self.assertEqual(stats['average_wait_ms'], 2.5)
+
+
+@override_settings(REQUEST_METRICS=True, METRICS_TOKEN=None)
+class RequestMetricsTest(TestCase):
+    """Тесты сбора показателей запросов"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client = Client()  # Middleware загружаются клиентом с учетом REQUEST_METRICS
+        self.client.force_login(self.user)
+        get_metrics_store().clear()
+
+    def test_request_metrics_recorded_by_view_name(self):
+        """Тест замера показателей запроса с тегом по имени маршрута"""
+        response = self.client.get(reverse('my_note:note_list'))
+        samples = get_metrics_store().get_all()['my_note:note_list']
+        self.assertEqual(len(samples), 1)
+        sample = samples[0]
+        self.assertGreater(sample['queries'], 0)
+        self.assertGreater(sample['render_time'], 0)
+        self.assertEqual(sample['size'], len(response.content))
+        self.assertEqual(sample['status'], 200)
+
+    async def test_async_request_metrics(self):
+        """Тест замера асинхронного запроса: middleware не переключается в синхронный режим
+        и учитывает запросы асинхронного ORM"""
+        async def get_response(request):
+            request.resolver_match = resolve(reverse('my_note:note_list'))
+            await User.objects.acount()
+            return HttpResponse('ok')
+
+        middleware = RequestMetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+
+        self.assertEqual(response.content, b'ok')
+        samples = get_metrics_store().get_all()['my_note:note_list']
+        self.assertEqual(samples[0]['queries'], 1)
+
+    def test_metrics_endpoint(self):
+        """Тест процентилей показателей в формате Prometheus"""
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('my_note:home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE django_request_db_queries summary', body)
+        self.assertIn('django_request_duration_seconds{view="my_note:home",quantile="0.95"}', body)
+        self.assertIn('django_request_response_size_bytes_count{view="my_note:home"} 1', body)
+
+    def test_metrics_endpoint_without_token_requires_staff(self):
+        """Тест: без METRICS_TOKEN показатели недоступны обычным и анонимным пользователям"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(Client().get(reverse('metrics')).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_token(self):
+        """Тест доступа к показателям по токену"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_metrics_disabled(self):
+        """Тест выключенного сбора показателей"""
+        client = Client()
+        client.get(reverse('my_note:home'))
+        self.assertEqual(get_metrics_store().get_all(), {})
+        self.assertEqual(client.get(reverse('metrics')).status_code, 404)
+
+    def test_quantile(self):
+        """Тест расчета процентиля"""
+        values = list(range(1, 101))
+        self.assertEqual(quantile(values, 0.5), 50)
+        self.assertEqual(quantile(values, 0.99), 99)
+        self.assertEqual(quantile([7], 0.95), 7)
+
+
+class StaticFilesStorageTest(TestCase):
+    """Тесты сборки статических файлов с хешами в именах и сжатыми копиями"""
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.static_root, ignore_errors=True)
+
+    def test_compress_content(self):
+        """Тест сжатых вариантов содержимого"""
+        content = b'body { margin: 0; } ' * 100
+        variants = compress_content(content)
+        self.assertEqual(gzip.decompress(variants['.gz']), content)
+        self.assertEqual(compress_content(b'x'), {})  # Сжатие не уменьшает размер
+
+    def test_collectstatic_hashed_and_compressed(self):
+        """Тест collectstatic: манифест хешированных имен и копии .gz рядом с хешированными файлами"""
+        storages = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'config.storage.CompressedManifestStaticFilesStorage'},
+        }
+        with self.settings(STATIC_ROOT=self.static_root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+        manifest = json.loads((Path(self.static_root) / 'staticfiles.json').read_text())
+        hashed_name = manifest['paths']['css/bootstrap.min.css']
+        self.assertRegex(hashed_name, r'^css/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        compressed = Path(self.static_root) / f'{hashed_name}.gz'
+        self.assertTrue(compressed.exists())
+        self.assertEqual(
+            gzip.decompress(compressed.read_bytes()), (Path(self.static_root) / hashed_name).read_bytes()
+        )
+
+
+class ProtectedMediaTest(TestCase):
+    """Тесты доступа к медиафайлам через X-Accel-Redirect"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=True)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        note = Note.objects.create(title='Photo', content='Content', owner=self.owner)
+        self.note_image = NoteImage.objects.create(
+            note=note, image=SimpleUploadedFile('photo.jpg', b'jpeg-data', content_type='image/jpeg')
+        )
+        self.url = f'{settings.MEDIA_URL}{self.note_image.image.name}'
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_owner_gets_accel_redirect(self):
+        """Тест: владельцу файл отдается через внутренний location nginx"""
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.note_image.image.name}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+        self.assertEqual(response.content, b'')  # Файл передает nginx, а не Django
+
+    def test_other_user_and_anonymous_denied(self):
+        """Тест: чужой и анонимный пользователь получают 404"""
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_rendition_access_by_note_image_id(self):
+        """Тест доступа к копии изображения по id изображения в пути"""
+        url = f'{settings.MEDIA_URL}my_note/photo/renditions/{self.note_image.pk}/photo_card_150.webp'
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_avatar_access(self):
+        """Тест доступа к аватару: только сам пользователь"""
+        self.owner.avatar = SimpleUploadedFile('me.png', b'png-data', content_type='image/png')
+        self.owner.save()
+        url = f'{settings.MEDIA_URL}{self.owner.avatar.name}'
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_path_traversal_rejected(self):
+        """Тест: пути за пределами MEDIA_ROOT отклоняются"""
+        self.client.force_login(self.owner)
+        for path in ('my_note/photo/../../config/settings.py', 'my_note//photo/photo.jpg', 'unknown/file.txt'):
+            self.assertEqual(self.client.get(f'{settings.MEDIA_URL}{path}').status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=False)
+    def test_served_by_django_without_nginx(self):
+        """Тест: без nginx файл отдает Django (после той же проверки доступа)"""
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), b'jpeg-data')
+
+
+class MediaS3StorageTest(TestCase):
+    """Тесты подписанных ссылок S3-хранилища медиафайлов (без обращения к хранилищу)"""
+
+    def setUp(self):
+        self.storage = MediaS3Storage(
+            bucket_name='my-note-media',
+            endpoint_url='http://minio:9000',
+            public_endpoint_url='http://localhost:9000',
+            access_key='access',
+            secret_key='secret',
+            signature_version='s3v4',
+            addressing_style='path',
+            querystring_expire=600,
+        )
+
+    def test_presigned_url_for_browser(self):
+        """Тест: ссылка подписана для адреса хранилища, доступного браузеру"""
+        url = self.storage.url('my_note/photo/photo.jpg')
+        self.assertTrue(url.startswith('http://localhost:9000/my-note-media/my_note/photo/photo.jpg?'))
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertIn('X-Amz-Expires=600', url)
+
+    def test_presigned_url_reused(self):
+        """Тест: подписанная ссылка не меняется в течение половины срока действия"""
+        url = self.storage.url('my_note/photo/photo.jpg')
+        with patch.object(self.storage.public_client, 'generate_presigned_url', return_value='new-url') as sign_mock:
+            self.assertEqual(self.storage.url('my_note/photo/photo.jpg'), url)
+            sign_mock.assert_not_called()
+            with patch('config.object_storage.time.monotonic', return_value=10 ** 9):
+                self.assertEqual(self.storage.url('my_note/photo/photo.jpg'), 'new-url')
+
+    def test_multipart_upload_config(self):
+        """Тест настройки загрузки больших файлов частями"""
+        self.assertEqual(self.storage.transfer_config.multipart_threshold, 8 * 1024 * 1024)
+
+    def test_presigned_post_for_browser(self):
+        """Тест: форма загрузки подписана для адреса хранилища, доступного браузеру, с ограничениями файла"""
+        target = self.storage.presigned_post('my_note/photo/uploads/photo.jpg', 'image/jpeg', 1024)
+        self.assertEqual(target['url'], 'http://localhost:9000/my-note-media')
+        self.assertEqual(target['fields']['key'], 'my_note/photo/uploads/photo.jpg')
+        self.assertEqual(target['fields']['Content-Type'], 'image/jpeg')
+        self.assertIn('x-amz-signature', target['fields'])
+
+    def test_read_head(self):
+        """Тест чтения начала файла и его размера одним запросом с заголовком Range"""
+        client = self.storage.connection.meta.client
+        response = {'Body': BytesIO(b'head'), 'ContentRange': 'bytes 0-3/5000', 'ContentLength': 4}
+        with patch.object(client, 'get_object', return_value=response) as get_mock:
+            self.assertEqual(self.storage.read_head('my_note/photo/photo.jpg', 4), (b'head', 5000))
+        self.assertEqual(get_mock.call_args.kwargs['Range'], 'bytes=0-3')
+
+        error = ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        with patch.object(client, 'get_object', side_effect=error), self.assertRaises(FileNotFoundError):
+            self.storage.read_head('my_note/photo/missing.jpg', 4)
@@ -1,14 +1,15 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from config.views import health, metrics, protected_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('health/', health, name='health'),
+    path('metrics/', metrics, name='metrics'),
+    # Медиафайлы отдаются только владельцам (через X-Accel-Redirect nginx, см. config/media.py)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", protected_media, name='protected_media'),
     path('', include('my_note.urls', namespace='my_note')),
     path('users/', include('users.urls', namespace='users')),
 ]
-
-# Динамическое добавление URL-шаблонов для раздачи медиафайлов через Django-сервер в режиме отладки.
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,75 @@
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.static import serve
+
+from config.media import can_access_media, normalize_media_path
+from config.metrics import format_prometheus, get_metrics_store
+
+
+def database_pool_stats():
+    """Показатели пула соединений с БД процесса-воркера (при DB_POOL=True): размер пула, свободные соединения,
+    ожидающие запросы и среднее время ожидания соединения из пула в миллисекундах"""
+    stats = connection.pool.get_stats()
+    requests_num = stats.get('requests_num', 0)
+    return {
+        'pool_size': stats.get('pool_size', 0),
+        'pool_available': stats.get('pool_available', 0),
+        'requests_waiting': stats.get('requests_waiting', 0),
+        'requests_num': requests_num,
+        'requests_wait_ms': stats.get('requests_wait_ms', 0),
+        'average_wait_ms': stats.get('requests_wait_ms', 0) / requests_num if requests_num else 0,
+        'requests_errors': stats.get('requests_errors', 0),
+    }
+
+
+def health(request):
+    """Проверка работоспособности приложения для healthcheck контейнера и балансировщика: процесс отвечает
+    и БД доступна. При недоступности БД - статус 503"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        return JsonResponse({'status': 'error', 'database': 'unavailable'}, status=503)
+    data = {'status': 'ok'}
+    if settings.DB_POOL:
+        data['database_pool'] = database_pool_stats()
+    return JsonResponse(data)
+
+
+def metrics(request):
+    """Процентили показателей запросов по маршрутам в формате Prometheus (при REQUEST_METRICS=True).
+    Если задан METRICS_TOKEN, запрос должен содержать заголовок Authorization: Bearer <METRICS_TOKEN>,
+    иначе показатели доступны только сотрудникам (остальным - 404, адрес не раскрывается)"""
+    if not settings.REQUEST_METRICS:
+        raise Http404('Сбор показателей запросов выключен')
+    if not settings.METRICS_TOKEN:
+        if not request.user.is_staff:
+            raise Http404
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        format_prometheus(get_metrics_store().get_all()), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def protected_media(request, path):
+    """Медиафайл пользователя (изображение заметки или аватар) после проверки доступа (см. config/media.py).
+    Файл отдает nginx по заголовку X-Accel-Redirect; чужие и несуществующие файлы - ошибка 404"""
+    path = normalize_media_path(path)
+    if path is None or not can_access_media(request.user, path):
+        raise Http404('Файл не найден')
+
+    if not settings.MEDIA_ACCEL_REDIRECT:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    else:
+        content_type, _ = mimetypes.guess_type(path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response['X-Accel-Redirect'] = quote(f'{settings.MEDIA_ACCEL_REDIRECT_LOCATION}{path}')
+    # Имена файлов не повторяются (новый файл - новое имя), но файлы доступны только владельцу
+    response['Cache-Control'] = f'private, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    return response
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MyNoteConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "my_note"
+
+    def ready(self):
+        """Подключение обработчиков сигналов"""
+        import my_note.signals  # noqa: F401
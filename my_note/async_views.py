@@ -0,0 +1,136 @@
+"""Асинхронные варианты представлений главной страницы, списка и детальной страницы заметки.
+
+Используются при запуске через ASGI (uvicorn) с переменной окружения NOTE_ASYNC_VIEWS=True (см. my_note/urls.py).
+Запросы к БД выполняются асинхронным API ORM (afirst, aget, acount, асинхронная итерация), кеш - через aget/aset,
+поэтому ожидание БД, Redis и медленных клиентов не занимает поток воркера.
+Шаблоны отрисовываются обработчиком Django после представления (TemplateResponse), как и у синхронных представлений.
+"""
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.views import View
+from django.views.generic.base import ContextMixin
+
+from my_note.cache import aget_cached, aset_cached
+from my_note.forms import NoteSearchForm
+from my_note.models import Note
+from my_note.pagination import CursorPaginator
+from my_note.stats import aget_note_stats
+from my_note.views import HomeView, NoteDetailView, NoteListView
+
+
+class AsyncUserMixin:
+    """Асинхронная загрузка пользователя до вызова обработчика: синхронное обращение к request.user
+    в асинхронном представлении выполнило бы запрос к БД в цикле событий"""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """Асинхронный вариант LoginRequiredMixin"""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class AsyncHomeView(AsyncUserMixin, HomeView):
+    """ Асинхронный вариант HomeView """
+
+    async def aget_home_data(self):
+        """ Последние заметки и счетчики заметок пользователя (из кеша пользователя, если данные не менялись) """
+        user_id = self.request.user.pk
+        home_data = await aget_cached(user_id, 'home', ())
+        if home_data is None:
+            notes = Note.objects.filter(owner=self.request.user)
+            home_data = {
+                'recent_notes': [note async for note in notes[:5]],
+                'note_stats': await aget_note_stats(self.request.user),
+            }
+            await aset_cached(user_id, 'home', (), home_data)
+        return home_data
+
+    async def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            self.home_data = await self.aget_home_data()  # Используется синхронным get_home_data
+        self.object_list = self.get_queryset()
+        return self.render_to_response(self.get_context_data())
+
+
+class AsyncNoteListView(AsyncLoginRequiredMixin, NoteListView):
+    """ Асинхронный вариант NoteListView """
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """ Асинхронный вариант paginate_queryset: заметки страницы и количество заметок из кеша пользователя,
+        счетчиков NoteStats (список без поиска) или запроса acount (результаты поиска) """
+        user_id = self.request.user.pk
+        cache_parts = self.get_cache_parts()
+        cached = await aget_cached(user_id, 'note_list', cache_parts)
+
+        if self.use_cursor_pagination():
+            paginator = CursorPaginator(queryset, page_size, approximate=settings.NOTE_LIST_APPROXIMATE_COUNT)
+            if cached:
+                paginator._count, page = cached
+            else:
+                page = await paginator.apage(self.request.GET.get('cursor'))
+                await aset_cached(user_id, 'note_list', cache_parts, (await paginator.acount(), page))
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        paginator = self.paginator_class(
+            queryset, page_size, orphans=self.get_paginate_orphans(), allow_empty_first_page=self.get_allow_empty()
+        )
+        if cached:
+            count, page_number, notes = cached
+        elif self.search_query:
+            count, page_number, notes = await queryset.acount(), None, None
+        else:
+            count, page_number, notes = (await aget_note_stats(self.request.user)).total_notes, None, None
+        paginator.count = count
+
+        if page_number is None:
+            page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+            if page_number == 'last':
+                page_number = paginator.num_pages
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(f'Неверная страница ({page_number}): {e}')
+
+        if notes is None:
+            # Срез запроса страницы ленивый: заметки загружаются асинхронной итерацией (с предзагрузкой изображений)
+            notes = [note async for note in page.object_list]
+            await aset_cached(user_id, 'note_list', cache_parts, (paginator.count, page.number, notes))
+        page.object_list = notes
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()  # Запрос ленивый: обращения к БД выполняются при пагинации
+        paginator, page, notes, is_paginated = await self.apaginate_queryset(queryset, self.get_paginate_by(queryset))
+        self.object_list = notes
+        context = ContextMixin.get_context_data(
+            self,
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=is_paginated,
+            object_list=notes,
+            search_form=NoteSearchForm(self.request.GET),
+            cursor_pagination=self.use_cursor_pagination(),
+            **{self.context_object_name: notes},
+        )
+        return self.render_to_response(context)
+
+
+class AsyncNoteDetailView(AsyncLoginRequiredMixin, NoteDetailView):
+    """ Асинхронный вариант NoteDetailView """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs[self.pk_url_kwarg])
+        except Note.DoesNotExist:
+            raise Http404('Заметка не найдена')
+        return self.render_to_response(self.get_context_data(object=self.object))
@@ -0,0 +1,324 @@
+"""Набор замеров производительности страниц заметок на реалистичном объеме данных.
+
+Данные создаются командой ``seed_benchmark_data`` (N пользователей по M заметок с русским текстом и изображениями),
+замеры выполняются командой ``benchmark``: запросы к представлениям отправляются тестовым клиентом Django
+в том же процессе (без сети и веб-сервера), для каждого сценария выводятся задержки p50/p95 и количество
+SQL-запросов на запрос. Генератор использует фиксированное зерно случайных чисел, поэтому данные воспроизводимы.
+Фоновые задачи (создание копий изображений, удаление файлов) на время замеров не ставятся в очередь,
+сообщения в Telegram не отправляются.
+"""
+import random
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from config.metrics import QueryTimer, quantile
+from my_note.models import Note, NoteImage
+from my_note.pagination import NEXT, encode_cursor
+from my_note.stats import rebuild_note_stats
+from my_note.tasks import delete_media_files
+from users.models import User
+from users.tasks import deliver_reminder_batch, iter_reminder_batches
+
+# Пользователи набора данных отличаются доменом email (удаляются командой seed_benchmark_data --clear)
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.my-note.local'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+WORDS = (
+    'день утро вечер работа встреча проект дом семья друзья прогулка парк город погода дождь солнце снег '
+    'книга фильм музыка концерт поездка отпуск море горы дорога поезд самолет магазин покупки подарок '
+    'праздник обед ужин завтрак кофе чай спорт тренировка бег велосипед здоровье врач сон усталость '
+    'настроение радость грусть мысли идея план цель задача успех ошибка урок учеба экзамен курс язык '
+    'программа код релиз коллеги начальник отчет звонок письмо новости выходные дача сад цветы кошка '
+    'собака ребенок родители бабушка важно интересно сложно легко долго быстро снова наконец сегодня '
+    'вчера завтра неделя месяц год вспомнить записать сделать успеть купить позвонить прочитать'
+).split()
+
+
+def russian_text(rnd, min_words, max_words):
+    """Случайный текст из русских слов: предложения по 4-12 слов"""
+    words_left = rnd.randint(min_words, max_words)
+    sentences = []
+    while words_left > 0:
+        length = min(words_left, rnd.randint(4, 12))
+        words_left -= length
+        sentence = ' '.join(rnd.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + (rnd.choice('!?') if rnd.random() < 0.1 else '.'))
+    return ' '.join(sentences)
+
+
+def benchmark_image(seed=0, size=(1200, 900)):
+    """JPEG-изображение размером с фотографию с телефона после уменьшения (градиент с шумом)"""
+    rnd = random.Random(seed)
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    image = Image.blend(image, Image.effect_noise(size, 40).convert('RGB'), 0.3)
+    image = Image.blend(image, Image.new('RGB', size, tuple(rnd.randrange(256) for _ in range(3))), 0.5)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def benchmark_users():
+    """Пользователи набора данных для замеров"""
+    return User.objects.filter(email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}')
+
+
+def clear_benchmark_data():
+    """Удаление пользователей набора данных вместе с заметками. Возвращает количество удаленных пользователей"""
+    users = benchmark_users()
+    count = users.count()
+    paths = [
+        path
+        for note_image in NoteImage.objects.filter(note__owner__in=users).iterator()
+        for path in note_image.get_file_paths()
+    ]
+    # Файлы удаляются одной задачей в этом процессе, а не отдельной задачей на каждое изображение
+    with offline_tasks(), transaction.atomic():
+        users.delete()
+    delete_media_files(paths)
+    return count
+
+
+def seed_benchmark_data(users=50, notes=500, image_ratio=0.3, reminder_ratio=0.5, seed=1, batch_size=1000):
+    """Создание users пользователей по notes заметок (за последний год, доля image_ratio - с 1-2 изображениями).
+    Доля reminder_ratio пользователей получает напоминания в Telegram.
+    Записи создаются bulk_create в обход сигналов, поэтому счетчики заметок пересчитываются в конце.
+    Возвращает список созданных пользователей"""
+    rnd = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    first_index = benchmark_users().count()
+    created_users = User.objects.bulk_create([
+        User(
+            email=f'user{index}@{BENCHMARK_EMAIL_DOMAIN}',
+            username=f'benchmark_{index}',
+            password=password,
+            is_active=True,
+            is_recalled_daily=rnd.random() < reminder_ratio,
+            tg_chat_id=str(100000000 + index),
+        )
+        for index in range(first_index, first_index + users)
+    ], batch_size=batch_size)
+    # id нужны для заметок, а bulk_create возвращает их не во всех СУБД
+    created_users = list(benchmark_users().filter(username__in=[user.username for user in created_users]))
+
+    image_content = benchmark_image(seed)
+    now = timezone.now()
+    for user in created_users:
+        Note.objects.bulk_create([
+            Note(
+                owner=user,
+                title=russian_text(rnd, 2, 6).rstrip('.!?'),
+                content=russian_text(rnd, 20, 200),
+                is_important=rnd.random() < 0.15,
+            )
+            for _ in range(notes)
+        ], batch_size=batch_size)
+        user_notes = list(Note.objects.filter(owner=user).order_by('pk'))
+        # Даты создания распределяются по последнему году (auto_now_add задает всем заметкам текущее время)
+        for index, note in enumerate(user_notes):
+            note.created_at = note.updated_at = now - timedelta(days=365) * (1 - index / max(1, notes))
+        Note.objects.bulk_update(user_notes, ['created_at', 'updated_at'], batch_size=batch_size)
+
+        images = []
+        for note in user_notes:
+            if rnd.random() < image_ratio:
+                for _ in range(rnd.randint(1, 2)):
+                    note_image = NoteImage(note=note, status=NoteImage.Status.READY)
+                    note_image.image.save(f'benchmark_{note.pk}.jpg', ContentFile(image_content), save=False)
+                    images.append(note_image)
+        NoteImage.objects.bulk_create(images, batch_size=batch_size)
+
+    rebuild_note_stats([user.pk for user in created_users])
+    return created_users
+
+
+class Scenario(ABC):
+    """Сценарий замера: запрос к представлению от имени пользователя набора данных"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def prepare(self, user):
+        """Подготовка данных сценария для пользователя (не входит в замер)"""
+        return None
+
+    @abstractmethod
+    def request(self, client, user, state, iteration):
+        """Запрос сценария. Возвращает ответ"""
+
+
+class GetScenario(Scenario):
+    """GET-запрос по URL, построенному функцией build_url(user, state)"""
+
+    def __init__(self, name, build_url, prepare=None):
+        super().__init__(name)
+        self.build_url = build_url
+        if prepare is not None:
+            self.prepare = prepare
+
+    def request(self, client, user, state, iteration):
+        return client.get(self.build_url(user, state))
+
+
+class NoteFormScenario(Scenario):
+    """Создание заметки или изменение последней заметки пользователя с загрузкой изображения"""
+
+    def __init__(self, name, update=False):
+        super().__init__(name)
+        self.update = update
+        self.image_content = benchmark_image(seed=2, size=(2000, 1500))
+
+    def prepare(self, user):
+        return Note.objects.filter(owner=user).values_list('pk', flat=True).first()
+
+    def request(self, client, user, state, iteration):
+        url = reverse('my_note:note_update', args=[state]) if self.update else reverse('my_note:note_create')
+        return client.post(url, {
+            'title': f'Заметка для замера {iteration}',
+            'content': russian_text(random.Random(iteration), 50, 100),
+            'image_1': SimpleUploadedFile(f'photo_{iteration}.jpg', self.image_content, content_type='image/jpeg'),
+        })
+
+
+def deep_list_state(user):
+    """Курсор страницы в конце списка заметок пользователя (только для курсорной пагинации)"""
+    if settings.NOTE_LIST_PAGINATION != 'cursor':
+        return None
+    notes = Note.objects.filter(owner=user)
+    note = notes.order_by('-created_at', '-pk')[max(0, notes.count() - 11):].first()
+    return encode_cursor(NEXT, note) if note else ''
+
+
+def deep_list_url(user, state):
+    """Адрес страницы в конце списка заметок для настроенного режима пагинации: последняя страница
+    параметром page=last или страница по курсору"""
+    if settings.NOTE_LIST_PAGINATION == 'cursor':
+        return f"{reverse('my_note:note_list')}?cursor={state}"
+    return f"{reverse('my_note:note_list')}?page=last"
+
+
+def search_state(user):
+    """Поисковый запрос: слово из последней заметки пользователя"""
+    note = Note.objects.filter(owner=user).first()
+    return note.title.split()[0].lower() if note else 'день'
+
+
+def first_note_state(user):
+    """Id последней заметки пользователя"""
+    return Note.objects.filter(owner=user).values_list('pk', flat=True).first()
+
+
+def get_scenarios():
+    """Сценарии замеров по порядку вывода"""
+    return [
+        GetScenario('home', lambda user, state: reverse('my_note:home')),
+        GetScenario('note_list', lambda user, state: reverse('my_note:note_list')),
+        GetScenario('note_list_deep', deep_list_url, prepare=deep_list_state),
+        GetScenario(
+            'note_search',
+            lambda user, state: f"{reverse('my_note:note_list')}?query={state}",
+            prepare=search_state,
+        ),
+        GetScenario(
+            'note_detail',
+            lambda user, state: reverse('my_note:note_detail', args=[state]),
+            prepare=first_note_state,
+        ),
+        NoteFormScenario('note_create'),
+        NoteFormScenario('note_update', update=True),
+    ]
+
+
+def measure(func):
+    """Выполнение func с замером времени (в секундах) и количества SQL-запросов"""
+    timer = QueryTimer()
+    started = time.perf_counter()
+    with connection.execute_wrapper(timer):
+        result = func()
+    return result, time.perf_counter() - started, timer.queries
+
+
+def summarize(name, durations, queries):
+    """Сводка замеров сценария: количество, задержки p50/p95 в миллисекундах и SQL-запросов на запрос"""
+    durations = sorted(durations)
+    return {
+        'scenario': name,
+        'requests': len(durations),
+        'p50_ms': quantile(durations, 0.5) * 1000,
+        'p95_ms': quantile(durations, 0.95) * 1000,
+        'queries_avg': sum(queries) / len(queries),
+        'queries_max': max(queries),
+    }
+
+
+def offline_tasks():
+    """Отключение постановки задач с изображениями в очередь на время замеров (см. my_note.tasks.dispatch)"""
+    return override_settings(NOTE_IMAGE_TASKS=False)
+
+
+def offline_send_messages(messages):
+    """Замена отправки напоминаний в Telegram на время замеров: все сообщения считаются доставленными"""
+    return {'delivered': len(messages), 'failed': 0, 'deferred': []}
+
+
+def run_benchmarks(iterations=50, users=10, scenario_names=None):
+    """Выполнение сценариев: iterations запросов каждого сценария по очереди от имени users пользователей
+    набора данных, затем рассылка напоминаний всем получателям. Возвращает список сводок по сценариям"""
+    sample_users = list(benchmark_users().filter(is_active=True).order_by('pk')[:users])
+    if not sample_users:
+        raise ValueError('Нет данных для замеров: сначала выполните команду seed_benchmark_data')
+
+    clients = {}
+    for user in sample_users:
+        clients[user.pk] = Client()
+        clients[user.pk].force_login(user)
+
+    scenarios = [
+        scenario for scenario in get_scenarios() if scenario_names is None or scenario.name in scenario_names
+    ]
+    results = []
+    with offline_tasks():
+        for scenario in scenarios:
+            states = {user.pk: scenario.prepare(user) for user in sample_users}
+            durations, queries = [], []
+            for iteration in range(iterations):
+                user = sample_users[iteration % len(sample_users)]
+                response, duration, query_count = measure(
+                    lambda: scenario.request(clients[user.pk], user, states[user.pk], iteration)
+                )
+                if response.status_code >= 400:
+                    raise ValueError(f'Сценарий {scenario.name}: ответ {response.status_code}')
+                durations.append(duration)
+                queries.append(query_count)
+            results.append(summarize(scenario.name, durations, queries))
+
+        if scenario_names is None or 'reminder_fanout' in scenario_names:
+            results.append(run_reminder_fanout(max(1, iterations // 10)))
+    return results
+
+
+def run_reminder_fanout(iterations):
+    """Рассылка напоминаний всем получателям: разбиение на пакеты и обработка каждого пакета
+    (без отправки в Telegram). Замеряется рассылка целиком, SQL-запросы - на всю рассылку"""
+    durations, queries = [], []
+    for _ in range(iterations):
+        _, duration, query_count = measure(
+            lambda: [
+                deliver_reminder_batch(first_id, last_id, send_messages=offline_send_messages)
+                for first_id, last_id in iter_reminder_batches(settings.TG_REMINDER_BATCH_SIZE)
+            ]
+        )
+        durations.append(duration)
+        queries.append(query_count)
+    return summarize('reminder_fanout', durations, queries)
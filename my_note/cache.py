@@ -0,0 +1,77 @@
+"""Кеширование данных страниц заметок отдельно для каждого пользователя.
+
+Ключ кеша содержит id пользователя и номер версии его заметок. Версия меняется при любом изменении заметок
+или изображений пользователя (см. my_note/signals.py), поэтому устаревшие записи кеша больше не читаются
+и удаляются из кеша по истечении времени жизни.
+Кешируются данные (заметки и количество), а не HTML страницы: в HTML есть CSRF-токен и сообщения пользователю.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def version_key(user_id):
+    """Ключ версии заметок пользователя"""
+    return f'notes:version:{user_id}'
+
+
+def get_notes_version(user_id):
+    """Текущая версия заметок пользователя.
+    Версия - время в наносекундах, поэтому после вытеснения ключа из кеша не повторяет прежние значения"""
+    version = cache.get(version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key(user_id), version, None)
+    return version
+
+
+async def aget_notes_version(user_id):
+    """Асинхронный вариант get_notes_version"""
+    version = await cache.aget(version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        await cache.aset(version_key(user_id), version, None)
+    return version
+
+
+def bump_notes_version(user_id):
+    """Смена версии заметок пользователя: все закешированные данные его страниц становятся неактуальными"""
+    cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def user_cache_key(user_id, name, parts, version=None):
+    """Ключ кеша данных страницы name пользователя с учетом параметров запроса parts"""
+    if version is None:
+        version = get_notes_version(user_id)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'notes:{user_id}:{version}:{name}:{digest}'
+
+
+def get_cached(user_id, name, parts):
+    """Получение данных страницы из кеша (None - данных нет или кеширование выключено)"""
+    if not settings.NOTE_PAGE_CACHE_TIMEOUT:
+        return None
+    return cache.get(user_cache_key(user_id, name, parts))
+
+
+def set_cached(user_id, name, parts, value):
+    """Сохранение данных страницы в кеш"""
+    if settings.NOTE_PAGE_CACHE_TIMEOUT:
+        cache.set(user_cache_key(user_id, name, parts), value, settings.NOTE_PAGE_CACHE_TIMEOUT)
+
+
+async def aget_cached(user_id, name, parts):
+    """Асинхронный вариант get_cached"""
+    if not settings.NOTE_PAGE_CACHE_TIMEOUT:
+        return None
+    version = await aget_notes_version(user_id)
+    return await cache.aget(user_cache_key(user_id, name, parts, version))
+
+
+async def aset_cached(user_id, name, parts, value):
+    """Асинхронный вариант set_cached"""
+    if settings.NOTE_PAGE_CACHE_TIMEOUT:
+        version = await aget_notes_version(user_id)
+        await cache.aset(user_cache_key(user_id, name, parts, version), value, settings.NOTE_PAGE_CACHE_TIMEOUT)
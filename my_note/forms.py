@@ -1,6 +1,11 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse
 
 from my_note.models import Note, NoteImage
+from my_note.search import SEARCH_MODES
+from my_note.tasks import delete_media_files, dispatch, process_note_image
+from my_note.uploads import MAX_IMAGE_SIZE, UPLOAD_CONTENT_TYPES, direct_uploads_enabled, verify_upload
 
 
 class NoteImageForm(forms.ModelForm):
@@ -16,16 +21,21 @@ class NoteImageForm(forms.ModelForm):
 class NoteForm(forms.ModelForm):
     """Форма для создания и редактирования записей"""
     # Поля для загрузки изображений
+    # (флажок "Очистить" у загруженного изображения удаляет его из заметки)
     image_1 = forms.ImageField(
         required=False,
-        widget=forms.FileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
         label='Изображение 1'
     )
     image_2 = forms.ImageField(
         required=False,
-        widget=forms.FileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
         label='Изображение 2'
     )
+    # Ключи файлов, загруженных браузером напрямую в хранилище (см. my_note/uploads.py)
+    image_1_key = forms.CharField(required=False, max_length=255, widget=forms.HiddenInput)
+    image_2_key = forms.CharField(required=False, max_length=255, widget=forms.HiddenInput)
+    image_fields = ('image_1', 'image_2')
 
     class Meta:
         model = Note
@@ -41,42 +51,89 @@ class NoteForm(forms.ModelForm):
             'is_important': 'Отметить заметку как важную',
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user  # Пользователь, которому выданы ключи загрузки в хранилище
+        # Изображения заметки по полям формы (при редактировании): image_1 - первое, image_2 - второе
+        self.existing_images = list(self.instance.images.all()[:len(self.image_fields)]) if self.instance.pk else []
+        for field_name, note_image in zip(self.image_fields, self.existing_images):
+            self.fields[field_name].initial = note_image.image
+
+        # При загрузке напрямую в хранилище выбранный файл отправляет скрипт шаблона, а не форма
+        self.direct_uploads = direct_uploads_enabled()
+        if self.direct_uploads:
+            for field_name in self.image_fields:
+                self.fields[field_name].widget.attrs.update({
+                    'accept': ','.join(UPLOAD_CONTENT_TYPES),
+                    'data-upload-url': reverse('my_note:note_image_upload'),
+                    'data-key-field': self[f'{field_name}_key'].auto_id,
+                })
+
     def clean(self):
-        """Проверка размера файлов"""
+        """Проверка размера новых загруженных файлов и ключей файлов, загруженных напрямую в хранилище"""
         cleaned_data = super().clean()
-        image_1 = cleaned_data.get('image_1')
-        image_2 = cleaned_data.get('image_2')
-
-        # Проверка размера файла (максимум 10 МБ)
-        max_size = 10 * 1024 * 1024
-        if image_1 and image_1.size > max_size:
-            raise forms.ValidationError("Размер файла слишком большой. Максимальный размер: 10 МБ")
 
-        elif image_2 and image_2.size > max_size:
-            raise forms.ValidationError("Размер файла слишком большой. Максимальный размер: 10 МБ")
+        # Проверка размера файла (максимум 10 МБ). Уже сохраненные изображения не проверяются (без обращения к файлам)
+        for field_name in self.image_fields:
+            image = cleaned_data.get(field_name)
+            if isinstance(image, UploadedFile) and image.size > MAX_IMAGE_SIZE:
+                raise forms.ValidationError("Размер файла слишком большой. Максимальный размер: 10 МБ")
+
+        # Файл из хранилища заменяет значение поля изображения: в NoteImage сохраняется только его путь
+        for field_name in self.image_fields:
+            key = cleaned_data.get(f'{field_name}_key')
+            if not key:
+                continue
+            if not self.direct_uploads:
+                self.add_error(field_name, 'Загрузка файлов напрямую в хранилище отключена')
+                continue
+            try:
+                verify_upload(key, self.user)
+            except forms.ValidationError as e:
+                self.add_error(field_name, e)
+            else:
+                cleaned_data[field_name] = key
 
         return cleaned_data
 
     def save(self, commit=True):
-        """Сохранение формы с проверкой на наличие изображений"""
+        """Сохранение формы. Изменяются только те изображения, которые были заменены или удалены пользователем:
+        при редактировании только текста заметки изображения и их файлы не затрагиваются."""
         note = super().save(commit=commit)
 
         if commit:
-            # Сохраняем изображения
-            image_1 = self.cleaned_data.get('image_1')
-            image_2 = self.cleaned_data.get('image_2')
-
-            # Удаляем старые изображения при редактировании
-            if self.instance.pk:
-                self.instance.images.all().delete()
-
-            if image_1:
-                NoteImage.objects.create(note=note, image=image_1)
-            if image_2:
-                NoteImage.objects.create(note=note, image=image_2)
+            for index, field_name in enumerate(self.image_fields):
+                if field_name not in self.changed_data and f'{field_name}_key' not in self.changed_data:
+                    continue
+                existing = self.existing_images[index] if index < len(self.existing_images) else None
+                self.save_image(note, existing, self.cleaned_data.get(field_name))
 
         return note
 
+    @staticmethod
+    def save_image(note, existing, uploaded):
+        """Замена, удаление или добавление изображения заметки. uploaded - загруженный файл или путь к файлу,
+        уже находящемуся в хранилище (сохраняется без повторной загрузки).
+        Файлы замененного изображения удаляются из хранилища в фоне после фиксации транзакции."""
+        if not uploaded:
+            if existing:
+                existing.delete()  # Файлы удаляются обработчиком сигнала post_delete (my_note/signals.py)
+            return
+
+        if existing:
+            old_files = existing.get_file_paths()
+            existing.image = uploaded
+            existing.renditions = {}
+            existing.status = NoteImage.Status.PENDING
+            existing.save()
+            dispatch(delete_media_files, old_files)
+            note_image = existing
+        else:
+            note_image = NoteImage.objects.create(note=note, image=uploaded)
+
+        # Уменьшенные копии создаются в фоне после фиксации транзакции
+        dispatch(process_note_image, note_image.pk)
+
 
 class NoteSearchForm(forms.Form):
     """Форма для поиска записей по заголовку или содержанию"""
@@ -88,6 +145,12 @@ class NoteSearchForm(forms.Form):
             'placeholder': 'Поиск по заголовку или содержанию...'
         }),
     )
+    # Режим поиска (если не выбран, используется режим из settings.NOTE_SEARCH_MODE)
+    mode = forms.ChoiceField(
+        choices=(('', 'Режим поиска'),) + SEARCH_MODES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
 
     def clean_query(self):
         """Валидация поискового запроса"""
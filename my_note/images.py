@@ -0,0 +1,149 @@
+"""Подготовка уменьшенных копий (рендиций) изображений к заметкам.
+
+Для каждого загруженного изображения создаются копии под размеры карточки в списке заметок и блока изображений
+на детальной странице - в форматах WebP и JPEG, для обычных экранов и экранов высокой плотности (1x/2x).
+Метаданные EXIF в копии не переносятся (ориентация снимка применяется к пикселям).
+Файлы копий хранятся в ``my_note/photo/renditions/<id изображения>/<имя исходного файла>_<копия>_<высота>.<формат>``,
+их пути и размеры - в ``NoteImage.renditions``.
+"""
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Высоты копий в пикселях для каждого места отображения (1x и 2x).
+# Карточка в списке заметок имеет высоту 150px, блок изображений детальной страницы - до 400px.
+RENDITION_HEIGHTS = {
+    'card': (150, 300),
+    'detail': (400, 800),
+}
+
+# Форматы копий: имя формата Pillow, расширение файла и параметры сохранения
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def rendition_dir(note_image):
+    """Папка для хранения копий изображения"""
+    return f'my_note/photo/renditions/{note_image.pk}'
+
+
+def read_image_file(file):
+    """Содержимое файла изображения из хранилища. Ошибки чтения (OSError) не перехватываются"""
+    file.open('rb')
+    try:
+        return file.read()
+    finally:
+        file.close()
+
+
+def decode_image(data):
+    """Декодирование изображения с учетом ориентации из EXIF и приведением к RGB.
+    Если данные не являются изображением - OSError, ValueError или Image.DecompressionBombError"""
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    if image.mode not in ('RGB', 'L'):
+        # Прозрачный фон заменяется белым (JPEG не поддерживает прозрачность)
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    return image.convert('RGB')
+
+
+def open_image(file):
+    """Открытие изображения из хранилища с учетом ориентации из EXIF и приведением к RGB"""
+    return decode_image(read_image_file(file))
+
+
+def resize_to_height(image, height):
+    """Уменьшение изображения до заданной высоты с сохранением пропорций (без увеличения)"""
+    if image.height <= height:
+        return image
+    width = max(1, round(image.width * height / image.height))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def encode_image(image, fmt):
+    """Кодирование изображения в заданный формат без метаданных"""
+    pil_format, _, options = RENDITION_FORMATS[fmt]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_renditions(note_image, source):
+    """Создание копий изображения в хранилище. Возвращает описание копий для поля NoteImage.renditions:
+    ``{'card': {'webp': [{'path': ..., 'width': ..., 'height': ...}, ...], 'jpeg': [...]}, ...}``.
+    Пути копий не зависят от попытки, поэтому повторный вызов перезаписывает те же файлы."""
+    storage = note_image.image.storage
+    # Имя исходного файла в путях копий: копии замененного изображения не совпадают с копиями нового
+    stem = PurePosixPath(note_image.image.name).stem
+    renditions = {}
+    for name, heights in RENDITION_HEIGHTS.items():
+        sizes = []
+        for height in heights:
+            resized = resize_to_height(source, height)
+            # Копии одинакового размера (исходное изображение меньше требуемого) не дублируются
+            if sizes and resized.size == sizes[-1].size:
+                break
+            sizes.append(resized)
+
+        renditions[name] = {}
+        for fmt, (_, extension, _) in RENDITION_FORMATS.items():
+            renditions[name][fmt] = []
+            for resized in sizes:
+                path = f'{rendition_dir(note_image)}/{stem}_{name}_{resized.height}.{extension}'
+                if storage.exists(path):
+                    storage.delete(path)
+                path = storage.save(path, ContentFile(encode_image(resized, fmt)))
+                renditions[name][fmt].append({'path': path, 'width': resized.width, 'height': resized.height})
+    return renditions
+
+
+def save_processing_result(note_image, image_name, update_fields):
+    """Сохранение результата обработки, только если файл изображения не заменен и не удален за время обработки:
+    иначе результат относится к прежнему файлу (его обработка могла завершиться позже обработки нового).
+    Сохранение через save() - сигнал post_save сбрасывает кеш страниц владельца"""
+    with transaction.atomic():
+        current = type(note_image)._default_manager.select_for_update().filter(pk=note_image.pk, image=image_name)
+        if not current.exists():
+            return False
+        note_image.save(update_fields=update_fields)
+    return True
+
+
+def create_renditions(note_image):
+    """Создание и сохранение копий изображения заметки с обновлением статуса обработки.
+    Если файл не удается прочитать как изображение, статус - "Ошибка обработки", в шаблонах используется
+    исходный файл. Ошибки чтения и записи хранилища не перехватываются (задача обработки повторяется).
+    Если изображение заменили во время обработки, результат не сохраняется, а созданные копии удаляются."""
+    image_name = note_image.image.name
+    data = read_image_file(note_image.image)
+    try:
+        source = decode_image(data)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning('Не удалось прочитать изображение %s: %s', note_image.pk, e)
+        note_image.status = note_image.Status.FAILED
+        save_processing_result(note_image, image_name, ['status'])
+        return False
+
+    renditions = build_renditions(note_image, source)
+    note_image.renditions = renditions
+    note_image.status = note_image.Status.READY
+    if not save_processing_result(note_image, image_name, ['renditions', 'status']):
+        logger.info('Изображение %s заменено во время обработки, копии прежнего файла удаляются', note_image.pk)
+        storage = note_image.image.storage
+        for formats in renditions.values():
+            for items in formats.values():
+                for item in items:
+                    storage.delete(item['path'])
+        return False
+    return True
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_note.benchmark import run_benchmarks
+
+
+class Command(BaseCommand):
+    """Замеры задержек и количества SQL-запросов страниц заметок на наборе данных seed_benchmark_data"""
+
+    help = 'Выполняет сценарии замеров и выводит задержки p50/p95 и количество SQL-запросов на запрос'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Количество запросов каждого сценария')
+        parser.add_argument('--users', type=int, default=10, help='Количество пользователей, выполняющих запросы')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Выполнить только этот сценарий')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON-файл')
+        # Пороги для проверки перед выпуском: при превышении команда завершается с ошибкой
+        parser.add_argument('--max-p95-ms', type=float, help='Максимальная задержка p95 в миллисекундах')
+        parser.add_argument('--max-queries', type=int, help='Максимальное количество SQL-запросов на запрос')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_benchmarks(options['iterations'], options['users'], options['scenarios'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stdout.write(
+            f"{'Сценарий':<18}{'запросов':>10}{'p50, мс':>10}{'p95, мс':>10}{'SQL ср.':>10}{'SQL макс.':>11}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['scenario']:<18}{result['requests']:>10}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                f"{result['queries_avg']:>10.1f}{result['queries_max']:>11}"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+        exceeded = [
+            result['scenario'] for result in results
+            if (options['max_p95_ms'] is not None and result['p95_ms'] > options['max_p95_ms'])
+            or (options['max_queries'] is not None and result['scenario'] != 'reminder_fanout'
+                and result['queries_max'] > options['max_queries'])
+        ]
+        if exceeded:
+            raise CommandError(f"Превышены пороги производительности: {', '.join(exceeded)}")
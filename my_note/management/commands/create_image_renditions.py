@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from my_note.images import create_renditions
+from my_note.models import NoteImage
+
+
+class Command(BaseCommand):
+    """Создание уменьшенных копий для ранее загруженных изображений к заметкам"""
+
+    help = 'Создает уменьшенные копии (WebP/JPEG) для изображений заметок, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии для всех изображений')
+
+    def handle(self, *args, **options):
+        images = NoteImage.objects.order_by('pk')
+        if not options['all']:
+            images = images.filter(renditions={})
+
+        created = failed = 0
+        for note_image in images.iterator():
+            if create_renditions(note_image):
+                created += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Создано копий: {created}, ошибок: {failed}'))
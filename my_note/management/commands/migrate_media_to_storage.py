@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from my_note.models import NoteImage
+from users.models import User
+
+
+def iter_media_paths():
+    """Пути всех медиафайлов, на которые ссылаются записи БД: изображения заметок и аватары вместе с копиями"""
+    for note_image in NoteImage.objects.order_by('pk').iterator():
+        yield from note_image.get_file_paths()
+    for user in User.objects.exclude(avatar='').exclude(avatar__isnull=True).order_by('pk').iterator():
+        yield from user.get_avatar_paths()
+
+
+class Command(BaseCommand):
+    """Перенос медиафайлов из папки на диске в текущее хранилище медиафайлов (S3 при MEDIA_STORAGE=s3).
+    Пути файлов сохраняются, поэтому записи в БД не меняются. Повторный запуск пропускает перенесенные файлы"""
+
+    help = 'Копирует изображения заметок и аватары (с копиями) из папки на диске в хранилище медиафайлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.MEDIA_ROOT), help='Папка с медиафайлами (MEDIA_ROOT)')
+        parser.add_argument('--delete-source', action='store_true', help='Удалить файлы из папки после переноса')
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать файлы для переноса')
+
+    def handle(self, *args, **options):
+        source = FileSystemStorage(location=options['source'])
+        target = default_storage
+        same_location = isinstance(target, FileSystemStorage) and (
+            Path(target.location).resolve() == Path(source.location).resolve()
+        )
+        if same_location:
+            raise CommandError('Хранилище медиафайлов совпадает с папкой-источником: задайте MEDIA_STORAGE=s3')
+
+        copied = skipped = missing = 0
+        for path in iter_media_paths():
+            if not source.exists(path):
+                missing += 1
+                continue
+            if target.exists(path):
+                skipped += 1
+            else:
+                copied += 1
+                if not options['dry_run']:
+                    with source.open(path, 'rb') as file:
+                        saved = target.save(path, file)
+                    if saved != path:
+                        raise CommandError(f'Файл {path} сохранен под другим именем: {saved}')
+            if options['delete_source'] and not options['dry_run']:
+                source.delete(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {copied}, уже в хранилище: {skipped}, отсутствуют на диске: {missing}'
+        ))
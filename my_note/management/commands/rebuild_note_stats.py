@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from my_note.stats import rebuild_note_stats
+
+
+class Command(BaseCommand):
+    """Пересчет счетчиков заметок пользователей (модель NoteStats) по таблице заметок"""
+
+    help = 'Пересчитывает счетчики заметок пользователей (всего, важных, с изображениями, дата последней заметки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Id пользователя')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuilt = rebuild_note_stats(options['user_ids'])
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано счетчиков: {rebuilt}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from my_note.benchmark import clear_benchmark_data, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    """Создание набора данных для замеров производительности (см. my_note/benchmark.py)"""
+
+    help = 'Создает пользователей с заметками и изображениями для команды benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Количество пользователей')
+        parser.add_argument('--notes', type=int, default=500, help='Количество заметок каждого пользователя')
+        parser.add_argument('--image-ratio', type=float, default=0.3, help='Доля заметок с изображениями')
+        parser.add_argument('--reminder-ratio', type=float, default=0.5, help='Доля получателей напоминаний')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора случайных чисел')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее созданный набор данных')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = clear_benchmark_data()
+            self.stdout.write(self.style.SUCCESS(f'Удалено пользователей набора данных: {deleted}'))
+            if not options['users']:
+                return
+
+        users = seed_benchmark_data(
+            users=options['users'],
+            notes=options['notes'],
+            image_ratio=options['image_ratio'],
+            reminder_ratio=options['reminder_ratio'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано пользователей: {len(users)}, заметок: {len(users) * options['notes']}"
+        ))
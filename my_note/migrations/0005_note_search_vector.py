@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Триггер поддерживает поисковый вектор в актуальном состоянии при любых INSERT/UPDATE заголовка и содержания
+# (в том числе при bulk_create и QuerySet.update(), которые не вызывают Model.save()).
+CREATE_SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION my_note_note_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.content, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER my_note_note_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON my_note_note
+    FOR EACH ROW EXECUTE FUNCTION my_note_note_search_vector_update();
+
+UPDATE my_note_note SET title = title;
+
+CREATE INDEX my_note_note_search_vector_gin ON my_note_note USING gin (search_vector);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS my_note_note_search_vector_gin;
+DROP TRIGGER IF EXISTS my_note_note_search_vector_trigger ON my_note_note;
+DROP FUNCTION IF EXISTS my_note_note_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    """Создание триггера и GIN-индекса (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    """Удаление триггера и GIN-индекса (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0004_alter_note_options"),
+    ]
+
+    operations = [
+        # B-tree индекс по тексту заметки не используется поиском по подстроке и ограничен по размеру значения
+        migrations.RemoveIndex(
+            model_name="note",
+            name="my_note_not_content_2f22c1_idx",
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Поисковый вектор"
+            ),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 16:05
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+CREATE_TRIGRAM_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS my_note_note_title_trgm ON my_note_note USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS my_note_note_content_trgm ON my_note_note USING gin (content gin_trgm_ops);
+"""
+
+DROP_TRIGRAM_INDEXES_SQL = """
+DROP INDEX IF EXISTS my_note_note_title_trgm;
+DROP INDEX IF EXISTS my_note_note_content_trgm;
+"""
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Создание триграммных GIN-индексов (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_TRIGRAM_INDEXES_SQL)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    """Удаление триграммных GIN-индексов (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGRAM_INDEXES_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0005_note_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),  # CREATE EXTENSION pg_trgm (в других СУБД операция пропускается)
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0006_note_trigram_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="note",
+            index=models.Index(fields=["owner", "-created_at", "-id"], name="note_owner_created_id_idx"),
+        ),
+    ]
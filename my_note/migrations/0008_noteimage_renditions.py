@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0007_note_owner_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="noteimage",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict, verbose_name="Уменьшенные копии"),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0008_noteimage_renditions"),
+    ]
+
+    operations = [
+        # Ранее загруженные изображения отображаются сразу (без копий - исходным файлом)
+        migrations.AddField(
+            model_name="noteimage",
+            name="status",
+            field=models.CharField(default="ready", max_length=20, verbose_name="Статус обработки"),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="noteimage",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает обработки"),
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готово"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="pending",
+                max_length=20,
+                verbose_name="Статус обработки",
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def fill_note_stats(apps, schema_editor):
+    """Подсчет счетчиков заметок для существующих пользователей"""
+    Note = apps.get_model("my_note", "Note")
+    NoteStats = apps.get_model("my_note", "NoteStats")
+    stats = Note.objects.values("owner_id").annotate(
+        total=Count("pk"),
+        important=Count("pk", filter=Q(is_important=True)),
+        last=Max("created_at"),
+    )
+    with_images = dict(
+        Note.objects.filter(images__isnull=False).values("owner_id").annotate(
+            count=Count("pk", distinct=True)
+        ).values_list("owner_id", "count")
+    )
+    NoteStats.objects.bulk_create(
+        NoteStats(
+            user_id=item["owner_id"],
+            total_notes=item["total"],
+            important_notes=item["important"],
+            notes_with_images=with_images.get(item["owner_id"], 0),
+            last_note_at=item["last"],
+        )
+        for item in stats
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_note", "0009_noteimage_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NoteStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="note_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                ("total_notes", models.PositiveIntegerField(default=0, verbose_name="Всего заметок")),
+                ("important_notes", models.PositiveIntegerField(default=0, verbose_name="Важных заметок")),
+                ("notes_with_images", models.PositiveIntegerField(default=0, verbose_name="Заметок с изображениями")),
+                ("last_note_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата последней заметки")),
+            ],
+            options={
+                "verbose_name": "Статистика заметок",
+                "verbose_name_plural": "Статистика заметок",
+            },
+        ),
+        migrations.RunPython(fill_note_stats, migrations.RunPython.noop),
+    ]
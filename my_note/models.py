@@ -1,8 +1,80 @@
-from django.db import models
+from contextlib import contextmanager
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 from config import settings
 
+# Количество изображений, отображаемых в карточке заметки
+PREVIEW_IMAGES_LIMIT = 2
+
+
+class NoteQuerySet(models.QuerySet):
+    """Набор запросов к заметкам"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._db_settings = {}
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._db_settings = self._db_settings
+        return clone
+
+    def with_db_settings(self, db_settings):
+        """Параметры PostgreSQL, которые действуют только на время выполнения запросов этого набора
+        (SET LOCAL в транзакции запроса) и не остаются в соединении для следующих запросов"""
+        clone = self._chain()
+        clone._db_settings = {**self._db_settings, **db_settings}
+        return clone
+
+    @contextmanager
+    def _applied_db_settings(self):
+        """Транзакция с параметрами with_db_settings (без параметров запрос выполняется как обычно)"""
+        if not self._db_settings:
+            yield
+            return
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                for name, value in self._db_settings.items():
+                    cursor.execute('SELECT set_config(%s, %s, true)', [name, str(value)])
+            yield
+
+    def _fetch_all(self):
+        # Асинхронная итерация также загружает результаты через _fetch_all (в потоке для синхронного кода)
+        if self._result_cache is None:
+            with self._applied_db_settings():
+                super()._fetch_all()
+        else:
+            super()._fetch_all()
+
+    def count(self):
+        with self._applied_db_settings():
+            return super().count()
+
+    def exists(self):
+        with self._applied_db_settings():
+            return super().exists()
+
+    def with_preview_images(self):
+        """Загрузка первых изображений заметок одним дополнительным запросом (атрибут preview_images)
+        и подсчет количества изображений подзапросом (аннотация image_count) вместо запросов на каждую заметку"""
+        image_count = NoteImage.objects.filter(
+            note=OuterRef('pk')
+        ).order_by().values('note').annotate(count=Count('pk')).values('count')
+        return self.annotate(
+            image_count=Coalesce(Subquery(image_count), 0),
+        ).prefetch_related(
+            Prefetch(
+                'images',
+                queryset=NoteImage.objects.order_by('created_at', 'pk')[:PREVIEW_IMAGES_LIMIT],
+                to_attr='preview_images',
+            )
+        )
+
 
 class Note(models.Model):
     """Класс для хранения заметок в дневнике"""
@@ -32,6 +104,14 @@ class Note(models.Model):
         verbose_name='Автор записи',
         related_name='notes'  # имя поля в модели User для связи с моделью Note
     )
+    # Поисковый вектор по заголовку и содержанию (заполняется триггером PostgreSQL, см. my_note/search.py)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = NoteQuerySet.as_manager()
 
     class Meta:
         """Метаданные модели.
@@ -40,15 +120,29 @@ class Note(models.Model):
         ordering = ["-created_at"]  # сортировка по дате создания (сначала новые записи)
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
-        # индексы для поиска по заголовку и содержанию
+        # индекс для поиска по заголовку.
+        # GIN-индекс по search_vector создается миграцией 0005 только в PostgreSQL.
         indexes = [
             models.Index(fields=["title"]),
-            models.Index(fields=["content"]),
+            # составной индекс для курсорной пагинации списка заметок пользователя (см. my_note/pagination.py)
+            models.Index(fields=["owner", "-created_at", "-id"], name="note_owner_created_id_idx"),
         ]
 
     def __str__(self):
         return f"{self.title} - {self.created_at}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминание признака важности заметки при загрузке из БД (для обновления счетчиков, см. my_note/stats.py)"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_important = instance.__dict__.get('is_important')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Сохранение заметки вместе с обновлением счетчиков пользователя (обработчик post_save) в одной транзакции"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """Возвращает абсолютный URL для детальной страницы заметки"""
         return reverse('note_detail', kwargs={'pk': self.pk})
@@ -56,6 +150,14 @@ class Note(models.Model):
 
 class NoteImage(models.Model):
     """Модель для хранения фотографий к заметке"""
+
+    class Status(models.TextChoices):
+        """Статусы обработки изображения"""
+        PENDING = 'pending', 'Ожидает обработки'
+        PROCESSING = 'processing', 'Обрабатывается'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка обработки'
+
     note = models.ForeignKey(
         Note,
         on_delete=models.CASCADE,
@@ -70,6 +172,19 @@ class NoteImage(models.Model):
         auto_now_add=True,
         verbose_name='Дата добавления изображения',
     )
+    # Статус фоновой обработки изображения (создания уменьшенных копий, см. my_note/tasks.py)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус обработки',
+    )
+    # Уменьшенные копии изображения: пути к файлам и размеры (см. my_note/images.py)
+    renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Уменьшенные копии',
+    )
 
     class Meta:
         ordering = ['created_at']  # сортировка по дате добавления
@@ -78,3 +193,79 @@ class NoteImage(models.Model):
 
     def __str__(self):
         return f"Изображение для {self.note.title}"
+
+    def save(self, *args, **kwargs):
+        """Сохранение изображения вместе с обновлением счетчиков пользователя (post_save) в одной транзакции"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def is_processing(self):
+        """Копии изображения еще создаются (в шаблонах вместо изображения выводится заглушка)"""
+        return self.status in (self.Status.PENDING, self.Status.PROCESSING)
+
+    def get_file_paths(self):
+        """Пути ко всем файлам изображения в хранилище: исходному файлу и его копиям"""
+        paths = [self.image.name] if self.image else []
+        for formats in self.renditions.values():
+            for items in formats.values():
+                paths.extend(item['path'] for item in items)
+        return paths
+
+    def get_renditions(self, name, fmt):
+        """Список копий изображения для места отображения name в формате fmt (от меньшей к большей)"""
+        return self.renditions.get(name, {}).get(fmt, [])
+
+    def rendition_url(self, name):
+        """URL меньшей JPEG-копии для места отображения name или исходного файла, если копий нет"""
+        renditions = self.get_renditions(name, 'jpeg')
+        if not renditions:
+            return self.image.url
+        return self.image.storage.url(renditions[0]['path'])
+
+    def srcset(self, name, fmt):
+        """Значение атрибута srcset с копиями для экранов разной плотности (например: "a.webp 1x, b.webp 2x")"""
+        renditions = self.get_renditions(name, fmt)
+        if not renditions:
+            return ''
+        base_height = renditions[0]['height']
+        return ', '.join(
+            f"{self.image.storage.url(item['path'])} {item['height'] / base_height:g}x" for item in renditions
+        )
+
+
+class NoteStats(models.Model):
+    """Счетчики заметок пользователя. Обновляются при создании и удалении заметок и изображений
+    (см. my_note/stats.py), поэтому главная страница и пагинация не подсчитывают заметки запросами COUNT(*).
+    Пересчитываются командой rebuild_note_stats"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='note_stats',
+        verbose_name='Пользователь',
+    )
+    total_notes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Всего заметок',
+    )
+    important_notes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Важных заметок',
+    )
+    notes_with_images = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Заметок с изображениями',
+    )
+    last_note_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата последней заметки',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика заметок'
+        verbose_name_plural = 'Статистика заметок'
+
+    def __str__(self):
+        return f"Статистика заметок пользователя {self.user_id}"
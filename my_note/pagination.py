@@ -0,0 +1,142 @@
+"""Курсорная (keyset) пагинация списка заметок.
+
+В отличие от постраничной пагинации с OFFSET, страница выбирается условием по ключу сортировки
+``(created_at, id)``, которое обслуживается составным индексом ``(owner, -created_at, -id)``.
+Поэтому стоимость запроса не зависит от номера страницы, а подсчет общего количества записей не требуется.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+# Направления перехода по курсору
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, note):
+    """Кодирование курсора (направление и ключ сортировки заметки) в непрозрачную строку для URL"""
+    payload = json.dumps([direction, note.created_at.isoformat(), note.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирование курсора. При некорректном значении - ошибка 404 (как для несуществующей страницы)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in (NEXT, PREVIOUS):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise Http404('Некорректный курсор страницы')
+
+
+def approximate_count(queryset):
+    """Приблизительное количество записей по оценке планировщика PostgreSQL (без сканирования таблицы).
+    Для других СУБД выполняется точный подсчет."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинатор по ключу (created_at, id) в порядке от новых записей к старым"""
+
+    def __init__(self, queryset, per_page, approximate=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.approximate = approximate
+
+    @property
+    def count(self):
+        """Приблизительное количество записей (если включено), иначе None - подсчет не выполняется"""
+        if not self.approximate:
+            return None
+        if not hasattr(self, '_count'):
+            self._count = approximate_count(self.queryset)
+        return self._count
+
+    async def acount(self):
+        """Асинхронный вариант count (для асинхронных представлений)"""
+        if self.approximate and not hasattr(self, '_count'):
+            self._count = await sync_to_async(approximate_count)(self.queryset)
+        return self.count
+
+    def get_page_queryset(self, cursor):
+        """Направление перехода и запрос заметок страницы (с лишней записью) для курсора"""
+        direction = NEXT
+        queryset = self.queryset.order_by('-created_at', '-pk')
+        if cursor:
+            direction, created_at, pk = decode_cursor(cursor)
+            if direction == NEXT:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+                ).order_by('created_at', 'pk')
+        # Лишняя запись показывает, есть ли еще страница в направлении перехода
+        return direction, queryset[:self.per_page + 1]
+
+    def build_page(self, cursor, direction, notes):
+        """Страница из загруженных заметок и курсоры соседних страниц"""
+        has_more = len(notes) > self.per_page
+        notes = notes[:self.per_page]
+        if direction == PREVIOUS:
+            notes.reverse()
+
+        if not notes:
+            return CursorPage(notes)
+        has_next = has_more if direction == NEXT else True
+        has_previous = bool(cursor) if direction == NEXT else has_more
+        return CursorPage(
+            notes,
+            next_cursor=encode_cursor(NEXT, notes[-1]) if has_next else None,
+            previous_cursor=encode_cursor(PREVIOUS, notes[0]) if has_previous else None,
+        )
+
+    def page(self, cursor=None):
+        """Получение страницы, следующей (или предшествующей) за заметкой из курсора"""
+        direction, queryset = self.get_page_queryset(cursor)
+        return self.build_page(cursor, direction, list(queryset))
+
+    async def apage(self, cursor=None):
+        """Асинхронный вариант page: заметки загружаются асинхронной итерацией по запросу"""
+        direction, queryset = self.get_page_queryset(cursor)
+        return self.build_page(cursor, direction, [note async for note in queryset])
@@ -0,0 +1,91 @@
+"""Поиск по заметкам.
+
+Поддерживаются два режима поиска в PostgreSQL:
+
+* ``fulltext`` - полнотекстовый поиск по хранимому столбцу ``Note.search_vector`` (tsvector), который поддерживается
+  триггером БД и покрыт GIN-индексом (см. миграцию 0005);
+* ``trigram`` - нечеткий поиск по части слова и с опечатками на основе расширения ``pg_trgm``
+  (GIN-индексы по триграммам заголовка и содержания, см. миграцию 0006).
+
+Для других СУБД (например, SQLite в тестах) используется простой поиск по вхождению подстроки.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+# Режимы поиска
+SEARCH_MODE_FULLTEXT = 'fulltext'
+SEARCH_MODE_TRIGRAM = 'trigram'
+SEARCH_MODES = (
+    (SEARCH_MODE_FULLTEXT, 'По словам'),
+    (SEARCH_MODE_TRIGRAM, 'По части слова'),
+)
+
+# Конфигурации полнотекстового поиска PostgreSQL (должны совпадать с конфигурациями в триггере миграции 0005)
+SEARCH_CONFIGS = ('russian', 'english')
+
+# Маркеры начала и конца подсвеченного фрагмента в сниппете.
+# Используются управляющие символы, чтобы их нельзя было подделать текстом заметки (см. фильтр highlight).
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+
+def is_postgresql(queryset):
+    """Проверка, что запрос выполняется в БД PostgreSQL"""
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def build_search_query(query):
+    """Построение поискового запроса сразу для всех конфигураций (русский и английский языки)"""
+    search_query = None
+    for config in SEARCH_CONFIGS:
+        config_query = SearchQuery(query, config=config, search_type='websearch')
+        search_query = config_query if search_query is None else search_query | config_query
+    return search_query
+
+
+def search_notes(queryset, query, mode=None):
+    """Поиск заметок по заголовку и содержанию в выбранном режиме (по умолчанию - из settings.NOTE_SEARCH_MODE)"""
+    if not is_postgresql(queryset):
+        return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+
+    if (mode or settings.NOTE_SEARCH_MODE) == SEARCH_MODE_TRIGRAM:
+        return trigram_search(queryset, query)
+    return fulltext_search(queryset, query)
+
+
+def fulltext_search(queryset, query):
+    """Полнотекстовый поиск. Результаты ранжируются по релевантности и дополняются сниппетом ``headline``
+    с подсвеченными совпадениями."""
+    search_query = build_search_query(query)
+    return queryset.filter(
+        search_vector=search_query
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        headline=SearchHeadline(
+            'content',
+            search_query,
+            config=SEARCH_CONFIGS[0],
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+            max_fragments=2,
+        ),
+    ).order_by('-rank', '-created_at')
+
+
+def trigram_search(queryset, query):
+    """Нечеткий поиск по триграммам: находит заметки по части слова и с опечатками.
+    Результаты сортируются по сходству запроса со словами заголовка или содержания."""
+    # Операторы %> обслуживаются GIN-индексами по триграммам. Порог сходства для них задается в транзакции
+    # запроса (SET LOCAL) и не сохраняется в соединении с БД, которое переиспользуется другими запросами
+    return queryset.filter(
+        Q(title__trigram_word_similar=query) | Q(content__trigram_word_similar=query)
+    ).annotate(
+        rank=Greatest(TrigramWordSimilarity(query, 'title'), TrigramWordSimilarity(query, 'content')),
+    ).order_by('-rank', '-created_at').with_db_settings({
+        'pg_trgm.word_similarity_threshold': settings.NOTE_TRIGRAM_SIMILARITY_THRESHOLD,
+    })
@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from my_note import stats
+from my_note.cache import bump_notes_version
+from my_note.models import Note, NoteImage
+from my_note.tasks import delete_media_files, dispatch
+
+
+@receiver(post_delete, sender=NoteImage)
+def delete_note_image_files(sender, instance, **kwargs):
+    """Удаление файлов изображения (исходного и копий) после удаления записи, в том числе вместе с заметкой"""
+    paths = instance.get_file_paths()
+    if paths:
+        dispatch(delete_media_files, paths)
+
+
+def note_image_owner_id(note_image):
+    """Id владельца заметки, к которой относится изображение"""
+    note = note_image._state.fields_cache.get('note')
+    if note is not None:
+        return note.owner_id
+    # Заметка может быть уже удалена (каскадное удаление изображений) - тогда версию обновляет сигнал заметки
+    return Note.objects.filter(pk=note_image.note_id).values_list('owner_id', flat=True).first()
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_notes_cache(sender, instance, **kwargs):
+    """Сброс кеша страниц пользователя после изменения или удаления его заметки"""
+    owner_id = instance.owner_id
+    transaction.on_commit(lambda: bump_notes_version(owner_id))
+
+
+@receiver(post_save, sender=NoteImage)
+@receiver(post_delete, sender=NoteImage)
+def invalidate_notes_cache_for_image(sender, instance, **kwargs):
+    """Сброс кеша страниц пользователя после изменения или удаления изображения к его заметке"""
+    owner_id = note_image_owner_id(instance)
+    if owner_id is not None:
+        transaction.on_commit(lambda: bump_notes_version(owner_id))
+
+
+@receiver(post_save, sender=Note)
+def update_note_stats(sender, instance, created, raw=False, **kwargs):
+    """Обновление счетчиков заметок пользователя после создания или изменения заметки"""
+    if raw:
+        return
+    if created:
+        stats.note_created(instance)
+    else:
+        stats.note_changed(instance)
+
+
+@receiver(post_delete, sender=Note)
+def update_note_stats_on_delete(sender, instance, **kwargs):
+    """Обновление счетчиков заметок пользователя после удаления заметки"""
+    stats.note_deleted(instance)
+
+
+@receiver(post_save, sender=NoteImage)
+def update_note_stats_for_image(sender, instance, created, raw=False, **kwargs):
+    """Обновление счетчика заметок с изображениями после добавления изображения"""
+    if created and not raw:
+        owner_id = note_image_owner_id(instance)
+        if owner_id is not None:
+            stats.note_image_added(instance, owner_id)
+
+
+@receiver(post_delete, sender=NoteImage)
+def update_note_stats_for_image_on_delete(sender, instance, **kwargs):
+    """Обновление счетчика заметок с изображениями после удаления изображения"""
+    owner_id = note_image_owner_id(instance)
+    if owner_id is not None:
+        stats.note_image_removed(instance, owner_id)
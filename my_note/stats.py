@@ -0,0 +1,126 @@
+"""Счетчики заметок пользователя (модель NoteStats).
+
+Счетчики обновляются обработчиками сигналов заметок и изображений (см. my_note/signals.py) запросами UPDATE
+с выражениями F() в той же транзакции, что и изменение заметки, поэтому одновременные запросы не теряют изменений.
+Главная страница и постраничная пагинация списка заметок берут количество заметок из счетчиков
+вместо запросов COUNT(*) к таблице заметок.
+Счетчики, изменившиеся в обход сигналов (bulk_create, update), пересчитываются командой rebuild_note_stats.
+"""
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from my_note.models import Note, NoteImage, NoteStats
+
+
+def last_note_at_subquery():
+    """Подзапрос даты последней заметки пользователя (по индексу (owner, -created_at, -id))"""
+    return Subquery(
+        Note.objects.filter(owner=OuterRef('user_id')).order_by('-created_at').values('created_at')[:1]
+    )
+
+
+def notes_with_images_subquery():
+    """Подзапрос количества заметок пользователя, у которых есть изображения"""
+    return Coalesce(Subquery(
+        Note.objects.filter(owner=OuterRef('user_id'), images__isnull=False).order_by().values('owner').annotate(
+            count=Count('pk', distinct=True)
+        ).values('count')
+    ), 0)
+
+
+def decrement(field_name):
+    """Уменьшение счетчика на единицу без ухода в отрицательные значения"""
+    return Greatest(F(field_name) - 1, 0)
+
+
+def get_note_stats(user):
+    """Счетчики заметок пользователя. Если заметок еще не было - несохраненный объект с нулевыми значениями"""
+    return NoteStats.objects.filter(user_id=user.pk).first() or NoteStats(user_id=user.pk)
+
+
+async def aget_note_stats(user):
+    """Асинхронный вариант get_note_stats"""
+    return await NoteStats.objects.filter(user_id=user.pk).afirst() or NoteStats(user_id=user.pk)
+
+
+def note_created(note):
+    """Учет новой заметки"""
+    NoteStats.objects.get_or_create(user_id=note.owner_id)
+    changes = {'total_notes': F('total_notes') + 1, 'last_note_at': last_note_at_subquery()}
+    if note.is_important:
+        changes['important_notes'] = F('important_notes') + 1
+    NoteStats.objects.filter(user_id=note.owner_id).update(**changes)
+
+
+def note_changed(note):
+    """Учет изменения признака важности заметки (значение при загрузке из БД запоминает Note.from_db)"""
+    loaded_is_important = getattr(note, '_loaded_is_important', None)
+    if loaded_is_important is None or loaded_is_important == note.is_important:
+        return
+    important_notes = F('important_notes') + 1 if note.is_important else decrement('important_notes')
+    NoteStats.objects.filter(user_id=note.owner_id).update(important_notes=important_notes)
+    note._loaded_is_important = note.is_important
+
+
+def note_deleted(note):
+    """Учет удаленной заметки. Изображения заметки удаляются раньше нее (каскадно),
+    поэтому счетчик заметок с изображениями уже уменьшен обработчиком удаления изображения"""
+    changes = {'total_notes': decrement('total_notes'), 'last_note_at': last_note_at_subquery()}
+    if note.is_important:
+        changes['important_notes'] = decrement('important_notes')
+    NoteStats.objects.filter(user_id=note.owner_id).update(**changes)
+
+
+def note_image_added(note_image, owner_id):
+    """Учет первого изображения заметки"""
+    if not NoteImage.objects.filter(note_id=note_image.note_id).exclude(pk=note_image.pk).exists():
+        NoteStats.objects.filter(user_id=owner_id).update(notes_with_images=F('notes_with_images') + 1)
+
+
+def note_image_removed(note_image, owner_id):
+    """Учет удаления последнего изображения заметки. Изображения удаляются одним запросом (например, вместе
+    с заметкой), а сигналы отправляются после удаления всех, поэтому счетчик пересчитывается, а не уменьшается"""
+    if not NoteImage.objects.filter(note_id=note_image.note_id).exists():
+        NoteStats.objects.filter(user_id=owner_id).update(notes_with_images=notes_with_images_subquery())
+
+
+def rebuild_note_stats(user_ids=None):
+    """Пересчет счетчиков по таблице заметок (для всех пользователей с заметками или для user_ids).
+    Возвращает количество пересчитанных записей"""
+    notes = Note.objects.order_by()
+    if user_ids is not None:
+        notes = notes.filter(owner_id__in=user_ids)
+    totals = notes.values('owner_id').annotate(
+        total=Count('pk'),
+        important=Count('pk', filter=Q(is_important=True)),
+        last=Max('created_at'),
+    )
+    with_images = dict(
+        notes.filter(images__isnull=False).values('owner_id').annotate(
+            count=Count('pk', distinct=True)
+        ).values_list('owner_id', 'count')
+    )
+
+    stats = [
+        NoteStats(
+            user_id=item['owner_id'],
+            total_notes=item['total'],
+            important_notes=item['important'],
+            notes_with_images=with_images.get(item['owner_id'], 0),
+            last_note_at=item['last'],
+        )
+        for item in totals
+    ]
+    # Пользователи без заметок: счетчики обнуляются
+    stale = NoteStats.objects.exclude(user_id__in=Note.objects.values('owner_id'))
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    stale.update(total_notes=0, important_notes=0, notes_with_images=0, last_note_at=None)
+
+    NoteStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['total_notes', 'important_notes', 'notes_with_images', 'last_note_at'],
+    )
+    return len(stats)
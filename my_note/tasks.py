@@ -0,0 +1,69 @@
+import logging
+
+from celery import Task, shared_task
+from django.conf import settings
+from django.db import transaction
+
+from my_note.images import create_renditions
+from my_note.models import NoteImage
+from my_note.uploads import find_abandoned_uploads
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch(task, *args):
+    """Постановка задачи с изображениями в очередь после фиксации транзакции (при NOTE_IMAGE_TASKS=True)"""
+    if settings.NOTE_IMAGE_TASKS:
+        transaction.on_commit(lambda: task.delay(*args))
+
+
+class NoteImageTask(Task):
+    """Задача обработки изображения, которая при окончательной ошибке (исчерпаны повторы или ошибка не из
+    autoretry_for) помечает изображение как необработанное: в шаблонах вместо заглушки выводится исходный файл"""
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        note_image_id = args[0] if args else kwargs.get('note_image_id')
+        note_image = NoteImage.objects.filter(pk=note_image_id).exclude(status=NoteImage.Status.READY).first()
+        if note_image:
+            note_image.status = NoteImage.Status.FAILED
+            note_image.save(update_fields=['status'])  # Сигнал post_save сбрасывает кеш страниц владельца
+        logger.error('Не удалось обработать изображение %s: %s', note_image_id, exc)
+
+
+@shared_task(
+    bind=True, base=NoteImageTask, acks_late=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=5
+)
+def process_note_image(self, note_image_id):
+    """Создание уменьшенных копий изображения заметки (выполняется в очереди images).
+    Задача идемпотентна: уже обработанные и удаленные изображения пропускаются,
+    а повторная обработка перезаписывает те же файлы копий. Результат обработки файла, замененного за время
+    выполнения задачи, не сохраняется (см. create_renditions); ошибки чтения хранилища повторяются."""
+    # Захват изображения для обработки: статус меняется, только если копии еще не готовы
+    captured = NoteImage.objects.filter(pk=note_image_id).exclude(
+        status=NoteImage.Status.READY
+    ).update(status=NoteImage.Status.PROCESSING)
+    if not captured:
+        return
+
+    note_image = NoteImage.objects.get(pk=note_image_id)
+    create_renditions(note_image)
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+def delete_media_files(paths):
+    """Удаление файлов удаленных или замененных изображений из хранилища"""
+    storage = NoteImage._meta.get_field('image').storage
+    for path in paths:
+        # Отсутствующий файл (например, при повторном выполнении задачи) не считается ошибкой
+        if storage.exists(path):
+            storage.delete(path)
+
+
+@shared_task
+def delete_abandoned_uploads():
+    """Удаление файлов, загруженных браузером напрямую в хранилище, но не прикрепленных к заметке
+    (форма заметки не была отправлена). Возвращает количество удаленных файлов"""
+    paths = find_abandoned_uploads()
+    if paths:
+        delete_media_files(paths)
+    return len(paths)
@@ -0,0 +1,31 @@
+# Шаблонные фильтры приложения my_note.
+
+from django import template
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from my_note.search import HIGHLIGHT_START, HIGHLIGHT_STOP
+
+# Создается экземпляр Library для регистрации пользовательских шаблонных тегов и фильтров
+register = template.Library()
+
+
+@register.filter()
+def highlight(snippet):
+    """Экранирует сниппет результата поиска и выделяет найденные слова тегом <mark>"""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    return mark_safe(html)
+
+
+@register.simple_tag()
+def rendition_url(note_image, name):
+    """URL уменьшенной копии изображения заметки для места отображения name (card или detail)"""
+    return note_image.rendition_url(name)
+
+
+@register.simple_tag()
+def rendition_srcset(note_image, name, fmt):
+    """Атрибут srcset с копиями изображения заметки в формате fmt (webp или jpeg)"""
+    return note_image.srcset(name, fmt)
@@ -1,11 +1,45 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
-from django.urls import reverse
-
-from my_note.forms import NoteForm
-from my_note.models import Note, NoteImage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from PIL import Image
+
+from my_note.async_views import AsyncHomeView, AsyncNoteDetailView, AsyncNoteListView
+from my_note.benchmark import clear_benchmark_data, deep_list_state, deep_list_url, seed_benchmark_data
+from my_note.forms import NoteForm, NoteSearchForm
+from my_note.images import create_renditions
+from my_note.models import Note, NoteImage, NoteStats
+from my_note.search import HIGHLIGHT_START, HIGHLIGHT_STOP, search_notes, trigram_search
+from my_note.tasks import delete_abandoned_uploads, process_note_image
+from my_note.templatetags.my_note_tags import highlight
+from my_note.uploads import ABANDONED_UPLOAD_AGE, MAX_IMAGE_SIZE, UPLOAD_DIR
+from users.backends import CachedModelBackend
 from users.models import User
 
+# Маршруты для тестов асинхронных представлений (в my_note/urls.py они выбираются настройкой NOTE_ASYNC_VIEWS)
+urlpatterns = [
+    path('async/', AsyncHomeView.as_view(), name='async_home'),
+    path('async/notes/', AsyncNoteListView.as_view(), name='async_note_list'),
+    path('async/notes/<int:pk>/', AsyncNoteDetailView.as_view(), name='async_note_detail'),
+    path('', include('config.urls')),
+]
+
 
 class NoteModelTest(TestCase):
     """Тесты модели Note"""
@@ -82,6 +116,217 @@ class NoteImageModelTest(TestCase):
         self.assertIn(self.note.title, str(note_image))
 
 
+def make_jpeg(width=1600, height=1200, name='photo.jpg'):
+    """Создание JPEG-изображения с метаданными EXIF для загрузки в тестах"""
+    exif = Image.Exif()
+    exif[0x010F] = 'Test Camera'  # Производитель камеры
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class NoteImageRenditionsTest(TestCase):
+    """Тесты создания уменьшенных копий изображений"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.note = Note.objects.create(title='Photo Note', content='Content', owner=self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_create_renditions(self):
+        """Тест создания копий нужных размеров без метаданных EXIF"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg())
+        self.assertTrue(create_renditions(note_image))
+
+        note_image.refresh_from_db()
+        card = note_image.get_renditions('card', 'webp')
+        self.assertEqual([(item['width'], item['height']) for item in card], [(200, 150), (400, 300)])
+        self.assertEqual([item['height'] for item in note_image.get_renditions('detail', 'jpeg')], [400, 800])
+
+        with note_image.image.storage.open(card[0]['path']) as file:
+            rendition = Image.open(file)
+            self.assertEqual(rendition.format, 'WEBP')
+            self.assertFalse(rendition.getexif())
+
+        srcset = note_image.srcset('card', 'jpeg')
+        self.assertIn('card_150.jpg 1x', srcset)
+        self.assertIn('card_300.jpg 2x', srcset)
+        self.assertTrue(note_image.rendition_url('card').endswith('card_150.jpg'))
+
+    def test_process_note_image_task_is_idempotent(self):
+        """Тест: повторный запуск задачи не обрабатывает готовое изображение заново"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg())
+        self.assertEqual(note_image.status, NoteImage.Status.PENDING)
+
+        process_note_image.delay(note_image.pk)
+        note_image.refresh_from_db()
+        self.assertEqual(note_image.status, NoteImage.Status.READY)
+
+        with patch('my_note.tasks.create_renditions') as create_renditions_mock:
+            process_note_image.delay(note_image.pk)
+        create_renditions_mock.assert_not_called()
+
+    def test_process_note_image_failure_marks_failed(self):
+        """Тест: при ошибке задачи изображение не остается в статусе обработки (выводится исходный файл)"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg())
+        with patch('my_note.tasks.create_renditions', side_effect=RuntimeError('broken')):
+            result = process_note_image.apply(args=[note_image.pk])
+        self.assertTrue(result.failed())
+        note_image.refresh_from_db()
+        self.assertEqual(note_image.status, NoteImage.Status.FAILED)
+        self.assertFalse(note_image.is_processing)
+
+    def test_replaced_image_result_is_discarded(self):
+        """Тест: обработка прежнего файла, завершившаяся после замены изображения, не перезаписывает новый файл"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg())
+        stale = NoteImage.objects.get(pk=note_image.pk)
+        note_image.image = make_jpeg(name='new.jpg')
+        note_image.save()
+
+        self.assertFalse(create_renditions(stale))
+        note_image.refresh_from_db()
+        self.assertEqual(note_image.status, NoteImage.Status.PENDING)
+        self.assertEqual(note_image.renditions, {})
+        self.assertTrue(stale.renditions)
+        for rendition_path in stale.get_file_paths()[1:]:  # Копии прежнего файла удалены
+            self.assertFalse(note_image.image.storage.exists(rendition_path))
+
+    def test_storage_read_error_is_retried(self):
+        """Тест: ошибка чтения хранилища не помечает изображение как поврежденное (задача повторяется)"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg())
+        with patch('my_note.images.read_image_file', side_effect=OSError('storage unavailable')):
+            with self.assertRaises(OSError):
+                create_renditions(note_image)
+        note_image.refresh_from_db()
+        self.assertEqual(note_image.status, NoteImage.Status.PENDING)
+
+    def test_placeholder_until_processed(self):
+        """Тест заглушки вместо изображения, пока не созданы копии"""
+        NoteImage.objects.create(note=self.note, image=make_jpeg())
+        self.client.login(email='test@example.com', password='testpass123')
+        response = self.client.get(reverse('my_note:note_detail', kwargs={'pk': self.note.pk}))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+    def test_small_image_is_not_upscaled(self):
+        """Тест: маленькое изображение не увеличивается и копии одного размера не дублируются"""
+        note_image = NoteImage.objects.create(note=self.note, image=make_jpeg(120, 100))
+        create_renditions(note_image)
+        self.assertEqual(
+            [(item['width'], item['height']) for item in note_image.get_renditions('detail', 'jpeg')], [(120, 100)]
+        )
+
+    def test_invalid_image_falls_back_to_original(self):
+        """Тест: для поврежденного файла копии не создаются, используется исходный файл"""
+        note_image = NoteImage.objects.create(
+            note=self.note, image=SimpleUploadedFile('broken.jpg', b'file_content', content_type='image/jpeg')
+        )
+        self.assertFalse(create_renditions(note_image))
+        self.assertEqual(note_image.status, NoteImage.Status.FAILED)
+        self.assertEqual(note_image.rendition_url('card'), note_image.image.url)
+        self.assertEqual(note_image.srcset('card', 'webp'), '')
+
+    def test_note_form_upload_creates_renditions(self):
+        """Тест создания копий при загрузке изображения через форму"""
+        self.client.login(email='test@example.com', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('my_note:note_create'), {
+                'title': 'With photo',
+                'content': 'Content',
+                'image_1': make_jpeg(),
+            })
+        self.assertRedirects(response, reverse('my_note:note_list'))
+
+        note_image = NoteImage.objects.get(note__title='With photo')
+        self.assertEqual(note_image.status, NoteImage.Status.READY)
+        self.assertTrue(note_image.get_renditions('card', 'webp'))
+
+        response = self.client.get(reverse('my_note:note_list'))
+        self.assertContains(response, 'type="image/webp"')
+
+
+class NoteImageUpdateTest(TestCase):
+    """Тесты изменения изображений при редактировании заметки"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.note = Note.objects.create(title='Photo Note', content='Content', owner=self.user)
+        self.image_1 = NoteImage.objects.create(note=self.note, image=make_jpeg(name='first.jpg'))
+        self.image_2 = NoteImage.objects.create(note=self.note, image=make_jpeg(name='second.jpg'))
+        self.storage = self.image_1.image.storage
+        self.update_url = reverse('my_note:note_update', kwargs={'pk': self.note.pk})
+        self.client.login(email='test@example.com', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def post_update(self, **data):
+        """Отправка формы редактирования с выполнением отложенных до фиксации транзакции действий"""
+        form_data = {'title': 'Updated', 'content': 'Updated content'}
+        form_data.update(data)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.update_url, form_data)
+        self.assertRedirects(response, reverse('my_note:note_list'))
+
+    def test_text_only_update_keeps_images(self):
+        """Тест: при изменении только текста изображения не пересоздаются и файлы не затрагиваются"""
+        with patch('my_note.forms.process_note_image') as process_mock, \
+                patch('my_note.forms.delete_media_files') as delete_mock:
+            self.post_update()
+
+        process_mock.delay.assert_not_called()
+        delete_mock.delay.assert_not_called()
+        self.assertEqual(
+            list(self.note.images.values_list('pk', 'image')),
+            [(self.image_1.pk, self.image_1.image.name), (self.image_2.pk, self.image_2.image.name)],
+        )
+        self.assertTrue(self.storage.exists(self.image_1.image.name))
+
+    def test_replace_one_image(self):
+        """Тест замены одного изображения: второе не меняется, файл замененного удаляется"""
+        old_name = self.image_1.image.name
+        self.post_update(image_1=make_jpeg(name='new.jpg'))
+
+        self.image_1.refresh_from_db()
+        self.assertNotEqual(self.image_1.image.name, old_name)
+        self.assertEqual(self.image_1.status, NoteImage.Status.READY)
+        self.assertFalse(self.storage.exists(old_name))
+        self.assertTrue(self.storage.exists(self.image_1.image.name))
+        self.assertEqual(self.note.images.get(pk=self.image_2.pk).image.name, self.image_2.image.name)
+
+    def test_clear_image(self):
+        """Тест удаления изображения флажком "Очистить" вместе с файлом"""
+        self.post_update(**{'image_2-clear': 'on'})
+
+        self.assertEqual(list(self.note.images.values_list('pk', flat=True)), [self.image_1.pk])
+        self.assertFalse(self.storage.exists(self.image_2.image.name))
+
+    def test_note_delete_removes_files(self):
+        """Тест удаления файлов изображений вместе с заметкой"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('my_note:note_delete', kwargs={'pk': self.note.pk}))
+
+        self.assertFalse(self.storage.exists(self.image_1.image.name))
+        self.assertFalse(self.storage.exists(self.image_2.image.name))
+
+
 class HomeViewTest(TestCase):
     """Тесты домашней страницы"""
 
@@ -197,6 +442,395 @@ class NoteListViewTest(TestCase):
         self.assertEqual(len(response.context['notes']), 2)  # На второй странице 2 заметки из 12
 
 
+class QueryBudgetTest(TestCase):
+    """Тесты количества SQL-запросов на страницах (не должно зависеть от количества заметок и изображений)"""
+
+    # Сессия, пользователь, счетчики заметок, заметки, изображения
+    LIST_QUERY_BUDGET = 5
+    # Сессия, пользователь, заметки, счетчики заметок
+    HOME_QUERY_BUDGET = 4
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(email='test@example.com', password='testpass123')
+        # Пользователь запроса берется из кеша (users/backends.py). Кеш заполняется заранее, иначе первый запрос
+        # загружает пользователя из БД и выполняет на один запрос больше последующих
+        CachedModelBackend().get_user(self.user.pk)
+
+    def create_notes(self, count):
+        """Создание заметок с двумя изображениями у каждой (файлы изображений не создаются)"""
+        for i in range(count):
+            note = Note.objects.create(title=f'Note {i}', content=f'Content {i}', owner=self.user)
+            NoteImage.objects.create(note=note, image=f'my_note/photo/{i}_1.jpg')
+            NoteImage.objects.create(note=note, image=f'my_note/photo/{i}_2.jpg')
+
+    def count_queries(self, url):
+        """Подсчет SQL-запросов при загрузке страницы"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_note_list_query_budget(self):
+        """Тест количества запросов на странице списка заметок"""
+        self.create_notes(1)
+        queries_for_one_note = self.count_queries(reverse('my_note:note_list'))
+        self.create_notes(9)
+        queries_for_full_page = self.count_queries(reverse('my_note:note_list'))
+
+        self.assertLessEqual(queries_for_full_page, self.LIST_QUERY_BUDGET)
+        self.assertEqual(queries_for_one_note, queries_for_full_page)
+
+    def test_note_list_preview_images(self):
+        """Тест предзагрузки не более двух изображений и подсчета изображений заметки"""
+        self.create_notes(1)
+        note = Note.objects.get()
+        NoteImage.objects.create(note=note, image='my_note/photo/extra.jpg')
+
+        response = self.client.get(reverse('my_note:note_list'))
+        listed_note = response.context['notes'][0]
+        self.assertEqual(listed_note.image_count, 3)
+        self.assertEqual(len(listed_note.preview_images), 2)
+
+    def test_note_detail_query_budget(self):
+        """Тест количества запросов на детальной странице заметки"""
+        self.create_notes(1)
+        note = Note.objects.get()
+        # Сессия, пользователь, заметка, изображения
+        self.assertLessEqual(self.count_queries(reverse('my_note:note_detail', kwargs={'pk': note.pk})), 4)
+
+    def test_home_query_budget(self):
+        """Тест количества запросов на главной странице"""
+        self.create_notes(7)
+        self.assertLessEqual(self.count_queries(reverse('my_note:home')), self.HOME_QUERY_BUDGET)
+
+
+class NoteStatsTest(TestCase):
+    """Тесты счетчиков заметок пользователя"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(email='test@example.com', password='testpass123')
+
+    def get_stats(self):
+        return NoteStats.objects.get(user=self.user)
+
+    def test_counters_follow_note_changes(self):
+        """Тест обновления счетчиков при создании, изменении и удалении заметок и изображений"""
+        first = Note.objects.create(title='Первая', content='Текст', owner=self.user, is_important=True)
+        second = Note.objects.create(title='Вторая', content='Текст', owner=self.user)
+        NoteImage.objects.create(note=second, image='my_note/photo/1.jpg')
+        NoteImage.objects.create(note=second, image='my_note/photo/2.jpg')
+        stats = self.get_stats()
+        self.assertEqual((stats.total_notes, stats.important_notes, stats.notes_with_images), (2, 1, 1))
+        self.assertEqual(stats.last_note_at, second.created_at)
+
+        second = Note.objects.get(pk=second.pk)
+        second.is_important = True
+        second.save()
+        self.assertEqual(self.get_stats().important_notes, 2)
+
+        second.delete()
+        stats = self.get_stats()
+        self.assertEqual((stats.total_notes, stats.important_notes, stats.notes_with_images), (1, 1, 0))
+        self.assertEqual(stats.last_note_at, first.created_at)
+
+    def test_views_do_not_count_notes(self):
+        """Тест: главная страница и список заметок не выполняют COUNT(*) по таблице заметок"""
+        for i in range(12):
+            Note.objects.create(title=f'Note {i}', content=f'Content {i}', owner=self.user)
+
+        for url in (reverse('my_note:home'), reverse('my_note:note_list')):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT(*)' in query['sql'] for query in context.captured_queries))
+        self.assertEqual(response.context['paginator'].count, 12)
+
+    def test_rebuild_note_stats_command(self):
+        """Тест пересчета счетчиков, изменившихся в обход сигналов"""
+        Note.objects.bulk_create([
+            Note(title='Заметка', content='Текст', owner=self.user, is_important=True),
+            Note(title='Заметка', content='Текст', owner=self.user),
+        ])
+        other_user = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        NoteStats.objects.create(user=other_user, total_notes=3)
+
+        call_command('rebuild_note_stats', stdout=StringIO())
+
+        stats = self.get_stats()
+        self.assertEqual((stats.total_notes, stats.important_notes, stats.notes_with_images), (2, 1, 0))
+        self.assertIsNotNone(stats.last_note_at)
+        self.assertEqual(NoteStats.objects.get(user=other_user).total_notes, 0)
+
+
+@override_settings(NOTE_PAGE_CACHE_TIMEOUT=300)
+class NotePageCacheTest(TestCase):
+    """Тесты кеширования данных страниц заметок пользователя"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            email='other@example.com',
+            username='otheruser',
+            password='testpass123'
+        )
+        for i in range(3):
+            Note.objects.create(title=f'Note {i}', content=f'Content {i}', owner=self.user)
+        Note.objects.create(title='Other Note', content='Other Content', owner=self.other_user)
+        self.client.login(email='test@example.com', password='testpass123')
+
+    def count_queries(self, url, data=None):
+        """Загрузка страницы с подсчетом SQL-запросов"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        return response, len(context.captured_queries)
+
+    def test_repeated_loads_skip_note_queries(self):
+        """Тест: повторная загрузка страниц не выполняет запросов к заметкам"""
+        for url in (reverse('my_note:home'), reverse('my_note:note_list')):
+            _, first_queries = self.count_queries(url)
+            response, repeated_queries = self.count_queries(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(repeated_queries, 0)  # Сессия и пользователь тоже читаются из кеша
+            self.assertLess(repeated_queries, first_queries)
+
+        self.assertEqual(response.context['paginator'].count, 3)
+        self.assertEqual(len(response.context['notes']), 3)
+
+    def test_cache_is_per_user_and_query(self):
+        """Тест: данные кешируются отдельно для каждого пользователя и поискового запроса"""
+        self.client.get(reverse('my_note:note_list'))
+        response = self.client.get(reverse('my_note:note_list'), {'query': 'Note 1'})
+        self.assertEqual([note.title for note in response.context['notes']], ['Note 1'])
+
+        self.client.login(email='other@example.com', password='testpass123')
+        response = self.client.get(reverse('my_note:note_list'))
+        self.assertEqual([note.title for note in response.context['notes']], ['Other Note'])
+
+    def test_changes_are_visible_immediately(self):
+        """Тест: после создания, изменения и удаления заметки страницы показывают актуальные данные"""
+        self.client.get(reverse('my_note:home'))
+        self.client.get(reverse('my_note:note_list'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('my_note:note_create'), {'title': 'Fresh', 'content': 'Fresh content'})
+        response = self.client.get(reverse('my_note:home'))
+        self.assertEqual(response.context['total_notes'], 4)
+        self.assertEqual(response.context['recent_notes'][0].title, 'Fresh')
+
+        note = Note.objects.get(title='Fresh')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('my_note:note_update', kwargs={'pk': note.pk}),
+                             {'title': 'Renamed', 'content': 'Fresh content'})
+        response = self.client.get(reverse('my_note:note_list'))
+        self.assertEqual(response.context['notes'][0].title, 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('my_note:note_delete', kwargs={'pk': note.pk}))
+        response = self.client.get(reverse('my_note:note_list'))
+        self.assertEqual(response.context['paginator'].count, 3)
+
+    def test_image_changes_invalidate_cache(self):
+        """Тест: добавление изображения к заметке сбрасывает кеш страниц владельца"""
+        self.client.get(reverse('my_note:note_list'))
+        note = Note.objects.filter(owner=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            NoteImage.objects.create(note=note, image='my_note/photo/cached.jpg')
+
+        response = self.client.get(reverse('my_note:note_list'))
+        listed_note = next(item for item in response.context['notes'] if item.pk == note.pk)
+        self.assertEqual(listed_note.image_count, 1)
+
+
+@override_settings(NOTE_LIST_PAGINATION='cursor')
+class NoteListCursorPaginationTest(TestCase):
+    """Тесты курсорной пагинации списка заметок"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.note_list_url = reverse('my_note:note_list')
+        for i in range(25):
+            Note.objects.create(title=f'Note {i}', content=f'Content {i}', owner=self.user)
+        self.client.login(email='test@example.com', password='testpass123')
+
+    def test_cursor_pages_forward_and_back(self):
+        """Тест перехода по страницам вперед и назад без пропусков и повторов"""
+        first_page = self.client.get(self.note_list_url).context
+        self.assertTrue(first_page['cursor_pagination'])
+        self.assertFalse(first_page['page_obj'].has_previous())
+        self.assertIsNone(first_page['paginator'].count)  # COUNT(*) не выполняется
+
+        second_page = self.client.get(self.note_list_url, {'cursor': first_page['page_obj'].next_cursor}).context
+        third_page = self.client.get(self.note_list_url, {'cursor': second_page['page_obj'].next_cursor}).context
+        self.assertEqual(len(third_page['notes']), 5)
+        self.assertFalse(third_page['page_obj'].has_next())
+
+        listed = [note.pk for page in (first_page, second_page, third_page) for note in page['notes']]
+        self.assertEqual(listed, list(Note.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)))
+
+        back_page = self.client.get(self.note_list_url, {'cursor': third_page['page_obj'].previous_cursor}).context
+        self.assertEqual(list(back_page['notes']), list(second_page['notes']))
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора"""
+        response = self.client.get(self.note_list_url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(NOTE_LIST_APPROXIMATE_COUNT=True)
+    def test_approximate_count(self):
+        """Тест приблизительного количества заметок (в SQLite - точный подсчет)"""
+        response = self.client.get(self.note_list_url)
+        self.assertEqual(response.context['paginator'].count, 25)
+
+
+class NoteSearchTest(TestCase):
+    """Тесты поиска по заметкам"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        Note.objects.create(title='Поездка на море', content='Купались и загорали', owner=self.user)
+        Note.objects.create(title='Работа', content='Закончил отчет по МОРЮ', owner=self.user)
+        Note.objects.create(title='Прогулка', content='Гуляли в парке', owner=self.user)
+
+    def test_search_notes_by_title_and_content(self):
+        """Тест поиска по заголовку и содержанию (запасной режим для SQLite)"""
+        queryset = search_notes(Note.objects.filter(owner=self.user), 'парк')
+        self.assertEqual([note.title for note in queryset], ['Прогулка'])
+
+    def test_search_view_trigram_mode(self):
+        """Тест поиска по части слова в режиме trigram"""
+        self.client.login(email='test@example.com', password='testpass123')
+        response = self.client.get(reverse('my_note:note_list'), {'query': 'Прогул', 'mode': 'trigram'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note.title for note in response.context['notes']], ['Прогулка'])
+
+    def test_trigram_threshold_is_query_local(self):
+        """Тест: порог сходства передается запросу (SET LOCAL), а не сохраняется в соединении при построении"""
+        with CaptureQueriesContext(connection) as context:
+            queryset = trigram_search(Note.objects.filter(owner=self.user), 'Прогул')
+        self.assertEqual(context.captured_queries, [])
+        # Параметры сохраняются при дальнейшем построении запроса (пагинация, предзагрузка изображений)
+        queryset = queryset.with_preview_images()[:10]
+        self.assertEqual(
+            queryset._db_settings, {'pg_trgm.word_similarity_threshold': settings.NOTE_TRIGRAM_SIMILARITY_THRESHOLD}
+        )
+        self.assertEqual(Note.objects.all()._db_settings, {})
+
+    def test_search_form_invalid_mode(self):
+        """Тест валидации неизвестного режима поиска"""
+        form = NoteSearchForm({'query': 'море', 'mode': 'unknown'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('mode', form.errors)
+
+    def test_highlight_filter_escapes_html(self):
+        """Тест подсветки сниппета с экранированием HTML из текста заметки"""
+        snippet = f'<script>x</script> {HIGHLIGHT_START}море{HIGHLIGHT_STOP}'
+        self.assertEqual(highlight(snippet), '&lt;script&gt;x&lt;/script&gt; <mark>море</mark>')
+        self.assertEqual(highlight(None), '')
+
+
+@override_settings(ROOT_URLCONF='my_note.tests')
+class AsyncViewsTest(TestCase):
+    """Тесты асинхронных представлений главной страницы, списка и детальной страницы заметки"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            email='other@example.com',
+            username='otheruser',
+            password='testpass123'
+        )
+        for i in range(12):
+            Note.objects.create(title=f'User Note {i}', content=f'User Content {i}', owner=self.user)
+        self.other_note = Note.objects.create(title='Other Note', content='Other Content', owner=self.other_user)
+
+    async def test_home_view(self):
+        """Тест главной страницы для неаутентифицированного и аутентифицированного пользователя"""
+        response = await self.async_client.get(reverse('async_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_notes'], 0)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('async_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['recent_notes']), 5)
+        self.assertEqual(response.context['total_notes'], 12)
+
+    async def test_note_list_view(self):
+        """Тест списка заметок: вход обязателен, пагинация и поиск как у синхронного представления"""
+        response = await self.async_client.get(reverse('async_note_list'))
+        self.assertEqual(response.status_code, 302)  # Редирект на страницу входа
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('async_note_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['notes']), 10)
+        self.assertEqual(response.context['paginator'].count, 12)
+
+        response = await self.async_client.get(reverse('async_note_list'), {'page': 2})
+        self.assertEqual(len(response.context['notes']), 2)
+        response = await self.async_client.get(reverse('async_note_list'), {'page': 5})
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(reverse('async_note_list'), {'query': 'Note 11'})
+        self.assertEqual([note.title for note in response.context['notes']], ['User Note 11'])
+
+    @override_settings(NOTE_LIST_PAGINATION='cursor')
+    async def test_note_list_view_cursor_pagination(self):
+        """Тест курсорной пагинации асинхронного списка заметок"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('async_note_list'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+
+        response = await self.async_client.get(reverse('async_note_list'), {'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['notes']), 2)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    async def test_note_detail_view(self):
+        """Тест детальной страницы: своя заметка доступна, чужая - нет"""
+        note = await Note.objects.filter(owner=self.user).afirst()
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('async_note_detail', kwargs={'pk': note.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['note'], note)
+
+        response = await self.async_client.get(reverse('async_note_detail', kwargs={'pk': self.other_note.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
 class NoteDetailViewTest(TestCase):
     """Тесты детальной страницы заметки"""
 
@@ -457,3 +1091,244 @@ class IntegrationTest(TestCase):
         response = self.client.post(reverse('my_note:note_delete', kwargs={'pk': note.pk}))
         self.assertRedirects(response, reverse('my_note:note_list'))
         self.assertFalse(Note.objects.filter(pk=note.pk).exists())
+
+
+class BenchmarkTest(TestCase):
+    """Тесты набора данных и сценариев замеров производительности"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_seed_benchmark_data(self):
+        """Тест создания набора данных: заметки, изображения, счетчики и получатели напоминаний"""
+        users = seed_benchmark_data(users=3, notes=20, image_ratio=0.5, reminder_ratio=1, seed=1)
+        self.assertEqual(len(users), 3)
+        self.assertEqual(Note.objects.filter(owner__in=users).count(), 60)
+        self.assertTrue(NoteImage.objects.filter(note__owner__in=users).exists())
+        self.assertEqual(NoteStats.objects.get(user=users[0]).total_notes, 20)
+        dates = list(Note.objects.filter(owner=users[0]).values_list('created_at', flat=True))
+        self.assertEqual(len(set(dates)), 20)  # Даты создания распределены по году
+
+        self.assertEqual(clear_benchmark_data(), 3)
+        self.assertFalse(Note.objects.filter(owner__in=users).exists())
+
+    def test_benchmark_command(self):
+        """Тест сценариев замеров: задержки и количество запросов по каждому сценарию"""
+        seed_benchmark_data(users=2, notes=25, seed=1)
+        out = StringIO()
+        path = os.path.join(self.media_root, 'results.json')
+        call_command('benchmark', iterations=4, users=2, json_path=path, stdout=out)
+
+        with open(path, encoding='utf-8') as file:
+            results = {result['scenario']: result for result in json.load(file)}
+        self.assertEqual(set(results), {
+            'home', 'note_list', 'note_list_deep', 'note_search', 'note_detail', 'note_create', 'note_update',
+            'reminder_fanout',
+        })
+        self.assertEqual(results['note_list']['requests'], 4)
+        self.assertGreater(results['note_detail']['queries_avg'], 0)
+        self.assertIn('note_list_deep', out.getvalue())
+
+    def test_deep_list_url_matches_pagination_mode(self):
+        """Тест: адрес конца списка заметок строится только для настроенного режима пагинации"""
+        user = seed_benchmark_data(users=1, notes=25, seed=1)[0]
+        self.assertEqual(deep_list_url(user, deep_list_state(user)), f"{reverse('my_note:note_list')}?page=last")
+        with self.settings(NOTE_LIST_PAGINATION='cursor'):
+            url = deep_list_url(user, deep_list_state(user))
+        self.assertRegex(url, r'\?cursor=[\w-]+$')
+
+    def test_benchmark_query_budget(self):
+        """Тест порога количества SQL-запросов: превышение завершает команду ошибкой"""
+        seed_benchmark_data(users=1, notes=5, seed=1)
+        with self.assertRaises(CommandError):
+            call_command('benchmark', iterations=1, users=1, scenarios=['note_list'], max_queries=0, stdout=StringIO())
+
+    def test_benchmark_without_data(self):
+        """Тест запуска замеров без набора данных"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark', iterations=1, stdout=StringIO())
+
+
+class MigrateMediaToStorageTest(TestCase):
+    """Тесты переноса медиафайлов из папки на диске в хранилище медиафайлов"""
+
+    def setUp(self):
+        self.source_root = tempfile.mkdtemp()
+        self.target_root = tempfile.mkdtemp()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        note = Note.objects.create(title='Photo Note', content='Content', owner=self.user)
+        with self.settings(MEDIA_ROOT=self.source_root):
+            self.note_image = NoteImage.objects.create(
+                note=note, image=SimpleUploadedFile('photo.jpg', b'jpeg-data', content_type='image/jpeg')
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.source_root, ignore_errors=True)
+        shutil.rmtree(self.target_root, ignore_errors=True)
+
+    def migrate(self, *args):
+        out = StringIO()
+        with self.settings(MEDIA_ROOT=self.target_root):
+            call_command('migrate_media_to_storage', '--source', self.source_root, *args, stdout=out)
+        return out.getvalue()
+
+    def test_files_copied_with_same_paths(self):
+        """Тест переноса файлов без изменения путей в БД"""
+        name = self.note_image.image.name
+        self.assertIn('Перенесено файлов: 1', self.migrate())
+        with open(os.path.join(self.target_root, name), 'rb') as file:
+            self.assertEqual(file.read(), b'jpeg-data')
+        self.assertTrue(os.path.exists(os.path.join(self.source_root, name)))
+        # Повторный запуск пропускает перенесенные файлы
+        self.assertIn('уже в хранилище: 1', self.migrate())
+
+    def test_dry_run_and_delete_source(self):
+        """Тест подсчета без переноса и удаления файлов из папки после переноса"""
+        name = self.note_image.image.name
+        self.migrate('--dry-run')
+        self.assertFalse(os.path.exists(os.path.join(self.target_root, name)))
+
+        self.migrate('--delete-source')
+        self.assertTrue(os.path.exists(os.path.join(self.target_root, name)))
+        self.assertFalse(os.path.exists(os.path.join(self.source_root, name)))
+
+    def test_same_location_rejected(self):
+        """Тест: перенос в ту же папку невозможен"""
+        with self.settings(MEDIA_ROOT=self.source_root), self.assertRaises(CommandError):
+            call_command('migrate_media_to_storage', '--source', self.source_root, stdout=StringIO())
+
+
+@override_settings(NOTE_DIRECT_UPLOADS=True)
+class DirectUploadTest(TestCase):
+    """Тесты загрузки изображений браузером напрямую в хранилище (подпись формы загрузки подменяется)"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.presigned_post = patch.object(
+            default_storage, 'presigned_post', create=True,
+            return_value={'url': 'http://localhost:9000/my-note-media', 'fields': {'policy': 'signed'}},
+        )
+        self.presigned_post_mock = self.presigned_post.start()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other_user = User.objects.create_user(email='other@example.com', username='other', password='pass12345')
+        self.client.login(email='test@example.com', password='testpass123')
+
+    def tearDown(self):
+        self.presigned_post.stop()
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, user, content=None, issued_at=None):
+        """Файл, загруженный браузером в хранилище по ключу, выданному пользователю user"""
+        key = f'{UPLOAD_DIR}/{int(issued_at or time.time())}_{user.pk}_{uuid.uuid4().hex}.jpg'
+        return default_storage.save(key, ContentFile(make_jpeg().read() if content is None else content))
+
+    def test_upload_target(self):
+        """Тест выдачи подписанной формы загрузки с ключом пользователя"""
+        response = self.client.post(reverse('my_note:note_image_upload'), {'filename': 'Photo.JPG', 'size': 1000})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['url'], 'http://localhost:9000/my-note-media')
+        self.assertEqual(data['fields'], {'policy': 'signed'})
+        self.assertRegex(data['key'], rf'^{UPLOAD_DIR}/\d+_{self.user.pk}_[0-9a-f]{{32}}\.jpg$')
+        self.presigned_post_mock.assert_called_once_with(data['key'], 'image/jpeg', MAX_IMAGE_SIZE, expire=600)
+
+    def test_upload_target_rejected(self):
+        """Тест: форма загрузки не выдается для файлов другого формата и слишком больших файлов"""
+        url = reverse('my_note:note_image_upload')
+        self.assertEqual(self.client.post(url, {'filename': 'script.js', 'size': 1000}).status_code, 400)
+        response = self.client.post(url, {'filename': 'photo.jpg', 'size': MAX_IMAGE_SIZE + 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('10 МБ', response.json()['error'])
+        self.presigned_post_mock.assert_not_called()
+
+    @override_settings(NOTE_DIRECT_UPLOADS=False)
+    def test_upload_target_disabled(self):
+        """Тест: без NOTE_DIRECT_UPLOADS форма загрузки не выдается, а файлы загружаются через Django"""
+        response = self.client.post(reverse('my_note:note_image_upload'), {'filename': 'photo.jpg', 'size': 1000})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('my_note:note_create'))
+        self.assertNotContains(response, 'data-upload-url')
+
+    def test_form_renders_upload_fields(self):
+        """Тест: поля изображений связаны со скрытыми полями ключей и скриптом загрузки"""
+        response = self.client.get(reverse('my_note:note_create'))
+        self.assertContains(response, 'data-key-field="id_image_1_key"')
+        self.assertContains(response, 'name="image_2_key"')
+        self.assertContains(response, 'js/direct_upload.js')
+
+    def test_create_note_with_uploaded_key(self):
+        """Тест создания заметки с изображением из хранилища без повторной загрузки файла"""
+        key = self.upload(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('my_note:note_create'), {'title': 'Photo Note', 'content': 'Content', 'image_1_key': key}
+            )
+        self.assertRedirects(response, reverse('my_note:note_list'))
+
+        note_image = NoteImage.objects.get(note__title='Photo Note')
+        self.assertEqual(note_image.image.name, key)
+        self.assertEqual(note_image.status, NoteImage.Status.READY)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, UPLOAD_DIR)), [os.path.basename(key)])
+
+    def test_update_note_image_with_uploaded_key(self):
+        """Тест замены изображения заметки файлом из хранилища"""
+        note = Note.objects.create(title='Photo Note', content='Content', owner=self.user)
+        note_image = NoteImage.objects.create(note=note, image=make_jpeg())
+        key = self.upload(self.user)
+        response = self.client.post(
+            reverse('my_note:note_update', args=[note.pk]),
+            {'title': 'Photo Note', 'content': 'Content', 'image_1_key': key},
+        )
+        self.assertRedirects(response, reverse('my_note:note_list'))
+        note_image.refresh_from_db()
+        self.assertEqual(note_image.image.name, key)
+        self.assertEqual(note.images.count(), 1)
+
+    def test_invalid_keys_rejected(self):
+        """Тест: ключ другого пользователя, отсутствующий файл и файл не-изображение не принимаются"""
+        cases = [
+            (self.upload(self.other_user), 'Некорректный ключ'),
+            (f'{UPLOAD_DIR}/{int(time.time())}_{self.user.pk}_{"b" * 32}.jpg', 'не найден'),
+            (self.upload(self.user, content=b'not an image'), 'не является изображением'),
+            ('my_note/photo/photo.jpg', 'Некорректный ключ'),
+        ]
+        for key, error in cases:
+            with self.subTest(key=key):
+                response = self.client.post(
+                    reverse('my_note:note_create'), {'title': 'Photo Note', 'content': 'Content', 'image_1_key': key}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(error, str(response.context['form'].errors['image_1']))
+        self.assertFalse(Note.objects.exists())
+
+    def test_attached_key_not_reused(self):
+        """Тест: файл, уже прикрепленный к заметке, нельзя прикрепить повторно"""
+        key = self.upload(self.user)
+        note = Note.objects.create(title='Photo Note', content='Content', owner=self.user)
+        NoteImage.objects.create(note=note, image=key)
+        form = NoteForm(data={'title': 'Copy', 'content': 'Content', 'image_1_key': key}, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('уже прикреплен', str(form.errors['image_1']))
+
+    def test_delete_abandoned_uploads(self):
+        """Тест удаления старых файлов, не прикрепленных к заметке"""
+        old = time.time() - ABANDONED_UPLOAD_AGE - 60
+        abandoned = self.upload(self.user, issued_at=old)
+        attached = self.upload(self.other_user, issued_at=old)
+        recent = self.upload(self.user)
+        note = Note.objects.create(title='Photo Note', content='Content', owner=self.other_user)
+        NoteImage.objects.create(note=note, image=attached)
+
+        self.assertEqual(delete_abandoned_uploads(), 1)
+        self.assertFalse(default_storage.exists(abandoned))
+        self.assertTrue(default_storage.exists(attached))
+        self.assertTrue(default_storage.exists(recent))
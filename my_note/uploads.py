@@ -0,0 +1,137 @@
+"""Загрузка изображений к заметкам браузером напрямую в хранилище.
+
+Страницы создания и редактирования заметки запрашивают подписанную форму загрузки (presigned POST) для каждого
+выбранного файла, браузер отправляет файл прямо в объектное хранилище, а форма заметки передает Django только
+ключ загруженного объекта (поля image_1_key/image_2_key). Перед созданием NoteImage ключ проверяется: он выдан
+этому пользователю, объект существует, не превышает MAX_IMAGE_SIZE и является изображением (по первым
+UPLOAD_HEAD_SIZE байт, без скачивания файла веб-воркером). Полная обработка файла выполняется задачей
+process_note_image, как и для файлов, загруженных через Django.
+
+Ключи имеют вид ``my_note/photo/uploads/<время выдачи>_<id пользователя>_<случайная строка>.<расширение>``.
+Файлы, которые так и не были прикреплены к заметке (форма не отправлена), удаляются задачей
+delete_abandoned_uploads.
+"""
+import re
+import time
+import uuid
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from PIL import Image
+
+from my_note.models import NoteImage
+
+# Максимальный размер изображения к заметке, байт
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+# Допустимые расширения файлов и тип содержимого объекта в хранилище
+UPLOAD_CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+}
+# Форматы Pillow, которые принимаются после проверки файла (MPO - JPEG с несколькими кадрами от камер телефонов)
+UPLOAD_IMAGE_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP', 'GIF')
+UPLOAD_DIR = 'my_note/photo/uploads'
+UPLOAD_KEY_RE = re.compile(
+    rf'^{UPLOAD_DIR}/(?P<issued_at>\d+)_(?P<user_id>\d+)_[0-9a-f]{{32}}(?P<extension>\.[a-z]+)$'
+)
+# Сколько первых байт файла читается для проверки формата изображения (заголовок JPEG с EXIF может быть большим)
+UPLOAD_HEAD_SIZE = 256 * 1024
+# Файлы старше этого возраста (в секундах), не прикрепленные к заметке, считаются брошенными
+ABANDONED_UPLOAD_AGE = 24 * 60 * 60
+
+
+def get_image_storage():
+    """Хранилище изображений к заметкам"""
+    return NoteImage._meta.get_field('image').storage
+
+
+def direct_uploads_enabled():
+    """Включена ли загрузка напрямую в хранилище (хранилище должно уметь подписывать формы загрузки)"""
+    return settings.NOTE_DIRECT_UPLOADS and hasattr(get_image_storage(), 'presigned_post')
+
+
+def create_upload_target(user, filename, size):
+    """Ключ нового объекта и подписанная форма для загрузки файла браузером:
+    ``{'url': ..., 'fields': {...}, 'key': ...}``. Файл с недопустимым расширением или размером не принимается"""
+    extension = PurePosixPath(filename).suffix.lower()
+    if extension not in UPLOAD_CONTENT_TYPES:
+        raise ValidationError('Загрузите изображение в формате JPEG, PNG, WebP или GIF')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ValidationError('Не указан размер файла')
+    if not 0 < size <= MAX_IMAGE_SIZE:
+        raise ValidationError('Размер файла слишком большой. Максимальный размер: 10 МБ')
+
+    key = f'{UPLOAD_DIR}/{int(time.time())}_{user.pk}_{uuid.uuid4().hex}{extension}'
+    target = get_image_storage().presigned_post(
+        key, UPLOAD_CONTENT_TYPES[extension], MAX_IMAGE_SIZE, expire=settings.NOTE_DIRECT_UPLOAD_EXPIRE
+    )
+    return {'url': target['url'], 'fields': target['fields'], 'key': key}
+
+
+def read_upload_head(storage, key):
+    """Первые UPLOAD_HEAD_SIZE байт загруженного объекта и его размер"""
+    if hasattr(storage, 'read_head'):
+        return storage.read_head(key, UPLOAD_HEAD_SIZE)  # Один запрос к хранилищу (см. config/object_storage.py)
+    with storage.open(key, 'rb') as file:
+        return file.read(UPLOAD_HEAD_SIZE), storage.size(key)
+
+
+def verify_upload(key, user):
+    """Проверка ключа файла, загруженного браузером в хранилище, перед созданием NoteImage"""
+    match = UPLOAD_KEY_RE.match(key)
+    if (
+        not match
+        or user is None
+        or int(match['user_id']) != user.pk
+        or match['extension'] not in UPLOAD_CONTENT_TYPES
+    ):
+        raise ValidationError('Некорректный ключ загруженного файла')
+    if NoteImage.objects.filter(image=key).exists():
+        raise ValidationError('Файл уже прикреплен к заметке')
+
+    try:
+        head, size = read_upload_head(get_image_storage(), key)
+    except FileNotFoundError:
+        raise ValidationError('Загруженный файл не найден. Выберите файл еще раз')
+    if not 0 < size <= MAX_IMAGE_SIZE:
+        raise ValidationError('Размер файла слишком большой. Максимальный размер: 10 МБ')
+
+    # Image.open читает только заголовок: формат и размеры изображения (с проверкой на "бомбу декомпрессии")
+    try:
+        with Image.open(BytesIO(head)) as image:
+            image_format = image.format
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Загруженный файл не является изображением')
+    if image_format not in UPLOAD_IMAGE_FORMATS:
+        raise ValidationError('Загрузите изображение в формате JPEG, PNG, WebP или GIF')
+
+
+def find_abandoned_uploads(now=None):
+    """Пути загруженных напрямую файлов, которые старше ABANDONED_UPLOAD_AGE и не прикреплены к заметке"""
+    storage = get_image_storage()
+    try:
+        _, files = storage.listdir(UPLOAD_DIR)
+    except FileNotFoundError:  # Папка в локальном хранилище еще не создана
+        return []
+
+    deadline = (now or time.time()) - ABANDONED_UPLOAD_AGE
+    paths = []
+    for name in files:
+        path = f'{UPLOAD_DIR}/{name}'
+        match = UPLOAD_KEY_RE.match(path)
+        if match and int(match['issued_at']) < deadline:
+            paths.append(path)
+
+    # Прикрепленные файлы определяются пачками запросов (без запроса на каждый файл)
+    attached = set()
+    for start in range(0, len(paths), 1000):
+        batch = paths[start:start + 1000]
+        attached.update(NoteImage.objects.filter(image__in=batch).values_list('image', flat=True))
+    return [path for path in paths if path not in attached]
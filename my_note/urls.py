@@ -1,19 +1,33 @@
+from django.conf import settings
 from django.urls import path
-# from django.views.decorators.cache import cache_page
 
 from my_note.apps import MyNoteConfig
-from my_note.views import HomeView, NoteCreateView, NoteDeleteView, NoteDetailView, NoteListView, NoteUpdateView
+from my_note.async_views import AsyncHomeView, AsyncNoteDetailView, AsyncNoteListView
+from my_note.views import (HomeView,
+                           NoteCreateView,
+                           NoteDeleteView,
+                           NoteDetailView,
+                           NoteImageUploadView,
+                           NoteListView,
+                           NoteUpdateView)
 
 app_name = MyNoteConfig.name  # Извлечение имени приложения из модуля service_mailing/apps.py
 
+# При запуске через ASGI (uvicorn) страницы просмотра заметок обслуживаются асинхронными представлениями
+if settings.NOTE_ASYNC_VIEWS:
+    home_view, note_list_view, note_detail_view = AsyncHomeView, AsyncNoteListView, AsyncNoteDetailView
+else:
+    home_view, note_list_view, note_detail_view = HomeView, NoteListView, NoteDetailView
+
 urlpatterns = [
-    # Кеширование страницы на 5 минут
-    # path('', cache_page(60 * 5)(HomeView.as_view()), name='home'),
-    path('', HomeView.as_view(), name='home'),
+    # Данные главной страницы и списка заметок кешируются отдельно для каждого пользователя (см. my_note/cache.py)
+    path('', home_view.as_view(), name='home'),
 
-    path('notes/', NoteListView.as_view(), name='note_list'),
+    path('notes/', note_list_view.as_view(), name='note_list'),
     path('notes/create/', NoteCreateView.as_view(), name='note_create'),
-    path('notes/<int:pk>/', NoteDetailView.as_view(), name='note_detail'),
+    path('notes/<int:pk>/', note_detail_view.as_view(), name='note_detail'),
     path('notes/<int:pk>/update/', NoteUpdateView.as_view(), name='note_update'),
     path('notes/<int:pk>/delete/', NoteDeleteView.as_view(), name='note_delete'),
+    # Подписанная форма для загрузки изображения браузером напрямую в хранилище (NOTE_DIRECT_UPLOADS)
+    path('notes/uploads/', NoteImageUploadView.as_view(), name='note_image_upload'),
 ]
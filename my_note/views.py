@@ -1,11 +1,19 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import Q  # Библиотека для поиска по запросу в БД
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
 from django.urls import reverse_lazy
+from django.views import View
 from django.views.generic import CreateView, DeleteView, DetailView, ListView, UpdateView
 
+from my_note.cache import get_cached, set_cached
 from my_note.forms import NoteForm, NoteSearchForm
 from my_note.models import Note
+from my_note.pagination import CursorPaginator
+from my_note.search import search_notes
+from my_note.stats import get_note_stats
+from my_note.uploads import create_upload_target, direct_uploads_enabled
 
 
 class HomeView(ListView):
@@ -13,17 +21,32 @@ class HomeView(ListView):
     template_name = 'my_note/home.html'
     context_object_name = 'recent_notes'  # Имя переменной в шаблоне
 
+    def get_home_data(self):
+        """ Последние заметки и счетчики заметок пользователя (из кеша пользователя, если данные не менялись).
+        Количество заметок берется из счетчиков NoteStats (без COUNT(*) по таблице заметок) """
+        if not hasattr(self, 'home_data'):
+            user_id = self.request.user.pk
+            self.home_data = get_cached(user_id, 'home', ())
+            if self.home_data is None:
+                notes = Note.objects.filter(owner=self.request.user)
+                self.home_data = {'recent_notes': list(notes[:5]), 'note_stats': get_note_stats(self.request.user)}
+                set_cached(user_id, 'home', (), self.home_data)
+        return self.home_data
+
     def get_queryset(self):
         """ Получение своих последних 5 заметок на главной странице """
         if self.request.user.is_authenticated:
-            return Note.objects.filter(owner=self.request.user)[:5]
+            return self.get_home_data()['recent_notes']
         return Note.objects.none()
 
     def get_context_data(self, **kwargs):
-        """ Добавление количества заметок в контекст """
+        """ Добавление счетчиков заметок в контекст """
         context = super().get_context_data(**kwargs)
-        context['total_notes'] = Note.objects.filter(
-            owner=self.request.user).count() if self.request.user.is_authenticated else 0
+        if self.request.user.is_authenticated:
+            context['note_stats'] = self.get_home_data()['note_stats']
+            context['total_notes'] = context['note_stats'].total_notes
+        else:
+            context['total_notes'] = 0
         return context
 
 
@@ -33,10 +56,13 @@ class NoteListView(LoginRequiredMixin, ListView):
     template_name = 'my_note/note_list.html'
     context_object_name = 'notes'
     paginate_by = 10
+    pagination_mode = None  # Режим пагинации: offset или cursor (по умолчанию - из settings.NOTE_LIST_PAGINATION)
 
     def get_queryset(self):
-        """ Фильтрация заметок по пользователю """
-        queryset = Note.objects.filter(owner=self.request.user)
+        """ Фильтрация заметок по пользователю (с предзагрузкой изображений для карточек) """
+        self.search_query = ''
+        self.search_mode = ''
+        queryset = Note.objects.filter(owner=self.request.user).with_preview_images()
 
         # Поиск по запросу в БД
         search_form = NoteSearchForm(self.request.GET)  # Создаем форму из GET-запроса
@@ -44,17 +70,67 @@ class NoteListView(LoginRequiredMixin, ListView):
         if search_form.is_valid():
             query = search_form.cleaned_data.get('query')
             if query:
-                queryset = queryset.filter(
-                    Q(title__icontains=query) | Q(content__icontains=query)
-                )
+                self.search_query = query
+                self.search_mode = search_form.cleaned_data.get('mode') or settings.NOTE_SEARCH_MODE
+                queryset = search_notes(queryset, query, mode=self.search_mode)
         return queryset
 
+    def use_cursor_pagination(self):
+        """ Курсорная пагинация применяется к списку без поиска
+        (результаты поиска сортируются по релевантности, а не по дате создания) """
+        return (self.pagination_mode or settings.NOTE_LIST_PAGINATION) == 'cursor' and not self.search_query
+
+    def get_cache_parts(self):
+        """ Параметры запроса, от которых зависит содержимое страницы списка """
+        if self.use_cursor_pagination():
+            return 'cursor', self.request.GET.get('cursor'), settings.NOTE_LIST_APPROXIMATE_COUNT
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        return 'offset', str(page), self.search_query, self.search_mode
+
+    def paginate_queryset(self, queryset, page_size):
+        """ Пагинация по курсору (без COUNT(*) и OFFSET) или стандартная постраничная пагинация.
+        Заметки страницы и количество заметок берутся из кеша пользователя, если заметки не менялись """
+        user_id = self.request.user.pk
+        cache_parts = self.get_cache_parts()
+        cached = get_cached(user_id, 'note_list', cache_parts)
+
+        if self.use_cursor_pagination():
+            paginator = CursorPaginator(queryset, page_size, approximate=settings.NOTE_LIST_APPROXIMATE_COUNT)
+            if cached:
+                paginator._count, page = cached
+            else:
+                page = paginator.page(self.request.GET.get('cursor'))
+                set_cached(user_id, 'note_list', cache_parts, (paginator.count, page))
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        if cached:
+            count, page_number, notes = cached
+            paginator = self.paginator_class(
+                queryset, page_size, orphans=self.get_paginate_orphans(), allow_empty_first_page=self.get_allow_empty()
+            )
+            paginator.count = count  # Количество заметок из кеша (без COUNT(*))
+            page = paginator.page(page_number)
+            page.object_list = notes
+        else:
+            paginator, page, _, _ = super().paginate_queryset(queryset, page_size)
+            page.object_list = list(page.object_list)
+            set_cached(user_id, 'note_list', cache_parts, (paginator.count, page.number, page.object_list))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        """ Пагинатор списка без поиска получает количество заметок из счетчиков NoteStats (без COUNT(*)) """
+        paginator = super().get_paginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+        if not self.search_query:
+            paginator.count = get_note_stats(self.request.user).total_notes
+        return paginator
+
     def get_context_data(self, **kwargs):
-        """ Добавление формы поиска в контекст """
+        """ Добавление формы поиска и режима пагинации в контекст """
         # Получение контекста родительского класса
         context = super().get_context_data(**kwargs)
         search_form = NoteSearchForm(self.request.GET)
         context['search_form'] = search_form
+        context['cursor_pagination'] = self.use_cursor_pagination()
         return context
 
 
@@ -65,8 +141,8 @@ class NoteDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'note'  # Имя переменной в шаблоне
 
     def get_queryset(self):
-        """ Фильтрация заметок по пользователю """
-        return Note.objects.filter(owner=self.request.user)
+        """ Фильтрация заметок по пользователю (с предзагрузкой изображений) """
+        return Note.objects.filter(owner=self.request.user).with_preview_images()
 
 
 class NoteCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -77,6 +153,10 @@ class NoteCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     success_message = "Заметка успешно создана!"
     success_url = reverse_lazy("my_note:note_list")
 
+    def get_form_kwargs(self):
+        """ Передача пользователя в форму (для проверки ключей файлов, загруженных в хранилище) """
+        return {**super().get_form_kwargs(), 'user': self.request.user}
+
     def form_valid(self, form):
         """ Переопределение метода для сохранения заметки """
         form.instance.owner = self.request.user  # Добавление владельца заметки
@@ -95,14 +175,23 @@ class NoteUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
         """ Фильтрация заметок по пользователю """
         return Note.objects.filter(owner=self.request.user)
 
-    def get_initial(self):
-        initial = super().get_initial()  # Получаем начальные данные формы
-        # Заполняем поля изображений при редактировании
-        images = self.object.images.all()  # Получаем все изображения заметки
-        if images:
-            for i, image in enumerate(images[:2], 1):  # Добавляем первые 2 изображения
-                initial[f'image_{i}'] = image.image  # Добавляем поле изображения к начальным данным
-        return initial
+    def get_form_kwargs(self):
+        """ Передача пользователя в форму (для проверки ключей файлов, загруженных в хранилище) """
+        return {**super().get_form_kwargs(), 'user': self.request.user}
+
+
+class NoteImageUploadView(LoginRequiredMixin, View):
+    """ Выдача подписанной формы для загрузки изображения к заметке браузером напрямую в хранилище.
+    Принимает имя и размер выбранного файла, возвращает JSON {url, fields, key} (см. my_note/uploads.py) """
+
+    def post(self, request):
+        if not direct_uploads_enabled():
+            raise Http404("Загрузка файлов напрямую в хранилище отключена")
+        try:
+            target = create_upload_target(request.user, request.POST.get('filename', ''), request.POST.get('size'))
+        except ValidationError as e:
+            return JsonResponse({'error': e.messages[0]}, status=400)
+        return JsonResponse(target)
 
 
 class NoteDeleteView(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
@@ -0,0 +1,86 @@
+// Загрузка изображений к заметке напрямую в хранилище (см. my_note/uploads.py).
+// Для каждого поля с атрибутом data-upload-url выбранный файл отправляется в хранилище по подписанной форме,
+// а в скрытое поле data-key-field записывается ключ объекта. Сам файл с формой заметки не отправляется.
+(function () {
+    'use strict';
+
+    const form = document.querySelector('form[data-direct-uploads]');
+    if (!form) {
+        return;
+    }
+    const submitButton = form.querySelector('[type="submit"]');
+    const csrfToken = form.querySelector('[name="csrfmiddlewaretoken"]').value;
+    let pending = 0;
+
+    function showStatus(input, text, isError) {
+        let status = input.parentElement.querySelector('.direct-upload-status');
+        if (!status) {
+            status = document.createElement('div');
+            status.className = 'direct-upload-status form-text';
+            input.insertAdjacentElement('afterend', status);
+        }
+        status.textContent = text;
+        status.classList.toggle('text-danger', Boolean(isError));
+    }
+
+    async function requestTarget(input, file) {
+        const data = new FormData();
+        data.append('filename', file.name);
+        data.append('size', file.size);
+        const response = await fetch(input.dataset.uploadUrl, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken},
+            body: data,
+            credentials: 'same-origin',
+        });
+        const target = await response.json();
+        if (!response.ok) {
+            throw new Error(target.error || 'Не удалось подготовить загрузку файла');
+        }
+        return target;
+    }
+
+    async function uploadFile(target, file) {
+        const data = new FormData();
+        Object.entries(target.fields).forEach(([name, value]) => data.append(name, value));
+        data.append('file', file);  // Файл должен быть последним полем формы
+        const response = await fetch(target.url, {method: 'POST', body: data});
+        if (!response.ok) {
+            throw new Error('Хранилище не приняло файл');
+        }
+    }
+
+    async function handleChange(input) {
+        const keyField = document.getElementById(input.dataset.keyField);
+        const file = input.files[0];
+        keyField.value = '';
+        if (!file) {
+            return;
+        }
+
+        pending += 1;
+        submitButton.disabled = true;
+        showStatus(input, 'Загрузка файла ' + file.name + '...');
+        try {
+            const target = await requestTarget(input, file);
+            await uploadFile(target, file);
+            keyField.value = target.key;
+            input.value = '';  // Файл уже в хранилище: форма передаст только его ключ
+            showStatus(input, 'Файл ' + file.name + ' загружен');
+        } catch (error) {
+            input.value = '';
+            showStatus(input, error.message, true);
+        } finally {
+            pending -= 1;
+            submitButton.disabled = pending > 0;
+        }
+    }
+
+    form.querySelectorAll('input[type="file"][data-upload-url]').forEach((input) => {
+        const keyField = document.getElementById(input.dataset.keyField);
+        if (keyField.value) {
+            showStatus(input, 'Файл загружен');  // Форма показана повторно после ошибки в других полях
+        }
+        input.addEventListener('change', () => handleChange(input));
+    });
+})();
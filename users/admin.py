@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import User
+from .models import OutboxEmail, User
 
 
 @admin.register(User)
@@ -12,6 +12,15 @@ class CustomUserAdmin(UserAdmin):
 
     fieldsets = UserAdmin.fieldsets + (
         ('Дополнительная информация', {
-            'fields': ('phone', 'avatar', 'is_recalled_daily', 'token', 'tg_chat_id')
+            'fields': ('phone', 'avatar', 'is_recalled_daily', 'tg_chat_id')
         }),
     )
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'recipients']
+    readonly_fields = ['subject', 'body', 'from_email', 'recipients', 'status', 'attempts', 'last_error',
+                       'created_at', 'sent_at']
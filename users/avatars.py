@@ -0,0 +1,61 @@
+"""Подготовка квадратных копий аватара пользователя.
+
+Из загруженного аватара вырезается квадрат по центру, который уменьшается до размеров AVATAR_SIZES
+в форматах WebP и JPEG (JPEG - для браузеров без поддержки WebP). Открытие и кодирование изображений
+выполняется так же, как для изображений к заметкам (см. my_note/images.py): с учетом ориентации из EXIF
+и без переноса метаданных.
+Файлы копий хранятся рядом с исходным файлом:
+``users/avatars/renditions/<id пользователя>/<имя исходного файла>_<размер>.<формат>``,
+их пути и размеры - в ``User.avatar_renditions``.
+"""
+import logging
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from my_note.images import RENDITION_FORMATS, encode_image, open_image
+
+logger = logging.getLogger(__name__)
+
+# Размеры квадратных копий в пикселях: 64 - маленький аватар в меню (32px, в том числе на экранах 2x),
+# 150 и 300 - профиль на обычных экранах и экранах высокой плотности (2x)
+AVATAR_SIZES = (64, 150, 300)
+
+
+def avatar_rendition_dir(user):
+    """Папка для хранения копий аватара пользователя"""
+    return f'users/avatars/renditions/{user.pk}'
+
+
+def build_avatar_renditions(user, source):
+    """Создание квадратных копий аватара в хранилище. Возвращает описание копий для поля User.avatar_renditions:
+    ``{'webp': [{'path': ..., 'size': 64}, ...], 'jpeg': [...]}`` (от меньшей к большей)"""
+    storage = user.avatar.storage
+    stem = PurePosixPath(user.avatar.name).stem
+    # Копии больше исходного изображения не создаются (кроме самой маленькой)
+    side = min(source.size)
+    sizes = [size for size in AVATAR_SIZES if size <= side] or [AVATAR_SIZES[0]]
+    squares = [ImageOps.fit(source, (size, size), Image.Resampling.LANCZOS) for size in sizes]
+
+    renditions = {}
+    for fmt, (_, extension, _) in RENDITION_FORMATS.items():
+        renditions[fmt] = []
+        for square in squares:
+            path = f'{avatar_rendition_dir(user)}/{stem}_{square.width}.{extension}'
+            if storage.exists(path):
+                storage.delete(path)
+            path = storage.save(path, ContentFile(encode_image(square, fmt)))
+            renditions[fmt].append({'path': path, 'size': square.width})
+    return renditions
+
+
+def create_avatar_renditions(user):
+    """Создание копий текущего аватара пользователя. Возвращает описание копий или None,
+    если файл не удается прочитать как изображение (в шаблонах используется исходный файл)"""
+    try:
+        source = open_image(user.avatar)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning('Не удалось прочитать аватар пользователя %s: %s', user.pk, e)
+        return None
+    return build_avatar_renditions(user, source)
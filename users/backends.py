@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+UserModel = get_user_model()
+
+# Поля пользователя, которые не попадают в кеш: хеш пароля хранится только в БД
+USER_CACHE_EXCLUDED_FIELDS = ('password',)
+
+
+def user_cache_key(user_id):
+    """Ключ кеша пользователя"""
+    return f'users:user-fields:{user_id}'
+
+
+def invalidate_user_cache(user_id):
+    """Удаление пользователя из кеша: сразу и повторно после фиксации транзакции
+    (параллельный запрос мог успеть закешировать прежние данные)"""
+    cache.delete(user_cache_key(user_id))
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+def dump_cached_user(user):
+    """Данные пользователя для кеша: значения полей (без пароля, файлы - путями) и хеш для проверки сессии"""
+    fields = {}
+    for field in user._meta.concrete_fields:
+        if field.attname in USER_CACHE_EXCLUDED_FIELDS:
+            continue
+        value = getattr(user, field.attname)
+        fields[field.attname] = value.name if isinstance(value, FieldFile) else value
+    return {'fields': fields, 'session_auth_hash': user.get_session_auth_hash()}
+
+
+def load_cached_user(data):
+    """Пользователь из данных кеша. Пароль остается отложенным полем: он загружается из БД только при обращении,
+    а save() не перезаписывает его"""
+    user = UserModel.from_db(UserModel._default_manager.db, list(data['fields']), list(data['fields'].values()))
+    user.cached_session_auth_hash = data['session_auth_hash']
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """Аутентификация по модели пользователя с кешированием пользователя в Redis.
+    AuthenticationMiddleware получает пользователя запроса через get_user, поэтому аутентифицированные запросы
+    не загружают пользователя из БД. Кеш сбрасывается при сохранении и удалении пользователя (см. users/signals.py)"""
+
+    def get_user(self, user_id):
+        data = cache.get(user_cache_key(user_id))
+        if data is None:
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(user_cache_key(user_id), dump_cached_user(user), settings.USER_CACHE_TIMEOUT)
+        else:
+            user = load_cached_user(data)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        data = await cache.aget(user_cache_key(user_id))
+        if data is None:
+            try:
+                user = await UserModel._default_manager.aget(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            await cache.aset(user_cache_key(user_id), dump_cached_user(user), settings.USER_CACHE_TIMEOUT)
+        else:
+            user = load_cached_user(data)
+        return user if self.user_can_authenticate(user) else None
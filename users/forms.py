@@ -1,8 +1,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 from users.models import User
+from users.tasks import delete_avatar_files, process_avatar
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -69,13 +71,15 @@ class UserUpdateForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Делаем email readonly, так как он используется для входа
         self.fields["email"].widget.attrs["readonly"] = True
+        # Файлы текущего аватара (удаляются после замены или удаления аватара)
+        self.initial_avatar_paths = self.instance.get_avatar_paths() if self.instance.pk else []
 
     def clean_avatar(self):
         """Валидация аватара"""
         avatar = self.cleaned_data.get("avatar")
 
         if not avatar:
-            return None
+            return avatar  # False - аватар удален отметкой "Очистить"
 
         # Проверка размера файла (максимум 5 МБ)
         max_size = 10 * 1024 * 1024
@@ -90,3 +94,20 @@ class UserUpdateForm(forms.ModelForm):
             raise forms.ValidationError(f"Неподдерживаемый формат файла. Разрешены: {', '.join(valid_extensions)}")
 
         return avatar
+
+    def save(self, commit=True):
+        """Сохранение профиля. После замены или удаления аватара файлы прежнего аватара (исходный и копии)
+        удаляются, а копии нового создаются в фоне после фиксации транзакции"""
+        avatar_changed = "avatar" in self.changed_data
+        if avatar_changed:
+            self.instance.avatar_renditions = {}
+        user = super().save(commit=commit)
+
+        if avatar_changed and commit:
+            old_paths = self.initial_avatar_paths
+            if old_paths:
+                transaction.on_commit(lambda: delete_avatar_files.delay(old_paths))
+            if user.avatar:
+                avatar_name = user.avatar.name
+                transaction.on_commit(lambda: process_avatar.delay(user.pk, avatar_name))
+        return user
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from users.avatars import create_avatar_renditions
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Создание квадратных копий для ранее загруженных аватаров пользователей"""
+
+    help = 'Создает копии аватаров (WebP/JPEG) для пользователей, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии для всех аватаров')
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True).order_by('pk')
+        if not options['all']:
+            users = users.filter(avatar_renditions={})
+
+        created = failed = 0
+        for user in users.iterator():
+            renditions = create_avatar_renditions(user)
+            if renditions is None:
+                failed += 1
+                continue
+            user.avatar_renditions = renditions
+            user.save(update_fields=['avatar_renditions'])  # Сбрасывает кеш пользователя (users/signals.py)
+            created += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Создано копий: {created}, ошибок: {failed}'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0003_alter_user_options_user_tg_chat_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("is_recalled_daily", True), ("tg_chat_id__isnull", False)),
+                fields=["id"],
+                name="user_reminder_recipients_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-17 16:40
+
+import hashlib
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def move_user_tokens(apps, schema_editor):
+    """Перенос токенов неподтвержденных пользователей в таблицу токенов (в виде хешей)"""
+    User = apps.get_model("users", "User")
+    EmailConfirmationToken = apps.get_model("users", "EmailConfirmationToken")
+    expires_at = timezone.now() + timedelta(hours=settings.EMAIL_CONFIRMATION_TOKEN_TTL_HOURS)
+    users = User.objects.filter(is_active=False, token__isnull=False).exclude(token="").values_list("pk", "token")
+    EmailConfirmationToken.objects.bulk_create(
+        (
+            EmailConfirmationToken(
+                user_id=user_id,
+                token_hash=hashlib.sha256(token.encode()).hexdigest(),
+                expires_at=expires_at,
+            )
+            for user_id, token in users.iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_user_reminder_recipients_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailConfirmationToken",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="email_confirmation_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                ("token_hash", models.CharField(max_length=64, unique=True, verbose_name="Хеш токена")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="Действителен до")),
+            ],
+            options={
+                "verbose_name": "Токен подтверждения email",
+                "verbose_name_plural": "Токены подтверждения email",
+            },
+        ),
+        migrations.RunPython(move_user_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="user",
+            name="token",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="avatar_renditions",
+            field=models.JSONField(blank=True, default=dict, verbose_name="Копии аватара"),
+        ),
+    ]
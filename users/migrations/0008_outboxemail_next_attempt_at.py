@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_user_avatar_renditions"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="outboxemail",
+            name="outbox_email_pending_idx",
+        ),
+        migrations.AddField(
+            model_name="outboxemail",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name="Дата следующей попытки"),
+        ),
+        migrations.AddIndex(
+            model_name="outboxemail",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["next_attempt_at"],
+                name="outbox_email_next_attempt_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,11 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -33,6 +39,12 @@ class User(AbstractUser):
         null=True,
         verbose_name="Аватар",
     )
+    # Квадратные копии аватара: пути к файлам и размеры (см. users/avatars.py)
+    avatar_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Копии аватара",
+    )
 ############################################################################################
     # Поле для ежедневного напоминания о заполнении дневника
     is_recalled_daily = models.BooleanField(
@@ -40,13 +52,6 @@ class User(AbstractUser):
         verbose_name='Ежедневное напоминание',
         help_text='Отметьте для ежедневного напоминания о заполнении дневника'
     )
-############################################################################################
-    # Поле для хранения токена временного доступа (для регистрации пользователя)
-    token = models.CharField(
-        max_length=100,
-        blank=True,
-        null=True,
-        verbose_name="Токен подтверждения")
 
     USERNAME_FIELD = "email"  # Обязательное поле для авторизации по email
     REQUIRED_FIELDS = ["username"]  # Обязательные поля для создания суперпользователя (включая email)
@@ -56,6 +61,178 @@ class User(AbstractUser):
 
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            # Частичный индекс для выборки получателей ежедневных напоминаний (см. users/tasks.py)
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_recalled_daily=True, tg_chat_id__isnull=False),
+                name="user_reminder_recipients_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.username} - {self.email}"
+
+    def get_session_auth_hash(self):
+        """Хеш для проверки сессии. У пользователя из кеша (см. users/backends.py) пароль не загружен,
+        поэтому, пока пароль не задан заново, используется хеш, сохраненный в кеше вместе с пользователем"""
+        cached_hash = getattr(self, "cached_session_auth_hash", None)
+        if cached_hash is not None and "password" in self.get_deferred_fields():
+            return cached_hash
+        return super().get_session_auth_hash()
+
+    def get_avatar_paths(self):
+        """Пути ко всем файлам аватара в хранилище: исходному файлу и его копиям"""
+        paths = [self.avatar.name] if self.avatar else []
+        for items in self.avatar_renditions.values():
+            paths.extend(item["path"] for item in items)
+        return paths
+
+    def get_avatar_rendition(self, size, fmt):
+        """Наименьшая копия аватара в формате fmt не меньше size пикселей (или наибольшая из имеющихся)"""
+        renditions = self.avatar_renditions.get(fmt, [])
+        for item in renditions:
+            if item["size"] >= size:
+                return item
+        return renditions[-1] if renditions else None
+
+    def avatar_url(self, size):
+        """URL JPEG-копии аватара для отображения размером size пикселей или исходного файла, если копий нет"""
+        rendition = self.get_avatar_rendition(size, "jpeg")
+        if rendition is None:
+            return self.avatar.url
+        return self.avatar.storage.url(rendition["path"])
+
+    def avatar_srcset(self, size, fmt):
+        """Значение атрибута srcset с копиями аватара размером size для обычных экранов и экранов высокой
+        плотности (например: "a_150.webp 1x, a_300.webp 2x")"""
+        items = []
+        for density in (1, 2):
+            rendition = self.get_avatar_rendition(size * density, fmt)
+            if rendition is not None and rendition not in items:
+                items.append(rendition)
+        return ", ".join(
+            f"{self.avatar.storage.url(item['path'])} {item['size'] / items[0]['size']:g}x" for item in items
+        )
+
+
+class EmailConfirmationToken(models.Model):
+    """Токен подтверждения email. В БД хранится только SHA-256 хеш токена (уникальный индекс),
+    поэтому проверка ссылки - поиск по индексу, а утечка таблицы не раскрывает действующие ссылки.
+    Токен удаляется после подтверждения, просроченные токены удаляются периодической задачей (см. users/tasks.py)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="email_confirmation_tokens",
+        verbose_name="Пользователь",
+    )
+    token_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="Хеш токена",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания",
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name="Действителен до",
+    )
+
+    class Meta:
+        """Метаданные модели"""
+
+        verbose_name = "Токен подтверждения email"
+        verbose_name_plural = "Токены подтверждения email"
+
+    def __str__(self):
+        return f"Токен подтверждения для {self.user_id} до {self.expires_at}"
+
+    @staticmethod
+    def hash_token(token):
+        """Хеш токена для хранения и поиска в БД"""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """Создание токена для пользователя. Возвращает сам токен (~43 символа) для ссылки в письме"""
+        token = secrets.token_urlsafe(32)  # Криптографически безопасный случайный токен
+        cls.objects.create(
+            user=user,
+            token_hash=cls.hash_token(token),
+            expires_at=timezone.now() + timedelta(hours=settings.EMAIL_CONFIRMATION_TOKEN_TTL_HOURS),
+        )
+        return token
+
+
+class OutboxEmail(models.Model):
+    """Исходящее письмо. Письма отправляются задачей Celery (см. users/tasks.py), таблица хранит историю отправки.
+    Текст письма (в нем может быть ссылка с токеном подтверждения) очищается после отправки"""
+
+    class Status(models.TextChoices):
+        """Статусы отправки письма"""
+        PENDING = "pending", "Ожидает отправки"
+        SENT = "sent", "Отправлено"
+        FAILED = "failed", "Не отправлено"
+
+    subject = models.CharField(
+        max_length=255,
+        verbose_name="Тема",
+    )
+    body = models.TextField(
+        verbose_name="Текст письма",
+    )
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        verbose_name="Отправитель",
+    )
+    recipients = models.JSONField(
+        default=list,
+        verbose_name="Получатели",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус отправки",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Попыток отправки",
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания",
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Дата следующей попытки",
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата отправки",
+    )
+
+    class Meta:
+        """Метаданные модели"""
+
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        indexes = [
+            # Частичный индекс для выборки неотправленных писем (см. users/tasks.py)
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbox_email_next_attempt_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {', '.join(self.recipients)}"
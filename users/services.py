@@ -1,29 +1,237 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from django.conf import settings
+from django.db import transaction
+from requests.adapters import HTTPAdapter
 
-from config import settings
+from users.models import OutboxEmail
 
+logger = logging.getLogger(__name__)
 
-def send_telegram_message(tg_chat_id, message):
-    """Отправка сообщения в телеграм"""
-    try:
-        # Параметры для отправки сообщения
-        params = {
-            "chat_id": tg_chat_id,
-            "text": message,
-        }
-        # формирование ссылки для отправки сообщения в Телеграм
-        url = f"{settings.TELEGRAM_URL}{settings.TG_BOT_TOKEN}/sendMessage"
-        response = requests.post(url, json=params, timeout=10)  # отправка запроса к боту Телеграм и сохранение ответа
-        response.raise_for_status()  # проверка на ошибки в ответе от сервера Телеграм
-
-        return True
+# Общая HTTP-сессия для запросов к Telegram: соединения (TCP/TLS) переиспользуются между сообщениями (keep-alive)
+_telegram_session = None
+# Общий ограничитель скорости отправки сообщений (см. TelegramRateLimiter)
+_rate_limiter = None
+
+
+class TelegramRetryAfter(Exception):
+    """Сообщение нельзя отправить сейчас (ответ 429 от Telegram или исчерпан лимит отправки).
+    retry_after - через сколько секунд можно повторить отправку"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Повторить отправку через {retry_after} с")
+        self.retry_after = retry_after
+
+
+class TelegramTemporaryError(Exception):
+    """Временная ошибка отправки (нет соединения, таймаут, ошибка сервера Telegram) - отправку нужно повторить"""
+
+
+# Алгоритм "ведро токенов" для общего лимита бота и лимита на чат, выполняется в Redis атомарно.
+# KEYS: общее ведро, ведро чата, ключ паузы после ответа 429. ARGV: скорость и емкость общего ведра и ведра чата.
+# Возвращает время ожидания в секундах ("0" - токены списаны, сообщение можно отправлять).
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local pause = redis.call('PTTL', KEYS[3])
+if pause > 0 then
+    return tostring(pause / 1000)
+end
+local wait = 0
+local buckets = {}
+for i = 1, 2 do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    buckets[i] = {tokens, rate, capacity}
+end
+for i = 1, 2 do
+    local tokens = buckets[i][1]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(buckets[i][3] / buckets[i][2]) + 1)
+end
+return tostring(wait)
+"""
+
+
+class TelegramRateLimiter:
+    """Ограничение скорости отправки сообщений: общий лимит бота и лимит на каждый чат.
+    Состояние хранится в Redis (общем для всех воркеров Celery), если кеш Django настроен на Redis,
+    иначе - в памяти процесса."""
+
+    key_prefix = "telegram:rate"
+
+    def __init__(self):
+        self.global_rate = settings.TG_GLOBAL_RATE_LIMIT
+        self.chat_rate = settings.TG_CHAT_RATE_LIMIT
+        self.redis = None
+        if settings.CACHES["default"]["BACKEND"].startswith("django_redis"):
+            from django_redis import get_redis_connection
+
+            self.redis = get_redis_connection("default")
+            self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.paused_until = 0
+
+    def acquire(self, tg_chat_id):
+        """Попытка получить разрешение на отправку сообщения в чат. Возвращает время ожидания в секундах (0 - можно)"""
+        if self.redis is not None:
+            keys = [f"{self.key_prefix}:global", f"{self.key_prefix}:chat:{tg_chat_id}", f"{self.key_prefix}:pause"]
+            args = [self.global_rate, max(1, self.global_rate), self.chat_rate, max(1, self.chat_rate)]
+            return float(self.script(keys=keys, args=args))
+        return self._acquire_local(tg_chat_id)
+
+    def _acquire_local(self, tg_chat_id):
+        """Алгоритм "ведро токенов" в памяти процесса (аналог TOKEN_BUCKET_SCRIPT)"""
+        with self.lock:
+            now = time.monotonic()
+            if self.paused_until > now:
+                return self.paused_until - now
+            buckets = [(("global",), self.global_rate), (("chat", tg_chat_id), self.chat_rate)]
+            states = []
+            wait = 0
+            for key, rate in buckets:
+                capacity = max(1, rate)
+                tokens, ts = self.buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - ts) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                states.append((key, tokens))
+            for key, tokens in states:
+                self.buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            return wait
+
+    def pause(self, seconds):
+        """Пауза в отправке всех сообщений (после ответа 429 от Telegram)"""
+        if self.redis is not None:
+            self.redis.set(f"{self.key_prefix}:pause", 1, px=max(1, int(seconds * 1000)))
+        else:
+            with self.lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + seconds)
 
+    def wait(self, tg_chat_id):
+        """Ожидание разрешения на отправку не дольше settings.TG_RATE_LIMIT_MAX_WAIT секунд.
+        Если ждать нужно дольше, вызывается исключение TelegramRetryAfter (отправка переносится)"""
+        while True:
+            delay = self.acquire(tg_chat_id)
+            if not delay:
+                return
+            if delay > settings.TG_RATE_LIMIT_MAX_WAIT:
+                raise TelegramRetryAfter(delay)
+            time.sleep(delay)
+
+
+def get_telegram_session():
+    """Получение общей HTTP-сессии с пулом соединений для отправки сообщений в Телеграм"""
+    global _telegram_session
+    if _telegram_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TG_MAX_CONCURRENCY)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _telegram_session = session
+    return _telegram_session
+
+
+def get_rate_limiter():
+    """Получение общего ограничителя скорости отправки сообщений в Телеграм"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TelegramRateLimiter()
+    return _rate_limiter
+
+
+def post_telegram_message(tg_chat_id, message):
+    """Запрос к API Telegram на отправку сообщения.
+    Возвращает True при успешной отправке и False при постоянной ошибке (например, бот заблокирован в чате).
+    При ответе 429 вызывает TelegramRetryAfter, при временных ошибках - TelegramTemporaryError"""
+    # Параметры для отправки сообщения
+    params = {
+        "chat_id": tg_chat_id,
+        "text": message,
+    }
+    # формирование ссылки для отправки сообщения в Телеграм
+    url = f"{settings.TELEGRAM_URL}{settings.TG_BOT_TOKEN}/sendMessage"
+    try:
+        # отправка запроса к боту Телеграм через общую сессию и сохранение ответа
+        response = get_telegram_session().post(url, json=params, timeout=10)
     except requests.exceptions.RequestException as e:
-        print(f"Ошибка отправки сообщения в Телеграм: {str(e)}")
+        raise TelegramTemporaryError(str(e)) from e
 
+    if response.status_code == 429:
+        try:
+            retry_after = response.json()["parameters"]["retry_after"]
+        except (ValueError, KeyError, TypeError):
+            retry_after = int(response.headers.get("Retry-After", 1))
+        raise TelegramRetryAfter(retry_after)
+    if response.status_code >= 500:
+        raise TelegramTemporaryError(f"Ошибка сервера Telegram: {response.status_code}")
+    if not response.ok:
+        logger.warning("Ошибка отправки сообщения в Телеграм: %s %s", response.status_code, response.text)
         return False
+    return True
 
-    except Exception as e:
-        print(f"Непредвиденная ошибка: {str(e)}")
 
-        return False
+def deliver_telegram_message(tg_chat_id, message):
+    """Отправка сообщения в Телеграм с соблюдением лимитов скорости.
+    После ответа 429 отправка всех сообщений приостанавливается на указанное Telegram время"""
+    limiter = get_rate_limiter()
+    limiter.wait(tg_chat_id)
+    try:
+        return post_telegram_message(tg_chat_id, message)
+    except TelegramRetryAfter as e:
+        limiter.pause(e.retry_after)
+        raise
+
+
+def send_telegram_messages(messages):
+    """Параллельная отправка сообщений в Телеграм с ограничением числа одновременных запросов.
+    Принимает список пар (tg_chat_id, message). Возвращает количество доставленных и неотправленных сообщений,
+    а также сообщения, отправку которых нужно повторить позже: список (tg_chat_id, message, retry_after)"""
+
+    def deliver(item):
+        tg_chat_id, message = item
+        try:
+            return deliver_telegram_message(tg_chat_id, message), None
+        except TelegramRetryAfter as e:
+            return False, (tg_chat_id, message, e.retry_after)
+        except TelegramTemporaryError:
+            return False, (tg_chat_id, message, 0)
+
+    with ThreadPoolExecutor(max_workers=settings.TG_MAX_CONCURRENCY) as executor:
+        results = list(executor.map(deliver, messages))
+
+    delivered = sum(1 for is_delivered, _ in results if is_delivered)
+    deferred = [retry for _, retry in results if retry]
+    return {"delivered": delivered, "failed": len(results) - delivered - len(deferred), "deferred": deferred}
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """Постановка письма в очередь отправки: письмо сохраняется в таблицу исходящих писем
+    и отправляется задачей Celery после фиксации транзакции (запрос не ждет SMTP-сервер)"""
+    from users.tasks import send_outbox_emails  # users.tasks импортирует этот модуль
+
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or "",
+        recipients=list(recipient_list),
+    )
+    # robust=True: при недоступном брокере ошибка только записывается в журнал, а письмо остается в статусе
+    # "Ожидает отправки" и отправляется периодической задачей send_pending_emails
+    transaction.on_commit(lambda: send_outbox_emails.delay([email.pk]), robust=True)
+    return email
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.backends import invalidate_user_cache
+from users.models import User
+from users.tasks import delete_avatar_files
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Сброс кеша пользователя после изменения профиля, пароля, активации или удаления"""
+    invalidate_user_cache(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar(sender, instance, **kwargs):
+    """Удаление файлов аватара (исходного и копий) после удаления пользователя"""
+    paths = instance.get_avatar_paths()
+    if paths:
+        transaction.on_commit(lambda: delete_avatar_files.delay(paths))
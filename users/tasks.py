@@ -1,22 +1,240 @@
-from celery import shared_task
+import logging
+import random
+import smtplib
+from datetime import timedelta
 
-from users.models import User
-from users.services import send_telegram_message
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from users.avatars import create_avatar_renditions
+from users.backends import invalidate_user_cache
+from users.models import EmailConfirmationToken, OutboxEmail, User
+from users.services import TelegramRetryAfter, TelegramTemporaryError, deliver_telegram_message, send_telegram_messages
+
+logger = logging.getLogger(__name__)
+
+
+def build_reminder_message(username):
+    """Текст напоминания о заполнении дневника"""
+    return (f'Привет, {username}, от "My note"! '
+            f'День подходит к концу, не забудь записать самые важные моменты в свой дневник!'
+            f' http://127.0.0.1:8000/')
+
+
+def retry_countdown(retries, retry_after=0):
+    """Задержка перед повторной отправкой: экспоненциально растущая (со случайным разбросом),
+    но не меньше времени, указанного Telegram в ответе 429"""
+    backoff = min(settings.TG_RETRY_BACKOFF_MAX, settings.TG_RETRY_BACKOFF * 2 ** retries)
+    return max(retry_after, backoff) + random.uniform(0, settings.TG_RETRY_BACKOFF)
+
+
+def reminder_recipients():
+    """Пользователи, которые хотят получать напоминания и указали в профиле свой чат в Телеграме
+    (условие совпадает с частичным индексом user_reminder_recipients_idx)"""
+    return User.objects.filter(is_recalled_daily=True, tg_chat_id__isnull=False)
+
+
+def iter_reminder_batches(batch_size):
+    """Разбиение получателей напоминаний на пакеты - диапазоны id (первый, последний).
+    Идентификаторы читаются потоком (серверным курсором в PostgreSQL), поэтому расход памяти не зависит
+    от количества пользователей"""
+    user_ids = reminder_recipients().order_by("pk").values_list("pk", flat=True).iterator(chunk_size=batch_size)
+    first_id = last_id = None
+    count = 0
+    for user_id in user_ids:
+        if first_id is None:
+            first_id = user_id
+        last_id = user_id
+        count += 1
+        if count == batch_size:
+            yield first_id, last_id
+            first_id, count = None, 0
+    if first_id is not None:
+        yield first_id, last_id
 
 
 @shared_task
 def send_reminder_message():
-    """Отправка напоминания о заполнении дневника в Телеграм пользователей"""
+    """Отправка напоминания о заполнении дневника в Телеграм пользователей.
+    Получатели делятся на пакеты, которые отправляются параллельно отдельными задачами,
+    после чего результаты отправки суммируются."""
+    batches = list(iter_reminder_batches(settings.TG_REMINDER_BATCH_SIZE))
+
+    if not batches:
+        return
+
+    chord(send_reminder_batch.s(first_id, last_id) for first_id, last_id in batches)(aggregate_reminder_results.s())
+
+
+@shared_task
+def send_reminder_batch(first_id, last_id):
+    """Отправка напоминаний пакету пользователей с id из диапазона [first_id, last_id]"""
+    return deliver_reminder_batch(first_id, last_id)
+
+
+def deliver_reminder_batch(first_id, last_id, send_messages=None):
+    """Отправка напоминаний пакету пользователей функцией send_messages (по умолчанию - в Телеграм).
+    Из БД загружаются только имя пользователя и чат в Телеграме.
+    Сообщения, которые не удалось отправить из-за лимитов или временных ошибок, переносятся в отдельные задачи"""
+    recipients = reminder_recipients().filter(pk__range=(first_id, last_id)).values_list("username", "tg_chat_id")
+    messages = [(tg_chat_id, build_reminder_message(username)) for username, tg_chat_id in recipients.iterator()]
+    result = (send_messages or send_telegram_messages)(messages)
+
+    for tg_chat_id, message, retry_after in result["deferred"]:
+        send_telegram_message_task.apply_async((tg_chat_id, message), countdown=retry_countdown(0, retry_after))
+
+    return {"delivered": result["delivered"], "failed": result["failed"], "rescheduled": len(result["deferred"])}
+
+
+@shared_task(bind=True, max_retries=None)
+def send_telegram_message_task(self, tg_chat_id, message):
+    """Повторная отправка сообщения в Телеграм с экспоненциальной задержкой между попытками"""
+    try:
+        return deliver_telegram_message(tg_chat_id, message)
+    except TelegramRetryAfter as e:
+        retry_after = e.retry_after
+    except TelegramTemporaryError:
+        retry_after = 0
 
-    # Получаем всех пользователей, которые хотят получать напоминания и указали в профиле свой чат в Телеграме
-    users_to_remind = User.objects.filter(is_recalled_daily=True, tg_chat_id__isnull=False)
+    if self.request.retries >= settings.TG_MAX_RETRIES:
+        logger.warning("Сообщение в чат %s не доставлено после %s повторных попыток", tg_chat_id, self.request.retries)
+        return False
+    raise self.retry(countdown=retry_countdown(self.request.retries + 1, retry_after))
 
-    if not users_to_remind:
+
+@shared_task
+def aggregate_reminder_results(results):
+    """Подсчет общего количества доставленных, неотправленных и перенесенных напоминаний"""
+    total = {
+        key: sum(result[key] for result in results)
+        for key in ("delivered", "failed", "rescheduled")
+    }
+    logger.info(
+        "Напоминания отправлены: доставлено %s, не доставлено %s, перенесено %s",
+        total["delivered"], total["failed"], total["rescheduled"],
+    )
+    return total
+
+
+@shared_task
+def delete_expired_email_tokens():
+    """Удаление просроченных токенов подтверждения email (по индексу expires_at)"""
+    deleted, _ = EmailConfirmationToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def email_retry_countdown(attempts):
+    """Задержка перед повторной отправкой письма: экспоненциально растущая, со случайным разбросом"""
+    backoff = min(settings.EMAIL_RETRY_BACKOFF_MAX, settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+    return backoff + random.uniform(0, settings.EMAIL_RETRY_BACKOFF)
+
+
+def mark_email_failed(email, error):
+    """Учет неудачной попытки отправки. После EMAIL_MAX_RETRIES повторов письмо больше не отправляется"""
+    email.attempts += 1
+    email.last_error = str(error) or error.__class__.__name__
+    if email.attempts > settings.EMAIL_MAX_RETRIES:
+        email.status = OutboxEmail.Status.FAILED
+        email.body = ""  # Письмо больше не отправляется: ссылка с токеном в БД не нужна
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=email_retry_countdown(email.attempts))
+    email.save(update_fields=["attempts", "last_error", "status", "body", "next_attempt_at"])
+
+
+@shared_task
+def send_outbox_emails(email_ids):
+    """Отправка писем из таблицы исходящих писем через одно SMTP-соединение на весь пакет.
+    Письма блокируются на время отправки (SELECT ... FOR UPDATE SKIP LOCKED): письма, которые уже отправляет
+    другая задача, пропускаются, поэтому одно письмо не отправляется дважды.
+    Письма, которые не удалось отправить, отправляются повторно отдельной задачей с увеличивающейся задержкой"""
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=email_ids, status=OutboxEmail.Status.PENDING).order_by("pk")
+        )
+        if not emails:
+            return {"sent": 0, "failed": 0}
+
+        sent, failed = 0, []
+        connection = get_connection()
+        try:
+            connection.open()
+        except (smtplib.SMTPException, OSError) as e:
+            # SMTP-сервер недоступен: попытка засчитывается всем письмам пакета
+            for email in emails:
+                mark_email_failed(email, e)
+            failed = emails
+        else:
+            try:
+                for email in emails:
+                    message = EmailMessage(
+                        email.subject, email.body, email.from_email or None, email.recipients, connection=connection
+                    )
+                    try:
+                        message.send()
+                    except (smtplib.SMTPException, OSError) as e:
+                        mark_email_failed(email, e)
+                        failed.append(email)
+                    else:
+                        email.attempts += 1
+                        email.status = OutboxEmail.Status.SENT
+                        email.sent_at = timezone.now()
+                        email.body = ""  # Ссылка с токеном подтверждения не хранится после отправки
+                        email.save(update_fields=["attempts", "status", "sent_at", "body"])
+                        sent += 1
+            finally:
+                connection.close()
+
+        retry = [email for email in failed if email.status == OutboxEmail.Status.PENDING]
+        if retry:
+            countdown = max((email.next_attempt_at - timezone.now()).total_seconds() for email in retry)
+            retry_ids = [email.pk for email in retry]
+            transaction.on_commit(lambda: send_outbox_emails.apply_async((retry_ids,), countdown=countdown))
+    return {"sent": sent, "failed": len(failed)}
+
+
+@shared_task
+def send_pending_emails():
+    """Отправка писем, задачи для которых были потеряны (например, брокер был недоступен при регистрации
+    или задача повторной отправки не дошла до воркера). Выбираются письма, время попытки которых прошло
+    более EMAIL_OUTBOX_STALE_SECONDS секунд назад (по частичному индексу)"""
+    stale_before = timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_STALE_SECONDS)
+    email_ids = list(
+        OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lt=stale_before)
+        .order_by("next_attempt_at").values_list("pk", flat=True)[:settings.EMAIL_OUTBOX_BATCH_SIZE]
+    )
+    if email_ids:
+        send_outbox_emails.delay(email_ids)
+    return len(email_ids)
+
+
+@shared_task(acks_late=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+def process_avatar(user_id, avatar_name):
+    """Создание квадратных копий аватара пользователя (выполняется в очереди images).
+    Если аватар заменен или удален до окончания обработки, копии не сохраняются и их файлы удаляются"""
+    user = User.objects.filter(pk=user_id, avatar=avatar_name).first()
+    if user is None:
         return
 
-    # Отправляем напоминание каждому пользователю
-    for user in users_to_remind:
-        message = (f'Привет, {user.username}, от "My note"! '
-                   f'День подходит к концу, не забудь записать самые важные моменты в свой дневник!'
-                   f' http://127.0.0.1:8000/')
-        send_telegram_message(user.tg_chat_id, message)  # Отправляем сообщение в Телеграм в асинхронном режиме
+    renditions = create_avatar_renditions(user)
+    if renditions is None:
+        return
+    # Копии сохраняются, только если у пользователя все еще тот же аватар
+    updated = User.objects.filter(pk=user_id, avatar=avatar_name).update(avatar_renditions=renditions)
+    if updated:
+        invalidate_user_cache(user_id)
+    else:
+        delete_avatar_files([item["path"] for items in renditions.values() for item in items])
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+def delete_avatar_files(paths):
+    """Удаление файлов замененного или удаленного аватара (исходного и копий) из хранилища"""
+    storage = User._meta.get_field("avatar").storage
+    for path in paths:
+        # Отсутствующий файл (например, при повторном выполнении задачи) не считается ошибкой
+        if storage.exists(path):
+            storage.delete(path)
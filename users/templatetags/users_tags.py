@@ -13,3 +13,15 @@ def media_filter(path):
     if path:
         return f"/media/{path}"  # Если передан путь, возвращает строку вида: "/media/ваш_файл.jpg"
     return "#"
+
+
+@register.simple_tag()
+def avatar_url(user, size):
+    """URL копии аватара пользователя для отображения размером size пикселей"""
+    return user.avatar_url(size)
+
+
+@register.simple_tag()
+def avatar_srcset(user, size, fmt):
+    """Атрибут srcset с копиями аватара размером size в формате fmt (webp или jpeg) для экранов 1x и 2x"""
+    return user.avatar_srcset(size, fmt)
@@ -1,9 +1,33 @@
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest.mock import Mock, patch
+
 from django.core import mail
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
+from users import services
+from users.backends import CachedModelBackend, user_cache_key
 from users.forms import CustomUserCreationForm, UserUpdateForm
-from users.models import User
+from users.models import EmailConfirmationToken, OutboxEmail, User
+from users.services import TelegramRateLimiter, TelegramRetryAfter, TelegramTemporaryError, deliver_telegram_message
+from users.tasks import (delete_expired_email_tokens,
+                         iter_reminder_batches,
+                         process_avatar,
+                         send_outbox_emails,
+                         send_pending_emails,
+                         send_reminder_batch,
+                         send_reminder_message,
+                         send_telegram_message_task)
 
 
 class UserModelTest(TestCase):
@@ -35,14 +59,12 @@ class UserModelTest(TestCase):
         self.user.tg_chat_id = '123456789'
         self.user.phone = '+79991234567'
         self.user.is_recalled_daily = True
-        self.user.token = 'test_token'
         self.user.save()
 
         updated_user = User.objects.get(email='test@example.com')
         self.assertEqual(updated_user.tg_chat_id, '123456789')
         self.assertEqual(updated_user.phone, '+79991234567')
         self.assertTrue(updated_user.is_recalled_daily)
-        self.assertEqual(updated_user.token, 'test_token')
 
     def test_unique_email_constraint(self):
         """Тест уникальности email"""
@@ -162,7 +184,8 @@ class RegisterViewTest(TestCase):
 
     def test_register_view_post_valid(self):
         """Тест POST запроса с валидными данными"""
-        response = self.client.post(self.register_url, self.valid_data)
+        with self.captureOnCommitCallbacks(execute=True):  # Письмо отправляется после фиксации транзакции
+            response = self.client.post(self.register_url, self.valid_data)
 
         # Проверяем редирект на страницу входа
         self.assertRedirects(response, reverse('users:login'))
@@ -171,11 +194,12 @@ class RegisterViewTest(TestCase):
         user = User.objects.get(email='newuser@example.com')
         self.assertEqual(user.username, 'newuser')
         self.assertFalse(user.is_active)  # Пользователь не активен до подтверждения email
-        self.assertIsNotNone(user.token)  # Токен должен быть установлен
+        self.assertEqual(user.email_confirmation_tokens.count(), 1)  # Токен должен быть создан
 
         # Проверяем отправку email
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, 'Подтверждение email для регистрации')
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.Status.SENT)
 
     def test_register_view_post_invalid(self):
         """Тест POST запроса с невалидными данными"""
@@ -199,20 +223,30 @@ class EmailVerificationTest(TestCase):
             username='testuser',
             password='testpass123',
             is_active=False,
-            token='test_token_123'
         )
+        self.token = EmailConfirmationToken.issue(self.user)
+
+    def test_token_is_stored_hashed(self):
+        """Тест: в БД хранится только хеш токена"""
+        confirmation = EmailConfirmationToken.objects.get(user=self.user)
+        self.assertNotEqual(confirmation.token_hash, self.token)
+        self.assertEqual(confirmation.token_hash, EmailConfirmationToken.hash_token(self.token))
 
     def test_email_verification_success(self):
         """Тест успешного подтверждения email"""
-        verification_url = reverse('users:email-confirm', kwargs={'token': 'test_token_123'})
+        verification_url = reverse('users:email-confirm', kwargs={'token': self.token})
         response = self.client.get(verification_url)
 
         # Проверяем редирект
         self.assertRedirects(response, reverse('users:login'))
 
-        # Проверяем активацию пользователя
+        # Проверяем активацию пользователя и удаление токена
         user = User.objects.get(email='test@example.com')
         self.assertTrue(user.is_active)
+        self.assertFalse(EmailConfirmationToken.objects.filter(user=user).exists())
+
+        # Повторный переход по ссылке не работает
+        self.assertEqual(self.client.get(verification_url).status_code, 404)
 
     def test_email_verification_invalid_token(self):
         """Тест подтверждения email с неверным токеном"""
@@ -221,6 +255,84 @@ class EmailVerificationTest(TestCase):
 
         self.assertEqual(response.status_code, 404)  # Должен вернуть 404
 
+    def test_email_verification_expired_token(self):
+        """Тест подтверждения email с просроченным токеном и удаления просроченных токенов задачей"""
+        EmailConfirmationToken.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        response = self.client.get(reverse('users:email-confirm', kwargs={'token': self.token}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+        self.assertEqual(delete_expired_email_tokens(), 1)
+        self.assertFalse(EmailConfirmationToken.objects.exists())
+
+
+@override_settings(EMAIL_MAX_RETRIES=1)
+class OutboxEmailTest(TestCase):
+    """Тесты отправки писем из таблицы исходящих писем"""
+
+    def create_email(self, recipient='user@example.com'):
+        return OutboxEmail.objects.create(subject='Тема', body='Текст', recipients=[recipient])
+
+    def test_batch_is_sent_over_one_connection(self):
+        """Тест отправки пакета писем через одно SMTP-соединение"""
+        emails = [self.create_email(f'user{i}@example.com') for i in range(3)]
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as open_mock:
+            result = send_outbox_emails([email.pk for email in emails])
+
+        self.assertEqual(result, {'sent': 3, 'failed': 0})
+        self.assertEqual(open_mock.call_count, 1)
+        self.assertEqual([message.to for message in mail.outbox], [[f'user{i}@example.com'] for i in range(3)])
+        self.assertEqual(mail.outbox[0].body, 'Текст')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.Status.SENT).exists())
+        self.assertFalse(OutboxEmail.objects.exclude(body='').exists())  # Текст не хранится после отправки
+
+    @patch('users.tasks.send_outbox_emails.apply_async')
+    def test_failed_email_is_retried_then_marked_failed(self, apply_async_mock):
+        """Тест повторной отправки после ошибки SMTP и статуса "Не отправлено" после исчерпания попыток"""
+        email = self.create_email()
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=smtplib.SMTPServerDisconnected('connection lost')):
+            with self.captureOnCommitCallbacks(execute=True):
+                send_outbox_emails([email.pk])
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (OutboxEmail.Status.PENDING, 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            self.assertEqual(apply_async_mock.call_args.args[0], ([email.pk],))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                send_outbox_emails([email.pk])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.Status.FAILED, 2))
+        self.assertEqual(email.last_error, 'connection lost')
+        self.assertEqual(email.body, '')
+        self.assertEqual(apply_async_mock.call_count, 1)
+
+    @patch('users.tasks.send_outbox_emails.delay', side_effect=OSError('broker unavailable'))
+    def test_enqueue_email_survives_broker_error(self, delay_mock):
+        """Тест: ошибка постановки задачи не прерывает запрос, письмо остается в очереди отправки"""
+        with self.captureOnCommitCallbacks(execute=True):
+            email = services.enqueue_email('Тема', 'Текст', ['user@example.com'])
+
+        delay_mock.assert_called_once_with([email.pk])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.Status.PENDING, 0))
+
+    @patch('users.tasks.send_outbox_emails.delay')
+    def test_send_pending_emails(self, delay_mock):
+        """Тест отправки писем, задачи для которых были потеряны (в том числе задачи повторной отправки)"""
+        stale = self.create_email()
+        lost_retry = self.create_email()
+        OutboxEmail.objects.filter(pk=stale.pk).update(next_attempt_at=timezone.now() - timedelta(hours=2))
+        OutboxEmail.objects.filter(pk=lost_retry.pk).update(
+            attempts=1, next_attempt_at=timezone.now() - timedelta(hours=1)
+        )
+        self.create_email()  # Новое письмо отправляется своей задачей
+        retry = self.create_email()  # Повторная отправка еще не наступила
+        OutboxEmail.objects.filter(pk=retry.pk).update(attempts=1, next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(send_pending_emails(), 2)
+        delay_mock.assert_called_once_with([stale.pk, lost_retry.pk])
+
 
 class UserProfileViewTest(TestCase):
     """Тесты просмотра профиля"""
@@ -307,3 +419,311 @@ class UserProfileUpdateViewTest(TestCase):
         # Должен быть редирект на страницу входа
         self.assertEqual(response.status_code, 302)
         self.assertIn('/users/login/', response.url)
+
+
+class CachedUserTest(TestCase):
+    """Тесты сессий в кеше и кеширования пользователя запроса"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123',
+            is_active=True
+        )
+        self.client.login(email='test@example.com', password='testpass123')
+        self.profile_url = reverse('users:profile')
+
+    def test_repeated_requests_skip_session_and_user_queries(self):
+        """Тест: сессия и пользователь повторного запроса читаются из кеша, а не из БД"""
+        self.client.get(self.profile_url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user_profile'], self.user)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_cached_user_has_no_password(self):
+        """Тест: хеш пароля не попадает в кеш, а пользователь из кеша проходит проверку сессии"""
+        self.client.get(self.profile_url)
+        data = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', data['fields'])
+        self.assertNotIn(self.user.password, str(data))
+
+        user = CachedModelBackend().get_user(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+    def test_cached_user_save_keeps_password(self):
+        """Тест: сохранение пользователя из кеша не затирает пароль"""
+        self.client.get(self.profile_url)
+        user = CachedModelBackend().get_user(self.user.pk)
+        user.username = 'updateduser'
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, 'updateduser')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_profile_update_invalidates_cached_user(self):
+        """Тест: после редактирования профиля пользователь запроса загружается заново"""
+        self.client.get(self.profile_url)
+        self.client.post(reverse('users:profile_edit'), {'username': 'updateduser', 'email': 'test@example.com'})
+
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.context['user_profile'].username, 'updateduser')
+
+    def test_deactivated_user_is_logged_out(self):
+        """Тест: заблокированный пользователь не аутентифицируется по закешированным данным"""
+        self.client.get(self.profile_url)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(TG_REMINDER_BATCH_SIZE=2, TG_BOT_TOKEN='token')
+class ReminderTaskTest(TestCase):
+    """Тесты рассылки напоминаний в Телеграм"""
+
+    def setUp(self):
+        for i in range(5):
+            User.objects.create_user(
+                email=f'user{i}@example.com',
+                username=f'user{i}',
+                password='testpass123',
+                is_recalled_daily=True,
+                tg_chat_id=str(1000 + i),
+            )
+        # Пользователи без согласия на напоминания или без чата в Телеграме
+        User.objects.create_user(email='off@example.com', username='off', password='testpass123', tg_chat_id='1')
+        User.objects.create_user(email='nochat@example.com', username='nochat', password='testpass123',
+                                 is_recalled_daily=True)
+
+    @patch('users.tasks.aggregate_reminder_results.run')
+    @patch('users.services.deliver_telegram_message')
+    def test_reminders_sent_in_batches(self, send_mock, aggregate_mock):
+        """Тест отправки напоминаний пакетами и подсчета результатов"""
+        send_mock.side_effect = [True, True, False, True, True]
+        send_reminder_message.delay()
+
+        chat_ids = sorted(call.args[0] for call in send_mock.call_args_list)
+        self.assertEqual(chat_ids, ['1000', '1001', '1002', '1003', '1004'])
+
+        # Три пакета (2 + 2 + 1 получатель), результаты которых суммируются
+        results = aggregate_mock.call_args.args[0]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(sum(result['delivered'] for result in results), 4)
+        self.assertEqual(sum(result['failed'] for result in results), 1)
+
+    def test_reminder_batches_are_id_ranges(self):
+        """Тест разбиения получателей на пакеты по диапазонам id без загрузки пользователей целиком"""
+        recipients = User.objects.filter(tg_chat_id__startswith='100').order_by('pk')
+        ids = list(recipients.values_list('pk', flat=True))
+        self.assertEqual(list(iter_reminder_batches(2)), [(ids[0], ids[1]), (ids[2], ids[3]), (ids[4], ids[4])])
+
+    @patch('users.services.deliver_telegram_message')
+    def test_no_recipients(self, send_mock):
+        """Тест: без получателей сообщения не отправляются"""
+        User.objects.update(is_recalled_daily=False)
+        send_reminder_message.delay()
+        send_mock.assert_not_called()
+
+
+@override_settings(TG_BOT_TOKEN='token', TG_RETRY_BACKOFF=0)
+class TelegramDeliveryTest(TestCase):
+    """Тесты отправки сообщений в Телеграм с учетом лимитов и повторных попыток"""
+
+    def setUp(self):
+        services._rate_limiter = None  # Новый ограничитель скорости для каждого теста
+
+    def tearDown(self):
+        services._rate_limiter = None
+
+    @staticmethod
+    def telegram_response(status_code, payload=None):
+        """Ответ API Telegram для подмены HTTP-запроса"""
+        response = Mock(status_code=status_code, ok=status_code < 400, headers={}, text='')
+        response.json.return_value = payload or {}
+        return response
+
+    @patch('users.services.get_telegram_session')
+    def test_too_many_requests_pauses_sending(self, session_mock):
+        """Тест: ответ 429 приостанавливает отправку всех сообщений на время retry_after"""
+        session_mock.return_value.post.return_value = self.telegram_response(
+            429, {'ok': False, 'parameters': {'retry_after': 30}}
+        )
+        with self.assertRaises(TelegramRetryAfter) as context:
+            deliver_telegram_message('1', 'text')
+        self.assertEqual(context.exception.retry_after, 30)
+
+        # Во время паузы запросы к Telegram не выполняются
+        with self.assertRaises(TelegramRetryAfter):
+            deliver_telegram_message('2', 'text')
+        self.assertEqual(session_mock.return_value.post.call_count, 1)
+
+    @override_settings(TG_CHAT_RATE_LIMIT=0.1, TG_RATE_LIMIT_MAX_WAIT=1)
+    def test_chat_rate_limit(self):
+        """Тест лимита на количество сообщений в один чат"""
+        limiter = TelegramRateLimiter()
+        self.assertEqual(limiter.acquire('1'), 0)
+        self.assertGreater(limiter.acquire('1'), 9)  # Следующее сообщение в этот чат - не раньше чем через 10 с
+        self.assertEqual(limiter.acquire('2'), 0)  # Другие чаты не ограничены
+        with self.assertRaises(TelegramRetryAfter):
+            limiter.wait('1')
+
+    @patch('users.tasks.send_telegram_message_task.apply_async')
+    @patch('users.services.deliver_telegram_message')
+    def test_batch_reschedules_deferred_messages(self, deliver_mock, apply_async_mock):
+        """Тест переноса отправки сообщений, не отправленных из-за лимитов или временных ошибок"""
+        for i in range(3):
+            User.objects.create_user(email=f'user{i}@example.com', username=f'user{i}', password='testpass123',
+                                     is_recalled_daily=True, tg_chat_id=str(i))
+        deliver_mock.side_effect = [True, TelegramRetryAfter(15), TelegramTemporaryError()]
+
+        user_ids = User.objects.values_list('pk', flat=True)
+        result = send_reminder_batch(min(user_ids), max(user_ids))
+
+        self.assertEqual(result, {'delivered': 1, 'failed': 0, 'rescheduled': 2})
+        countdowns = sorted(call.kwargs['countdown'] for call in apply_async_mock.call_args_list)
+        self.assertEqual(len(countdowns), 2)
+        self.assertGreaterEqual(countdowns[1], 15)  # Не раньше, чем указал Telegram
+
+    @patch('users.tasks.deliver_telegram_message')
+    def test_retry_task_retries_until_delivered(self, deliver_mock):
+        """Тест повторных попыток отправки сообщения"""
+        deliver_mock.side_effect = [TelegramTemporaryError(), TelegramRetryAfter(1), True]
+        result = send_telegram_message_task.apply(args=('1', 'text'))
+
+        self.assertTrue(result.get())
+        self.assertEqual(deliver_mock.call_count, 3)
+
+    @override_settings(TG_MAX_RETRIES=2)
+    @patch('users.tasks.deliver_telegram_message', side_effect=TelegramTemporaryError())
+    def test_retry_task_gives_up(self, deliver_mock):
+        """Тест прекращения повторных попыток после TG_MAX_RETRIES"""
+        result = send_telegram_message_task.apply(args=('1', 'text'))
+
+        self.assertFalse(result.get())
+        self.assertEqual(deliver_mock.call_count, 3)
+
+
+class AvatarRenditionsTest(TestCase):
+    """Тесты квадратных копий аватара"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    @staticmethod
+    def make_avatar(name='avatar.png', size=(400, 300)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 50, 50, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_process_avatar_creates_square_renditions(self):
+        """Тест создания квадратных копий в форматах WebP и JPEG"""
+        self.user.avatar = self.make_avatar()
+        self.user.save()
+        process_avatar(self.user.pk, self.user.avatar.name)
+
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.avatar_renditions), {'webp', 'jpeg'})
+        self.assertEqual([item['size'] for item in self.user.avatar_renditions['jpeg']], [64, 150, 300])
+        storage = self.user.avatar.storage
+        for fmt, expected_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            for item in self.user.avatar_renditions[fmt]:
+                self.assertTrue(item['path'].startswith(f'users/avatars/renditions/{self.user.pk}/'))
+                with storage.open(item['path']) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.format, expected_format)
+                    self.assertEqual(image.size, (item['size'], item['size']))
+
+    def test_small_avatar_not_upscaled(self):
+        """Тест: копии больше исходного изображения не создаются"""
+        self.user.avatar = self.make_avatar(size=(100, 80))
+        self.user.save()
+        process_avatar(self.user.pk, self.user.avatar.name)
+
+        self.user.refresh_from_db()
+        self.assertEqual([item['size'] for item in self.user.avatar_renditions['webp']], [64])
+
+    def test_avatar_url_and_srcset(self):
+        """Тест выбора копии для размера отображения"""
+        self.assertEqual(self.user.avatar_srcset(150, 'webp'), '')
+        self.user.avatar = self.make_avatar()
+        self.user.save()
+        self.assertEqual(self.user.avatar_url(150), self.user.avatar.url)  # Копий еще нет - исходный файл
+
+        process_avatar(self.user.pk, self.user.avatar.name)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_url(64).endswith('_64.jpg'))
+        self.assertTrue(self.user.avatar_url(100).endswith('_150.jpg'))
+        srcset = self.user.avatar_srcset(150, 'webp')
+        self.assertIn('_150.webp 1x', srcset)
+        self.assertIn('_300.webp 2x', srcset)
+
+    def test_menu_shows_small_avatar(self):
+        """Тест: в меню выводится маленькая копия аватара, а не исходный файл"""
+        self.user.avatar = self.make_avatar()
+        self.user.save()
+        process_avatar(self.user.pk, self.user.avatar.name)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my_note:home'))
+        self.assertContains(response, '_64.webp 1x')
+        self.assertContains(response, '_64.jpg')
+
+    def test_replaced_avatar_files_deleted(self):
+        """Тест замены аватара: файлы прежнего аватара удаляются, для нового создаются копии"""
+        self.user.avatar = self.make_avatar('old.png')
+        self.user.save()
+        process_avatar(self.user.pk, self.user.avatar.name)
+        self.user.refresh_from_db()
+        old_paths = self.user.get_avatar_paths()
+
+        form = UserUpdateForm(
+            data={'username': 'testuser', 'email': 'test@example.com'},
+            files={'avatar': self.make_avatar('new.png')},
+            instance=self.user,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+
+        storage = self.user.avatar.storage
+        for path in old_paths:
+            self.assertFalse(storage.exists(path))
+        self.user.refresh_from_db()
+        self.assertIn('new', self.user.avatar.name)
+        self.assertEqual(len(self.user.avatar_renditions['jpeg']), 3)
+        for path in self.user.get_avatar_paths():
+            self.assertTrue(storage.exists(path))
+
+    def test_stale_avatar_processing_skipped(self):
+        """Тест: копии замененного до обработки аватара не сохраняются"""
+        self.user.avatar = self.make_avatar()
+        self.user.save()
+        process_avatar(self.user.pk, 'users/avatars/previous.png')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_renditions, {})
+
+    def test_profile_uses_rendition(self):
+        """Тест вывода копии аватара в профиле"""
+        self.user.avatar = self.make_avatar()
+        self.user.save()
+        process_avatar(self.user.pk, self.user.avatar.name)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('users:profile'))
+        self.assertContains(response, '_150.jpg')
+        self.assertContains(response, 'type="image/webp"')
@@ -1,15 +1,15 @@
-import secrets  # Генерация криптографически безопасных случайных токенов
-
 from django.contrib.auth.mixins import LoginRequiredMixin  # Проверка авторизации
 from django.contrib.messages.views import SuccessMessageMixin  # Показ сообщений о действиях в формах
-from django.core.mail import send_mail  # Отправка email
+from django.db import transaction  # Транзакции БД
 from django.shortcuts import get_object_or_404, redirect  # HTTP-редиректы
 from django.urls import reverse, reverse_lazy  # Генерация URL
+from django.utils import timezone  # Текущее время для проверки срока действия токена
 from django.views.generic import CreateView, DetailView, UpdateView  # CBV для создания объектов
 
 from config.settings import EMAIL_HOST_USER  # Получение email отправителя из settings.py
 from users.forms import CustomUserCreationForm, UserUpdateForm  # Импорт формы регистрации
-from users.models import User  # Импорт модели пользователя
+from users.models import EmailConfirmationToken, User  # Импорт моделей пользователя и токена подтверждения
+from users.services import enqueue_email  # Отправка email в фоне (через таблицу исходящих писем)
 
 
 class RegisterView(CreateView):
@@ -20,20 +20,21 @@ class RegisterView(CreateView):
     form_class = CustomUserCreationForm  # Используемый класс формы для регистрации
     success_url = reverse_lazy("users:login")  # После успешной регистрации перенаправляем на страницу входа
 
+    @transaction.atomic
     def form_valid(self, form):
-        """Переопределение метода для отправки письма с подтверждением email"""
+        """Переопределение метода для отправки письма с подтверждением email.
+        Письмо отправляется в фоне после фиксации транзакции, поэтому ответ не ждет SMTP-сервер"""
         # Сохранение пользователя без его активации
         user = form.save()
         user.is_active = False  # Аккаунт заблокирован до подтверждения email
-
-        token = secrets.token_urlsafe(32)  # Генерирование случайного токена для подтверждения email (~43 символа)
-        user.token = token  # Сохранение токена в поле 'token' модели пользователя
         user.save()
+
+        token = EmailConfirmationToken.issue(user)  # Токен для подтверждения email (в БД хранится его хеш)
         host = self.request.get_host()  # Получение домена сайта (например: "mysite.com")
         url = f"http://{host}/users/email-confirm/{token}/"  # Ссылка для подтверждения email
 
-        # Отправка письма со ссылкой для подтверждения email
-        send_mail(
+        # Постановка письма со ссылкой для подтверждения email в очередь (отправляется задачей Celery)
+        enqueue_email(
             subject="Подтверждение email для регистрации",  # Тема письма
             message=f"Перейдите по ссылке {url} для подтверждения регистрации в приложении 'My note'",  # Текст письма
             from_email=EMAIL_HOST_USER,  # Email отправителя (из settings.py)
@@ -44,9 +45,16 @@ class RegisterView(CreateView):
 
 def email_verification(request, token):
     """Проверка токена для подтверждения email и активация аккаунта"""
-    user = get_object_or_404(User, token=token)  # Получение пользователя из БД по временному токену
+    # Поиск действующего токена по уникальному индексу хеша
+    confirmation = get_object_or_404(
+        EmailConfirmationToken.objects.select_related("user"),
+        token_hash=EmailConfirmationToken.hash_token(token),
+        expires_at__gt=timezone.now(),
+    )
+    user = confirmation.user
     user.is_active = True  # Активация аккаунта
     user.save()
+    user.email_confirmation_tokens.all().delete()  # Токены пользователя больше не нужны
     return redirect(reverse("users:login"))  # Перенаправление на страницу входа
 
 